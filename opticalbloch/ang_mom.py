@@ -4,7 +4,7 @@ import sys
 
 import numpy as np
 
-from wigner import Wigner3j, Wigner6j
+from wigner import Wigner3j, Wigner6j, Wigner3j_batch, Wigner6j_batch
 
 def calc_clebsch_hf(J_a, I_a, F_a, mF_a, J_b, I_b, F_b, mF_b, q):
     """ Clebsch-Gordan coefficient for the hyperfine transition dipole matrix
@@ -20,6 +20,24 @@ def calc_clebsch_hf(J_a, I_a, F_a, mF_a, J_b, I_b, F_b, mF_b, q):
 
     return coeff_hf*coeff_F
 
+def calc_clebsch_hf_batch(J_a, I_a, F_a, mF_a, J_b, I_b, F_b, mF_b, q):
+    """ calc_clebsch_hf over broadcast arrays of quantum numbers. Each
+    distinct Wigner symbol is only evaluated once. """
+
+    J_a, I_a, F_a, mF_a, J_b, I_b, F_b, mF_b, q = np.broadcast_arrays(
+        J_a, I_a, F_a, mF_a, J_b, I_b, F_b, mF_b, q)
+
+    # The phases are integer powers for physical quantum numbers.
+    coeff_F = ((-1.)**np.rint(F_b+J_a+1+I_a)*
+               np.sqrt((2*F_b+1)*(2*J_a+1))*
+               Wigner6j_batch(J_a,J_b,1,F_b,F_a,I_a)) # Steck Rb87, eqn 36
+
+    coeff_hf = ((-1.)**np.rint(F_b-1+mF_a)*
+                np.sqrt(2*F_a+1)*
+                Wigner3j_batch(F_b,1,F_a,mF_b,q,-mF_a)) # Steck Rb87, eqn 35
+
+    return coeff_hf*coeff_F
+
 def main():
     pass
 
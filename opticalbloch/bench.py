@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+""" A reproducible benchmark suite for the solvers.
+
+Run from this directory:
+
+    python bench.py                         # print the results as JSON
+    python bench.py --out results.json      # save them
+    python bench.py --save-baseline         # make them the new baseline
+    python bench.py --compare               # fail on regressions vs baseline
+    python bench.py --cases two_level_steadystate_batch wigner3j
+
+Each case is timed as the best of several repeats of a fixed workload, so
+results are comparable between runs on the same machine. The baseline is
+kept in bench_baseline.json, next to this file, with the library versions
+and platform it was measured on.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import scipy
+import qutip as qu
+
+import ob_scan
+import pulses
+import wigner
+from systems import OBAtoms, OBLadder
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'bench_baseline.json')
+
+# Default slow-down (ratio to the baseline) counted as a regression.
+TOLERANCE = 1.5
+
+# name -> function returning the zero-argument callable to time.
+CASES = {}
+
+def case(name):
+    """ Decorator registering a benchmark case. The decorated function does
+    any setup and returns the callable to time. """
+
+    def register(setup):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+### Cases
+
+@case('two_level_steadystate_batch')
+def _two_level_steadystate_batch():
+
+    scan = ob_scan.OBScan(OBLadder(2), np.linspace(-10., 10., 2001))
+    return lambda: scan.steadystate_batch(Deltas=[None])
+
+@case('two_level_steadystate_qutip')
+def _two_level_steadystate_qutip():
+
+    scan = ob_scan.OBScan(OBLadder(2), np.linspace(-10., 10., 51))
+    return lambda: scan.steadystate(Deltas=[None])
+
+@case('four_level_steadystate_batch')
+def _four_level_steadystate_batch():
+
+    scan = ob_scan.OBScan(OBLadder(4), np.linspace(-10., 10., 501))
+    return lambda: scan.steadystate_batch(Deltas=[None, 0., 0.])
+
+@case('three_level_essolve')
+def _three_level_essolve():
+
+    ob_obj = OBLadder(3)
+    tlist = np.linspace(0., 10., 201)
+    return lambda: ob_obj.essolve(tlist)
+
+@case('three_level_propagate')
+def _three_level_propagate():
+
+    ob_obj = OBLadder(3)
+    tlist = np.linspace(0., 10., 201)
+    return lambda: ob_obj.propagate(tlist)
+
+@case('three_level_mesolve')
+def _three_level_mesolve():
+
+    ob_obj = OBLadder(3)
+    tlist = np.linspace(0., 10., 201)
+    return lambda: ob_obj.mesolve(tlist)
+
+def _pulse_sequence():
+    """ A two-level atom driven by ten short square pulses. """
+
+    ob_obj = OBLadder(2, gamma=.1)
+    pulse = sum(pulses.Square(2., 10.*k + 1., 10.*k + 2.)
+                for k in range(10))
+    ob_obj.H_Omega_list = [[ob_obj.H_Omega_list[0], pulse]]
+
+    return ob_obj, np.linspace(0., 100., 1001)
+
+@case('td_pulses_evolve')
+def _td_pulses_evolve():
+
+    ob_obj, tlist = _pulse_sequence()
+    return lambda: ob_obj.evolve(tlist, td=True)
+
+@case('td_pulses_mesolve')
+def _td_pulses_mesolve():
+
+    ob_obj, tlist = _pulse_sequence()
+    opts = qu.Options(max_step=.1)
+    return lambda: ob_obj.mesolve(tlist, td=True, opts=opts)
+
+@case('wigner3j')
+def _wigner3j():
+
+    js = np.arange(0., 5.5, .5)
+    args = [(j1, j2, j3, m1, m2, -m1 - m2)
+            for j1 in js for j2 in js for j3 in js
+            for m1 in np.arange(-j1, j1 + 1) for m2 in np.arange(-j2, j2 + 1)
+            if abs(m1 + m2) <= j3]
+
+    def run():
+        wigner.clear_cache()
+        for a in args:
+            wigner.Wigner3j(*a)
+
+    return run
+
+@case('wigner6j')
+def _wigner6j():
+
+    js = np.arange(0., 4.5, .5)
+    args = [(j1, j2, j3, 1., j3, j2) for j1 in js for j2 in js for j3 in js]
+
+    def run():
+        wigner.clear_cache()
+        for a in args:
+            wigner.Wigner6j(*a)
+
+    return run
+
+for _N in (2, 3, 4, 5):
+    def _atoms_steadystate(N=_N):
+        ob_obj = OBAtoms(N)
+        return lambda: ob_obj.steadystate()
+    case('sigma_N_steadystate_%d' % 2**_N)(_atoms_steadystate)
+
+### Running and comparing
+
+def time_case(func, repeat=5, min_time=0.05):
+    """ Times a callable as the best of repeat runs, each of enough calls to
+    take about min_time.
+
+    Returns:
+        dict of best and median seconds per call and calls per run.
+    """
+
+    func() # Warm up caches and imports.
+
+    number = 1
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+
+    if elapsed < min_time:
+        number = int(min_time/max(elapsed, 1e-9)) + 1
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start)/number)
+
+    return {'best': min(times), 'median': float(np.median(times)),
+            'number': number}
+
+def environment():
+    """ The library versions and platform results are measured on. """
+
+    return {'python': platform.python_version(),
+            'numpy': np.__version__, 'scipy': scipy.__version__,
+            'qutip': qu.__version__, 'platform': platform.platform(),
+            'processor': platform.processor()}
+
+def run(names=None, repeat=5):
+    """ Runs the benchmark cases.
+
+    Args:
+        names: list of case names. Default is all of them.
+        repeat: number of timed runs of each case.
+
+    Returns:
+        dict with the environment and the results of each case.
+    """
+
+    if names is None:
+        names = sorted(CASES)
+
+    results = {}
+    for name in names:
+        results[name] = time_case(CASES[name](), repeat=repeat)
+
+    return {'environment': environment(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results}
+
+def save(results, path):
+
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def load(path):
+
+    with open(path) as f:
+        return json.load(f)
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """ Compares results to a baseline, case by case.
+
+    Args:
+        results, baseline: dicts as returned by run.
+        tolerance: ratio of best times above which a case has regressed.
+
+    Returns:
+        ratios: dict of case name -> best time/baseline best time, for the
+            cases in both.
+        regressions: sorted list of the case names that regressed.
+    """
+
+    ratios = {}
+    for name, result in results['results'].items():
+        if name in baseline['results']:
+            ratios[name] = result['best']/baseline['results'][name]['best']
+
+    regressions = sorted(name for name, ratio in ratios.items()
+                         if ratio > tolerance)
+
+    return ratios, regressions
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES),
+                        help='cases to run (default all)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', help='file to save the results to')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true',
+                        help='exit with 1 if any case is slower than '
+                             'tolerance times the baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run(args.cases, repeat=args.repeat)
+
+    if args.out:
+        save(results, args.out)
+
+    if args.save_baseline:
+        save(results, args.baseline)
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.compare:
+        ratios, regressions = compare(results, load(args.baseline),
+                                      args.tolerance)
+        for name in sorted(ratios):
+            sys.stderr.write('%-32s %6.2fx%s\n' % (
+                name, ratios[name],
+                '  REGRESSION' if name in regressions else ''))
+        return 1 if regressions else 0
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
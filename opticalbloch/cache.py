@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+""" A content-addressed cache for solver results.
+
+Results are stored on disk under a key which is a hash of everything that
+determines them (Hamiltonian terms, collapse operators, times, initial state,
+args and solver options), so a result is only reused when the same physics
+is asked for again. The least recently used results are evicted when the
+cache grows past its size limit.
+"""
+
+import functools
+import hashlib
+import os
+import pickle
+import types
+
+import numpy as np
+
+def _update(h, obj, seen=None):
+    """ Feeds a canonical byte representation of obj into the hash h.
+
+    Raises:
+        ValueError: if obj can't be hashed deterministically, e.g. a callable
+            whose behaviour isn't determined by its code and data.
+    """
+
+    if seen is None:
+        seen = set()
+
+    update = lambda x: _update(h, x, seen)
+
+    h.update(type(obj).__name__.encode())
+
+    if obj is None or isinstance(obj, (bool, int, float, complex)):
+        h.update(repr(obj).encode())
+    elif isinstance(obj, str):
+        h.update(obj.encode())
+    elif isinstance(obj, bytes):
+        h.update(obj)
+    elif hasattr(obj, 'full') and hasattr(obj, 'dims'): # Qobj
+        h.update(repr(obj.dims).encode())
+        update(obj.full())
+    elif isinstance(obj, (np.ndarray, np.generic)):
+        arr = np.ascontiguousarray(obj)
+        h.update(str(arr.dtype).encode())
+        h.update(repr(arr.shape).encode())
+        h.update(arr.tobytes())
+    elif isinstance(obj, (list, tuple)):
+        h.update(str(len(obj)).encode())
+        for item in obj:
+            update(item)
+    elif isinstance(obj, dict):
+        for k in sorted(obj, key=repr):
+            update(k)
+            update(obj[k])
+    elif isinstance(obj, types.ModuleType):
+        h.update(obj.__name__.encode())
+    elif isinstance(obj, types.CodeType):
+        update(obj.co_code)
+        update(list(obj.co_consts))
+        update(list(obj.co_names))
+    elif isinstance(obj, types.FunctionType):
+        # Functions are identified by their code and everything it reads:
+        # closure cells, defaults and the globals it names, so that a lambda
+        # built from the same expression gives the same key in every run but
+        # closures over different values don't.
+        h.update(obj.__module__.encode() if obj.__module__ else b'')
+        h.update(obj.__qualname__.encode())
+        update(obj.__code__)
+        if id(obj) in seen: # Recursion through its own globals.
+            return
+        seen.add(id(obj))
+        try:
+            cells = [c.cell_contents for c in obj.__closure__ or ()]
+        except ValueError:
+            raise ValueError('Can\'t hash ' + repr(obj) + ' for the cache: '
+                             'its closure has an empty cell.')
+        update(cells)
+        update(obj.__defaults__)
+        update(obj.__kwdefaults__)
+        update(dict((name, obj.__globals__[name])
+                    for name in obj.__code__.co_names
+                    if name in obj.__globals__))
+    elif isinstance(obj, types.MethodType):
+        update(obj.__func__)
+        update(obj.__self__)
+    elif isinstance(obj, functools.partial):
+        update(obj.func)
+        update(obj.args)
+        update(obj.keywords)
+    elif isinstance(obj, np.ufunc):
+        h.update(obj.__name__.encode())
+    elif (isinstance(obj, types.BuiltinFunctionType) and
+          (obj.__self__ is None or
+           isinstance(obj.__self__, types.ModuleType))):
+        h.update(str(obj.__module__).encode())
+        h.update(obj.__qualname__.encode())
+    elif isinstance(obj, type):
+        h.update(obj.__module__.encode())
+        h.update(obj.__qualname__.encode())
+    elif hasattr(obj, '__dict__'):
+        if id(obj) in seen:
+            return
+        seen.add(id(obj))
+        update(vars(obj))
+    elif callable(obj):
+        raise ValueError('Can\'t hash the callable ' + repr(obj) +
+                         ' for the cache.')
+    else:
+        r = repr(obj)
+        if ' at 0x' in r:
+            raise ValueError('Can\'t hash ' + r + ' for the cache: its repr '
+                             'is not deterministic.')
+        h.update(r.encode())
+
+def hash_key(*parts):
+    """ Returns a hex digest identifying the given parts. Qobjs, arrays,
+    lists, dicts, functions (with their closures, defaults and globals) and
+    plain objects (e.g. qu.Options) are hashed by content.
+
+    Raises:
+        ValueError: if a part can't be hashed deterministically.
+    """
+
+    h = hashlib.sha1()
+    _update(h, parts)
+    return h.hexdigest()
+
+class ResultCache(object):
+    """ An on-disk cache of solver results with LRU eviction.
+
+    Attributes:
+        cache_dir: directory the results are pickled into.
+        max_bytes: the total size of the cache files is kept below this.
+        hits: number of results loaded from the cache.
+        misses: number of lookups that found nothing.
+    """
+
+    ext = '.pkl'
+
+    def __init__(self, cache_dir='ob_cache', max_bytes=2**30):
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def __repr__(self):
+
+        return "<ResultCache :: %s>" % self.__dict__
+
+    def path(self, key):
+
+        return os.path.join(self.cache_dir, key + self.ext)
+
+    def get(self, key):
+        """ Returns the result stored under key, or None if there isn't one.
+        A hit marks the result as recently used. """
+
+        path = self.path(key)
+
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+        os.utime(path, None)
+        self.hits += 1
+
+        return result
+
+    def put(self, key, result):
+        """ Stores result under key, then evicts the least recently used
+        results if the cache is over max_bytes. """
+
+        path = self.path(key)
+        tmp_path = path + '.tmp'
+
+        # Write then rename, so an interrupted write can't leave a partial
+        # file that would be read back later.
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+
+        self.evict()
+
+    def entries(self):
+        """ Returns a list of (mtime, size, path) for each cached result,
+        least recently used first. """
+
+        entries = []
+
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.ext):
+                path = os.path.join(self.cache_dir, name)
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+
+        return sorted(entries)
+
+    def size(self):
+        """ Total size of the cached results [bytes]. """
+
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """ Deletes least recently used results until the cache is no larger
+        than max_bytes. """
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        """ Deletes every cached result. """
+
+        for _, _, path in self.entries():
+            os.remove(path)
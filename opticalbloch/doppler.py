@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+""" Doppler averaging of OB detuning scans over a thermal vapour.
+
+An atom moving with velocity v along a beam of wavevector k sees the beam's
+detuning shifted by -k*v. A DopplerScan solves the OB object for every
+(velocity class, detuning) pair as one batch, with the detuning and velocity
+entering as additive diagonals of one Liouvillian, and averages the results
+over the Maxwell-Boltzmann distribution (macro.maxwell_boltzmann).
+
+At each detuning the integrand is a line of the homogeneous width in k*v,
+which for a thermal vapour is far narrower than the Doppler width k*u. The
+velocity classes must resolve that line, not just the Maxwell-Boltzmann
+distribution, so by default they are a uniform grid with a spacing set by
+the homogeneous linewidth (see velocity_grid). The trapezoidal rule on such
+a grid converges exponentially once the line is resolved. Gauss-Hermite
+quadrature, whose nodes are about k*u/sqrt(num_classes) apart, is only
+accurate when that is small against the linewidth, e.g. for transients
+of a cold or slow sample.
+
+Units: k*v must be in the units of the detunings. For detunings in 2π MHz
+and v in m/s, use k = macro.calc_wavenumber(omega_MHz)/1.e6.
+"""
+
+import warnings
+
+import numpy as np
+
+import liouville
+import macro
+import metrics
+
+def gauss_hermite(width, num_classes):
+    """ Velocity classes and weights for averaging over the Maxwell-Boltzmann
+    distribution macro.maxwell_boltzmann(v, width) by Gauss-Hermite
+    quadrature. The average is exact for polynomials in v up to degree
+    2*num_classes - 1.
+
+    Args:
+        width: the width of the distribution, the most probable speed [m/s].
+        num_classes: the number of velocity classes.
+
+    Returns:
+        v: (num_classes,) array of velocities [m/s].
+        weights: (num_classes,) array of weights, which sum to 1.
+    """
+
+    x, w = np.polynomial.hermite.hermgauss(num_classes)
+
+    return width*x, w/np.sqrt(np.pi)
+
+def velocity_grid(width, k, linewidth, resolution=2., cutoff=4.,
+                  max_classes=20000):
+    """ Velocity classes and weights for averaging a line of a homogeneous
+    linewidth over the Maxwell-Boltzmann distribution
+    macro.maxwell_boltzmann(v, width), by the trapezoidal rule on a uniform
+    grid.
+
+    Args:
+        width: the width of the distribution, the most probable speed [m/s].
+        k: the largest detuning shift per unit velocity, e.g. the
+            wavevector.
+        linewidth: the narrowest homogeneous width (half width) to resolve,
+            in the units of the detunings.
+        resolution: the number of classes per linewidth/k.
+        cutoff: the grid spans |v| <= cutoff*width.
+        max_classes: the most classes to use. If more are needed to resolve
+            the linewidth, a warning is given and the grid is coarser.
+
+    Returns:
+        v: array of velocities [m/s].
+        weights: array of weights, which sum to 1.
+    """
+
+    step = linewidth/(resolution*abs(k))
+    num_classes = 2*int(np.ceil(cutoff*width/step)) + 1
+
+    if num_classes > max_classes:
+        warnings.warn('%d velocity classes are needed to resolve the '
+                      'linewidth; using %d, so the Doppler average will be '
+                      'inaccurate.' % (num_classes, max_classes))
+        num_classes = max_classes
+
+    v = np.linspace(-cutoff*width, cutoff*width, num_classes)
+    weights = macro.maxwell_boltzmann(v, width)
+
+    return v, weights/weights.sum()
+
+class DopplerScan(object):
+    """ A detuning scan of an OB object averaged over atomic velocities.
+
+    Attributes:
+        ob_obj: the OB object to scan.
+        Delta_range: array of detunings to solve for.
+        Delta_idx: the index of the scanned detuning in Deltas.
+        k: list of the wavevector projection of each detuning's beam, one
+            per item of Deltas, e.g. [k_p, -k_c] for counter-propagating
+            probe and coupling beams.
+        width: the width of the Maxwell-Boltzmann distribution [m/s].
+        v: array of the velocity classes. With only width given, they are
+            chosen by velocity_grid at each solve, from the linewidth of the
+            OB object then.
+        weights: array of the weight of each velocity class.
+        rho_v: (len(v), len(Delta_range), n, n) array of the states of each
+            velocity class, or (len(v), len(Delta_range), T, n, n) after
+            propagate.
+        rho_Delta: the Doppler-averaged states, (len(Delta_range), n, n).
+    """
+
+    def __init__(self, ob_obj, Delta_range, k, width=None, num_classes=None,
+                 Delta_idx=0, v=None, weights=None, linewidth=None,
+                 resolution=2.):
+        """
+        Args:
+            ob_obj: the OB object to scan.
+            Delta_range: array of detunings to solve for.
+            k: list of wavevector projections, one per item of Deltas.
+            width: the width of the Maxwell-Boltzmann distribution [m/s].
+            num_classes: the number of Gauss-Hermite velocity classes. Default
+                is a velocity_grid resolving the linewidth.
+            Delta_idx: the index of the scanned detuning in Deltas.
+            v, weights: explicit velocity classes and weights.
+            linewidth: the narrowest homogeneous half width to resolve.
+                Default is the slowest decay rate of the Liouvillian (see
+                linewidth).
+            resolution: velocity_grid classes per linewidth/k.
+        """
+
+        self.ob_obj = ob_obj
+        self.Delta_range = np.asarray(Delta_range, dtype=float)
+        self.Delta_idx = Delta_idx
+        self.k = list(k)
+        self.width = width
+        self.fixed_linewidth = linewidth
+        self.resolution = resolution
+
+        if v is None:
+            if width is None:
+                raise ValueError('Give either width or v and weights.')
+            if num_classes is not None:
+                v, weights = gauss_hermite(width, num_classes)
+
+        self.v = None if v is None else np.asarray(v, dtype=float)
+        self.weights = (None if weights is None
+                        else np.asarray(weights, dtype=float))
+        self._gauss_hermite = v is not None and num_classes is not None
+
+        self.rho_v = None
+        self.rho_Delta = None
+
+    def __repr__(self):
+
+        return "<DopplerScan :: %d detunings x %s velocity classes>" % (
+            len(self.Delta_range), 'auto' if self.v is None else len(self.v))
+
+    def shift_rates(self, Deltas):
+        """ The diagonal of the Hamiltonian per unit velocity, from every
+        Doppler-shifted detuning. """
+
+        ob_obj = self.ob_obj
+
+        dH_v = np.zeros(ob_obj.num_states, dtype=complex)
+        for i, k_i in enumerate(self.k):
+            if k_i:
+                dH_v -= k_i*ob_obj.H_Delta_parts(Deltas, i)[1]
+
+        return dH_v
+
+    def linewidth(self, Deltas):
+        """ The slowest nonzero decay rate, |Re λ|, of the Liouvillian at
+        zero scanned detuning, which is the half width of the narrowest
+        line it can have, unless set when creating the scan. """
+
+        if self.fixed_linewidth is not None:
+            return self.fixed_linewidth
+
+        H_Delta_0 = self.ob_obj.H_Delta_parts(Deltas, self.Delta_idx)[0]
+        rates = np.abs(np.linalg.eigvals(
+            self.ob_obj.liouvillian(H_Delta_0)).real)
+
+        rates = rates[rates > 1e-9*max(rates.max(), 1e-300)]
+
+        if not len(rates):
+            raise ValueError('The Liouvillian has no decay to set the '
+                             'velocity classes from; give linewidth.')
+
+        return rates.min()
+
+    def velocity_classes(self, Deltas):
+        """ Chooses the velocity classes for the current OB object, if they
+        weren't given, and warns if Gauss-Hermite nodes are too far apart
+        to resolve the linewidth. """
+
+        if self.v is not None and not self._gauss_hermite:
+            return
+
+        Deltas = [0. if D is None else D for D in Deltas]
+
+        k_eff = np.abs(liouville.commutator_diag(
+            self.shift_rates(Deltas))).max()
+        if not k_eff:
+            if self.v is None:
+                self.v, self.weights = gauss_hermite(self.width, 1)
+            return
+
+        linewidth = self.linewidth(Deltas)
+
+        if self._gauss_hermite:
+            spacing = k_eff*np.diff(self.v).min()
+            if spacing > 2.*linewidth:
+                warnings.warn('The Gauss-Hermite velocity classes are %.3g '
+                              'apart in detuning, more than the linewidth '
+                              '%.3g, so the Doppler average will be '
+                              'inaccurate. Leave num_classes unset to use a '
+                              'velocity grid resolving it.' %
+                              (spacing, 2.*linewidth))
+        else:
+            self.v, self.weights = velocity_grid(self.width, k_eff,
+                                                 linewidth, self.resolution)
+
+    def liouvillian_parts(self, Deltas):
+        """ Returns the fixed Liouvillian and the (len(v)*len(Delta_range),
+        n²) diagonals added to it at each (velocity, detuning) point, in
+        velocity-major order. """
+
+        ob_obj = self.ob_obj
+
+        # The scanned item may be given as None, as to OBScan.
+        Deltas = [0. if D is None else D for D in Deltas]
+
+        self.velocity_classes(Deltas)
+
+        H_Delta_0, dH_scan = ob_obj.H_Delta_parts(Deltas, self.Delta_idx)
+        dH_v = self.shift_rates(Deltas)
+
+        L = ob_obj.liouvillian(H_Delta_0)
+
+        d = (self.Delta_range[None, :, None]*dH_scan +
+             self.v[:, None, None]*dH_v) # (num_v, num_Delta, n)
+
+        L_diags = liouville.commutator_diag(d)
+
+        return L, L_diags.reshape((-1, L_diags.shape[-1]))
+
+    def average(self, rho_v):
+        """ The weighted average over the velocity classes (first axis). """
+
+        return np.tensordot(self.weights, rho_v, axes=1)
+
+    def steadystate(self, Deltas, chunk_size=None):
+        """ Finds the steady state of every velocity class at every point in
+        Delta_range, with stacked linear solves, and their average.
+
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta. The item at
+                Delta_idx is replaced by each point in Delta_range.
+            chunk_size: number of systems to solve at once.
+
+        Returns:
+            rho_Delta: (len(Delta_range), n, n) array of the Doppler-averaged
+                steady states.
+        """
+
+        n = self.ob_obj.num_states
+
+        L, L_diags = self.liouvillian_parts(Deltas)
+
+        with metrics.of(self.ob_obj).solver():
+            rho = liouville.steadystate_diags(L, L_diags, chunk_size)
+
+        self.rho_v = rho.reshape((len(self.v), len(self.Delta_range), n, n))
+        self.rho_Delta = self.average(self.rho_v)
+
+        return self.rho_Delta
+
+    def propagate(self, Deltas, tlist, rho0=None, chunk_size=None):
+        """ Evolves every velocity class at every point in Delta_range by
+        the eigendecomposition propagator (see OBScan.propagate), and
+        averages them.
+
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta.
+            tlist: The list of times for which to find the density matrix.
+            rho0: Define an initial density matrix. Default is ground state.
+            chunk_size: number of systems to diagonalise at once.
+
+        Returns:
+            states: (len(Delta_range), len(tlist), n, n) array of the
+                Doppler-averaged states. The final states are kept in
+                rho_Delta.
+        """
+
+        ob_obj = self.ob_obj
+        n = ob_obj.num_states
+
+        if rho0 is None:
+            rho0 = ob_obj.ground_state()*ob_obj.ground_state().dag()
+
+        if chunk_size is None:
+            chunk_size = liouville.chunk_length(n)
+
+        rho0_vec = liouville.vec(liouville.to_dm(rho0))
+
+        L, L_diags = self.liouvillian_parts(Deltas)
+
+        states = np.empty((len(L_diags), len(tlist), n, n), dtype=complex)
+
+        m = metrics.of(ob_obj)
+
+        for start in range(0, len(L_diags), chunk_size):
+            L_s = liouville.add_diag(L, L_diags[start:start + chunk_size])
+            with m.solver():
+                states[start:start + chunk_size] = liouville.unvec(
+                    liouville.evolve_eig(L_s, rho0_vec, tlist))
+            m.progress(min(start + chunk_size, len(L_diags)), len(L_diags),
+                       'DopplerScan.propagate')
+
+        self.rho_v = states.reshape((len(self.v), len(self.Delta_range),
+                                     len(tlist), n, n))
+        states = self.average(self.rho_v)
+        self.rho_Delta = states[:, -1]
+
+        return states
+
+    def coherence(self, a, b):
+        """ The Doppler-averaged coherence rho_ab at each detuning. """
+
+        return self.rho_Delta[..., a, b]
+
+    def susceptibility(self, tdme, E, N, a=0, b=1):
+        """ The linear susceptibility of the vapour at each detuning, from
+        the Doppler-averaged coherence rho_ab (see
+        macro.calc_susceptibility).
+
+        Args:
+            tdme: Transition dipole matrix element [e a_0]
+            E: Electric field amplitude [V/m]
+            N: Number density [/m3]
+            a, b: the levels of the probed transition.
+
+        Returns:
+            chi: array of the susceptibility at each detuning []
+        """
+
+        return macro.calc_susceptibility(tdme, E, N, self.coherence(a, b))
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+
+""" Fitting steady-state spectra to measurements.
+
+A SpectrumFit fits the parameters of a model spectrum, computed from the
+steady states of an OBScan, by Levenberg-Marquardt. The derivatives of the
+states come from the steady-state equations themselves: with A(θ) the
+Liouvillian at a detuning with its first row replaced by the trace
+condition, A x = e_0, so
+
+    dx/dθ = -A⁻¹ (dA/dθ) x
+
+and each system is factorised once for its state and the derivatives with
+respect to every parameter. The dA/dθ are central differences of the
+Liouvillian, which are exact for the usual parameters (Rabi frequencies
+enter H linearly, decay rates enter L linearly) and cost only Liouvillian
+assemblies, not solves.
+
+The parameters are a dict of name -> value. The function set_params(ob_obj,
+params) sets the OB object up for them, e.g. with set_H_Omega and c_ops;
+the function observe(rho_Delta, params) turns the (N_Delta, n, n) states
+into the real model spectrum, e.g. with macro.calc_spectrum, and may use
+parameters of its own such as a temperature. The name 'Delta_offset' is
+reserved: the model at each detuning of Delta_range is solved at that
+detuning plus the offset.
+"""
+
+import numpy as np
+from scipy.linalg import lu_factor, lu_solve
+
+import liouville
+import metrics
+
+class SpectrumFit(object):
+    """ A fit of a model spectrum from an OBScan to data.
+
+    Attributes:
+        scan: the OBScan, whose Delta_range are the detunings of the data.
+        Deltas: list of detunings, as passed to set_H_Delta. The item at
+            Delta_idx of the scan is replaced by each point in Delta_range.
+        data: (N_Delta,) array of the measured spectrum.
+        sigma: (N_Delta,) array of the uncertainty of each data point.
+        names: the names of the free parameters.
+        params: dict of the values of all parameters, free and fixed, the
+            best fit after fit.
+        covariance: (P, P) covariance of the free parameters, in the order
+            of names, after fit.
+        cost: half the sum of squared weighted residuals, after fit.
+        num_iterations: number of Levenberg-Marquardt steps taken.
+        num_solves: number of stacked steady-state solves of the scan.
+    """
+
+    def __init__(self, scan, Deltas, data, params, set_params=None,
+                 observe=None, sigma=None, fixed=()):
+        """
+        Args:
+            scan: the OBScan.
+            Deltas: list of detunings, as passed to set_H_Delta.
+            data: (N_Delta,) array of the measured spectrum.
+            params: dict of the initial parameter values.
+            set_params: function (ob_obj, params) setting the OB object up.
+            observe: function (rho_Delta, params) returning the model
+                spectrum. Default is the upper state population rho_11.
+            sigma: uncertainty of the data points. Default is 1.
+            fixed: names of parameters held at their initial values.
+        """
+
+        self.scan = scan
+        self.Deltas = list(Deltas)
+        self.data = np.asarray(data, dtype=float)
+        self.sigma = (np.ones_like(self.data) if sigma is None
+                      else np.asarray(sigma, dtype=float))
+
+        self.names = [name for name in params if name not in fixed]
+        self.params = dict(params)
+
+        self.set_params = set_params or (lambda ob_obj, params: None)
+        self.observe = observe or (lambda rho, params: rho[:, 1, 1].real)
+
+        self.covariance = None
+        self.cost = None
+        self.num_iterations = 0
+        self.num_solves = 0
+
+    def __repr__(self):
+
+        return "<SpectrumFit :: %s>" % self.params
+
+    def liouvillian_parts(self, params):
+        """ The fixed Liouvillian and the diagonal per unit scanned detuning,
+        for a set of parameter values. """
+
+        ob_obj = self.scan.ob_obj
+
+        self.set_params(ob_obj, params)
+
+        H_Delta_0, dH_Delta = ob_obj.H_Delta_parts(self.Deltas,
+                                                   self.scan.Delta_idx)
+
+        return (ob_obj.liouvillian(H_Delta_0),
+                liouville.commutator_diag(dH_Delta))
+
+    def liouvillian_derivatives(self, params, steps):
+        """ dL/dθ for each parameter by central differences of the
+        Liouvillian, with the first row set to zero as the trace condition
+        doesn't depend on θ. None for a parameter that L doesn't depend on.
+        """
+
+        dL = []
+
+        for name in self.names:
+
+            if name == 'Delta_offset':
+                dL.append(None)
+                continue
+
+            h = steps[name]
+            p_plus, p_minus = dict(params), dict(params)
+            p_plus[name] += h
+            p_minus[name] -= h
+
+            dL_i = (self.liouvillian_parts(p_plus)[0] -
+                    self.liouvillian_parts(p_minus)[0])/(2.*h)
+            dL_i[0] = 0.
+
+            dL.append(dL_i if np.any(dL_i) else None)
+
+        self.set_params(self.scan.ob_obj, params)
+
+        return dL
+
+    def steps(self, params):
+        """ The finite-difference step of each parameter. """
+
+        return dict((name, 1e-6*max(1., abs(params[name])))
+                    for name in self.names)
+
+    def model(self, params, jacobian=False, chunk_size=None):
+        """ The model spectrum, and optionally its Jacobian.
+
+        Args:
+            params: dict of parameter values.
+            jacobian: also find the derivatives?
+            chunk_size: number of detunings to solve at once.
+
+        Returns:
+            y: (N_Delta,) array.
+            J: (N_Delta, P) array of dy/dθ for the free parameters, in the
+                order of names, if jacobian.
+        """
+
+        scan = self.scan
+        n = scan.ob_obj.num_states
+        n2 = n**2
+
+        shifts = (np.asarray(scan.Delta_range, dtype=float) +
+                  params.get('Delta_offset', 0.))
+
+        L, L_Delta = self.liouvillian_parts(params)
+
+        m = metrics.of(scan.ob_obj)
+        self.num_solves += 1
+
+        if not jacobian:
+            with m.solver():
+                rho = liouville.steadystate_stack(L, L_Delta, shifts,
+                                                  chunk_size)
+            return self.observe(rho, params)
+
+        steps = self.steps(params)
+        dL = self.liouvillian_derivatives(params, steps)
+
+        if chunk_size is None:
+            chunk_size = liouville.chunk_length(n)
+
+        x = np.empty((len(shifts), n2), dtype=complex)
+        dx = np.zeros((len(self.names), len(shifts), n2), dtype=complex)
+
+        trace = liouville.trace_row(n)
+
+        e_0 = np.zeros(n2, dtype=complex)
+        e_0[0] = 1.
+
+        for start in range(0, len(shifts), chunk_size):
+            s = slice(start, start + chunk_size)
+
+            A = liouville.add_diag(L, shifts[s, None]*L_Delta)
+            A[:, 0, :] = trace
+
+            # One factorisation per system gives the state, then one
+            # back-substitution for the derivatives of every parameter.
+            with m.solver():
+                for k, A_k in enumerate(A, start):
+                    lu = lu_factor(A_k, overwrite_a=True, check_finite=False)
+                    x[k] = lu_solve(lu, e_0, check_finite=False)
+
+                    dA_x = np.zeros((n2, len(self.names)), dtype=complex)
+                    for i, name in enumerate(self.names):
+                        if name == 'Delta_offset':
+                            dA_x[:, i] = L_Delta*x[k]
+                            dA_x[0, i] = 0.
+                        elif dL[i] is not None:
+                            dA_x[:, i] = dL[i].dot(x[k])
+
+                    if np.any(dA_x):
+                        dx[:, k] = -lu_solve(lu, dA_x,
+                                             check_finite=False).T
+
+        rho = liouville.unvec(x)
+        y = self.observe(rho, params)
+
+        J = np.empty((len(y), len(self.names)))
+
+        for i, name in enumerate(self.names):
+
+            # The change of the spectrum along the change of the states, and
+            # through any direct dependence of observe on the parameter.
+            h = steps[name]
+            p_plus, p_minus = dict(params), dict(params)
+            p_plus[name] += h
+            p_minus[name] -= h
+
+            J[:, i] = (self.observe(liouville.unvec(x + h*dx[i]), p_plus) -
+                       self.observe(liouville.unvec(x - h*dx[i]), p_minus)
+                       )/(2.*h)
+
+        return y, J
+
+    def residuals(self, y):
+
+        return (y - self.data)/self.sigma
+
+    def fit(self, max_iterations=100, ftol=1e-10, xtol=1e-10, lam=1e-3,
+            chunk_size=None):
+        """ Fits the parameters by Levenberg-Marquardt.
+
+        Args:
+            max_iterations: maximum number of accepted steps.
+            ftol: stop when the cost falls by less than this fraction.
+            xtol: stop when the step is less than this fraction of the
+                parameters.
+            lam: initial damping.
+            chunk_size: number of detunings to solve at once.
+
+        Returns:
+            params: dict of the best-fit parameter values, also kept in
+                params.
+        """
+
+        theta = np.array([self.params[name] for name in self.names],
+                         dtype=float)
+
+        def to_params(theta):
+            params = dict(self.params)
+            params.update(zip(self.names, theta))
+            return params
+
+        y, J = self.model(to_params(theta), jacobian=True,
+                          chunk_size=chunk_size)
+        r = self.residuals(y)
+        J = J/self.sigma[:, None]
+        cost = 0.5*np.dot(r, r)
+
+        self.num_iterations = 0
+
+        while self.num_iterations < max_iterations:
+
+            JTJ = J.T.dot(J)
+            g = J.T.dot(r)
+
+            step = np.linalg.solve(JTJ + lam*np.diag(np.diag(JTJ) + 1e-30),
+                                   -g)
+            theta_new = theta + step
+
+            r_new = self.residuals(self.model(to_params(theta_new),
+                                              chunk_size=chunk_size))
+            cost_new = 0.5*np.dot(r_new, r_new)
+
+            if cost_new < cost:
+                self.num_iterations += 1
+                lam = max(lam/10., 1e-12)
+
+                converged = (cost - cost_new <= ftol*cost or
+                             np.all(np.abs(step) <=
+                                    xtol*(np.abs(theta) + xtol)))
+
+                theta, cost = theta_new, cost_new
+
+                if converged:
+                    break
+
+                y, J = self.model(to_params(theta), jacobian=True,
+                                  chunk_size=chunk_size)
+                r = self.residuals(y)
+                J = J/self.sigma[:, None]
+            else:
+                lam *= 10.
+                if lam > 1e12:
+                    break
+
+        self.params = to_params(theta)
+        self.set_params(self.scan.ob_obj, self.params)
+        self.cost = cost
+
+        # The covariance, scaled by the reduced chi² in case sigma is unknown.
+        _, J = self.model(self.params, jacobian=True, chunk_size=chunk_size)
+        J = J/self.sigma[:, None]
+        dof = max(len(self.data) - len(self.names), 1)
+        self.covariance = np.linalg.pinv(J.T.dot(J))*(2.*cost/dof)
+
+        return self.params
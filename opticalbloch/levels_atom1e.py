@@ -1,4 +1,11 @@
 import numpy as np
+import scipy.sparse as sp
+
+import ang_mom
+
+# Record type of the compiled mF level index.
+mF_dtype = np.dtype([('nL', int), ('n', int), ('L', float), ('J', float),
+                     ('F', float), ('mF', float), ('energy', float)])
 
 class Atom1e(object):
 
@@ -10,14 +17,114 @@ class Atom1e(object):
         self.S = S
         self.nL_levels = []
 
+        # Compiled index of each nL level and its size when compiled.
+        self._nL_index = []
+        self._nL_sizes = []
+        self._dipole_tensors = {}
+
     def __repr__(self):
 
-        return "<Atom1e :: %s>" % self.__dict__
+        return "<Atom1e :: %s>" % {k: v for k, v in self.__dict__.items()
+                                   if not k.startswith('_')}
 
     def add_nL_level(self, nL_level):
 
         self.nL_levels.append(nL_level)
 
+        self._nL_index.append(self._compile_nL_level(len(self.nL_levels)-1))
+        self._nL_sizes.append(nL_level.get_num_mF_levels())
+
+    def _compile_nL_level(self, i):
+        """ Returns the mF index records of the ith nL level. """
+
+        nL_level = self.nL_levels[i]
+
+        records = [(i, nL_level.n, nL_level.L, J_level.J, F_level.F,
+                    mF_level.mF, mF_level.energy)
+                   for J_level in nL_level.J_levels
+                   for F_level in J_level.F_levels
+                   for mF_level in F_level.mF_levels]
+
+        return np.array(records, dtype=mF_dtype)
+
+    def get_mF_index(self):
+        """ Returns the compiled level index: a structured array with one
+        record per mF sublevel (fields nL, n, L, J, F, mF, energy), in the
+        same order as get_mF_list.
+
+        Each nL level is compiled once, when it is added, and only recompiled
+        if sublevels have since been built in it.
+        """
+
+        changed = False
+
+        for i, nL_level in enumerate(self.nL_levels):
+            size = nL_level.get_num_mF_levels()
+            if size != self._nL_sizes[i]:
+                self._nL_index[i] = self._compile_nL_level(i)
+                self._nL_sizes[i] = size
+                changed = True
+
+        if changed:
+            self._dipole_tensors = {}
+
+        if not self._nL_index:
+            return np.zeros(0, dtype=mF_dtype)
+
+        return np.concatenate(self._nL_index)
+
+    def get_dipole_tensor(self, nL_a, nL_b):
+        """ The dipole-coupling tensor between two nL manifolds: for each
+        polarisation q = -1, 0, +1 a sparse matrix over all the mF sublevels
+        of the atom, with element [a, b] the hyperfine Clebsch-Gordan
+        coefficient (ang_mom.calc_clebsch_hf) from sublevel a in nL_a to
+        sublevel b in nL_b.
+
+        The tensors are cached until sublevels are added to the atom. Wrap a
+        matrix in qu.Qobj to use it in an OB Hamiltonian.
+
+        Args:
+            nL_a: index of the first nL level in nL_levels.
+            nL_b: index of the second nL level in nL_levels.
+
+        Returns:
+            [d_-1, d_0, d_+1]: list of scipy.sparse CSR matrices.
+        """
+
+        index = self.get_mF_index()
+
+        try:
+            return self._dipole_tensors[(nL_a, nL_b)]
+        except KeyError:
+            pass
+
+        idx_a = np.flatnonzero(index['nL'] == nL_a)
+        idx_b = np.flatnonzero(index['nL'] == nL_b)
+
+        a = index[idx_a][:, None]
+        b = index[idx_b][None, :]
+
+        N = len(index)
+        d = []
+
+        for q in (-1, 0, 1):
+            # Only the pairs with mF_a = mF_b + q can be nonzero.
+            rows, cols = np.nonzero(a['mF'] == b['mF'] + q)
+            a_q = a[rows, 0]
+            b_q = b[0, cols]
+
+            coeffs = ang_mom.calc_clebsch_hf_batch(a_q['J'], self.I,
+                                                   a_q['F'], a_q['mF'],
+                                                   b_q['J'], self.I,
+                                                   b_q['F'], b_q['mF'], q)
+
+            d.append(sp.csr_matrix((coeffs, (idx_a[rows], idx_b[cols])),
+                                   shape=(N, N)))
+
+        self._dipole_tensors[(nL_a, nL_b)] = d
+
+        return d
+
     def get_mF_list(self):
 
         mF_list = []
@@ -50,19 +157,11 @@ class Atom1e(object):
 
     def get_num_mF_levels(self):
 
-        return len(self.get_mF_list())
+        return len(self.get_mF_index())
 
     def get_mF_energies(self):
 
-        mF_list = self.get_mF_list()
-
-        mF_energies = []
-
-        for mF_level in mF_list:
-
-            mF_energies.append(mF_level['energy'])
-
-        return mF_energies
+        return list(self.get_mF_index()['energy'])
 
 class LevelNL(object):
 
@@ -108,6 +207,11 @@ class LevelNL(object):
 
         return self.get_J_range().size
 
+    def get_num_mF_levels(self):
+
+        return sum(len(F_level.mF_levels) for J_level in self.J_levels
+                   for F_level in J_level.F_levels)
+
 
 class LevelJ(object):
 
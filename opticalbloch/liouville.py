@@ -0,0 +1,868 @@
+# -*- coding: utf-8 -*-
+
+""" Liouville-space helpers for solving the optical Bloch equations directly
+with NumPy and SciPy, without the per-call overhead of building QuTiP
+objects. Dense arrays are used for small systems and sparse (CSR) matrices
+with iterative solvers for large ones, e.g. multi-atom systems.
+
+The density matrix is vectorised row-major (C order), so that for an n-level
+system rho[a, b] is element a*n + b of the vector. With this convention
+
+    vec(A rho B) = kron(A, B.T) vec(rho)
+
+and a vector is turned back into a density matrix with a plain reshape.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+# Largest stack of Liouvillians (in bytes) built at once by the batched
+# solvers. Longer sweeps are solved in chunks of this size.
+MAX_STACK_BYTES = 2**27
+
+# Liouville space dimension (n²) above which the steady state is found with
+# the sparse iterative solver.
+SPARSE_THRESHOLD = 1024
+
+def to_array(op):
+    """ Returns a dense complex array for a QuTiP Qobj or array-like. """
+
+    if hasattr(op, 'full'):
+        return op.full()
+    else:
+        return np.asarray(op, dtype=complex)
+
+def vec(rho):
+    """ Row-major vectorisation of a density matrix (or stack of them). """
+
+    rho = np.asarray(rho)
+    return rho.reshape(rho.shape[:-2] + (rho.shape[-2]*rho.shape[-1],))
+
+def unvec(rho_vec):
+    """ Inverse of vec. Reshapes the last axis of length n² to (n, n). """
+
+    rho_vec = np.asarray(rho_vec)
+    n = int(round(np.sqrt(rho_vec.shape[-1])))
+    return rho_vec.reshape(rho_vec.shape[:-1] + (n, n))
+
+def liouvillian(H, c_ops=[]):
+    """ Builds the Liouvillian superoperator as a dense array.
+
+    Args:
+        H: Hamiltonian (Qobj or array)
+        c_ops: list of collapse operators (Qobj or array)
+
+    Returns:
+        L: (n², n²) array such that d/dt vec(rho) = L vec(rho)
+    """
+
+    H = to_array(H)
+    n = H.shape[0]
+    eye = np.eye(n)
+
+    L = -1j*(np.kron(H, eye) - np.kron(eye, H.T))
+
+    for c in c_ops:
+        c = to_array(c)
+        cdc = c.conj().T.dot(c)
+        L += (np.kron(c, c.conj()) - 0.5*np.kron(cdc, eye)
+              - 0.5*np.kron(eye, cdc.T))
+
+    return L
+
+def commutator_diag(d):
+    """ The Liouvillian of a diagonal Hamiltonian diag(d).
+
+    A diagonal Hamiltonian gives a diagonal Liouvillian, so only the diagonal
+    is returned.
+
+    Args:
+        d: the diagonal of the Hamiltonian, (n,) or a stack (..., n).
+
+    Returns:
+        l: (n²,) or (..., n²) array, the diagonal of -i[diag(d), .]
+    """
+
+    d = np.asarray(d)
+    l = -1j*(d[..., :, None] - d[..., None, :])
+    return l.reshape(d.shape[:-1] + (d.shape[-1]**2,))
+
+def trace_row(n):
+    """ The row vector t such that t.vec(rho) = Tr(rho). """
+
+    return np.eye(n).ravel().astype(complex)
+
+def chunk_length(n, max_bytes=MAX_STACK_BYTES):
+    """ Number of (n², n²) complex matrices that fit in max_bytes. """
+
+    return max(1, int(max_bytes//(16*n**4)))
+
+def steadystate_solve(L):
+    """ Finds the steady state of each Liouvillian in a stack with one
+    stacked linear solve. The first (population) equation of each system is
+    replaced by the trace condition Tr(rho) = 1.
+
+    Args:
+        L: (N, n², n²) array of Liouvillians. It is overwritten.
+
+    Returns:
+        rho: (N, n, n) array of steady-state density matrices.
+    """
+
+    n2 = L.shape[-1]
+    n = int(round(np.sqrt(n2)))
+
+    L[..., 0, :] = trace_row(n)
+
+    b = np.zeros(L.shape[:-1] + (1,), dtype=complex)
+    b[..., 0, 0] = 1.
+
+    return unvec(np.linalg.solve(L, b)[..., 0])
+
+def add_diag(L, L_diags):
+    """ Returns the stack of Liouvillians L + diag(L_diags[k]).
+
+    Args:
+        L: (n², n²) array.
+        L_diags: (N, n²) array of diagonals.
+
+    Returns:
+        (N, n², n²) array.
+    """
+
+    n2 = L.shape[0]
+    diag_idx = np.arange(n2)
+
+    A = np.empty((len(L_diags), n2, n2), dtype=complex)
+    A[:] = L
+    A[:, diag_idx, diag_idx] += L_diags
+
+    return A
+
+def steadystate_diags(L, L_diags, chunk_size=None):
+    """ Finds the steady states of the family of Liouvillians
+
+        L + diag(L_diags[k])
+
+    with one stacked linear solve (see steadystate_solve) per chunk.
+
+    Args:
+        L: (n², n²) array, the fixed part of the Liouvillian.
+        L_diags: (N, n²) array, the diagonal part of each Liouvillian (e.g.
+            from commutator_diag of the detunings at each point).
+        chunk_size: number of systems to solve at once. Default fits the
+            stack in MAX_STACK_BYTES.
+
+    Returns:
+        rho: (N, n, n) array of steady-state density matrices.
+    """
+
+    n = int(round(np.sqrt(L.shape[0])))
+
+    if chunk_size is None:
+        chunk_size = chunk_length(n)
+
+    rho = np.empty((len(L_diags), n, n), dtype=complex)
+
+    for start in range(0, len(L_diags), chunk_size):
+        A = add_diag(L, L_diags[start:start + chunk_size])
+        rho[start:start + chunk_size] = steadystate_solve(A)
+
+    return rho
+
+def steadystate_stack(L, L_diag, shifts, chunk_size=None):
+    """ Finds the steady states of the family of Liouvillians
+
+        L + shifts[k]*diag(L_diag)
+
+    with one stacked linear solve (see steadystate_solve) per chunk.
+
+    Args:
+        L: (n², n²) array, the fixed part of the Liouvillian.
+        L_diag: (n²,) array, the diagonal Liouvillian multiplied by each shift
+            (e.g. from commutator_diag of the detuning operator).
+        shifts: (N,) array of shifts, e.g. the detuning range.
+        chunk_size: number of systems to solve at once. Default fits the
+            stack in MAX_STACK_BYTES.
+
+    Returns:
+        rho: (N, n, n) array of steady-state density matrices.
+    """
+
+    shifts = np.asarray(shifts)
+
+    return steadystate_diags(L, shifts[:, None]*L_diag, chunk_size)
+
+def to_dm(rho):
+    """ Returns a density matrix array for a Qobj or array-like, which may be
+    either a state vector or a density matrix. """
+
+    rho = to_array(rho)
+
+    if rho.ndim == 1 or rho.shape[-1] == 1:
+        psi = rho.ravel()
+        return np.outer(psi, psi.conj())
+    else:
+        return rho
+
+def evolve_expm(L, rho0_vec, tlist):
+    """ rho(t) = expm(L t) rho(0) by matrix exponentials between consecutive
+    times. The step propagator is reused while the time step is unchanged.
+
+    Args:
+        L: (n², n²) Liouvillian
+        rho0_vec: (n²,) vectorised density matrix at t = 0
+        tlist: (T,) array of times
+
+    Returns:
+        rho_t: (T, n²) array of vectorised density matrices
+    """
+
+    from scipy.linalg import expm
+
+    tlist = np.asarray(tlist, dtype=float)
+    rho_t = np.empty((len(tlist), L.shape[0]), dtype=complex)
+
+    rho = expm(L*tlist[0]).dot(rho0_vec) if len(tlist) else rho0_vec
+    dt_prev = None
+
+    for i, t in enumerate(tlist):
+        if i > 0:
+            dt = t - tlist[i-1]
+            if dt_prev is None or not np.isclose(dt, dt_prev):
+                P = expm(L*dt)
+                dt_prev = dt
+            rho = P.dot(rho)
+        rho_t[i] = rho
+
+    return rho_t
+
+def evolve_eig(L, rho0_vec, tlist, cond_max=1e10):
+    """ rho(t) = expm(L t) rho(0) for every t in tlist from one
+    eigendecomposition of L, as
+
+        rho(t) = V exp(lambda t) V^-1 rho(0)
+
+    evaluated for all times in one vectorised contraction. L may be a stack
+    of Liouvillians, (N, n², n²), with rho0_vec (n²,) or (N, n²).
+
+    If the eigenvector matrix of a Liouvillian is ill-conditioned (L is
+    defective or nearly so) that system falls back to evolve_expm.
+
+    Args:
+        L: (n², n²) or (N, n², n²) Liouvillian(s)
+        rho0_vec: vectorised density matrix at t = 0
+        tlist: (T,) array of times
+        cond_max: largest condition number of the eigenvectors accepted.
+
+    Returns:
+        rho_t: (T, n²) or (N, T, n²) array of vectorised density matrices
+    """
+
+    tlist = np.asarray(tlist, dtype=float)
+
+    lam, V = np.linalg.eig(L)
+    rho0_vec = np.broadcast_to(rho0_vec, lam.shape)
+
+    defective = ~(np.linalg.cond(V) < cond_max)
+
+    if L.ndim == 2 and defective:
+        return evolve_expm(L, rho0_vec, tlist)
+
+    # Swap in the identity for defective systems so the solve below can't
+    # fail. They are recalculated with evolve_expm afterwards.
+    V_safe = np.where(defective[..., None, None], np.eye(L.shape[-1]), V)
+    c = np.linalg.solve(V_safe, rho0_vec[..., None])[..., 0]
+
+    exp_lt = np.exp(tlist[:, None]*lam[..., None, :]) # (..., T, n²)
+    rho_t = np.einsum('...tk,...jk->...tj', exp_lt*c[..., None, :], V)
+
+    for i in np.flatnonzero(defective):
+        rho_t[i] = evolve_expm(L[i], rho0_vec[i], tlist)
+
+    return rho_t
+
+class Solver(object):
+    """ A Liouvillian with its factorisations kept, to apply to many
+    right-hand sides or initial states.
+
+    The LU factorisation of the steady-state system (L with its first row
+    replaced by the trace condition) and the eigendecomposition of L are
+    each found on first use. A stack of K right-hand sides or initial states
+    is then handled as one (n², K) matrix, so every solve is a single BLAS-3
+    call however many there are.
+
+    Attributes:
+        L: (n², n²) array, a copy of the Liouvillian.
+        n: the number of states.
+        cond_max: largest condition number of the eigenvectors accepted.
+    """
+
+    def __init__(self, L, cond_max=1e10):
+
+        self.L = np.array(L, dtype=complex)
+        self.n = int(round(np.sqrt(self.L.shape[0])))
+        self.cond_max = cond_max
+
+        self._lu = None
+        self._eig = None
+
+    def __repr__(self):
+
+        return "<Solver :: %d states>" % self.n
+
+    def lu(self):
+        """ The LU factorisation of the steady-state system (see
+        scipy.linalg.lu_factor). """
+
+        from scipy.linalg import lu_factor
+
+        if self._lu is None:
+            A = self.L.copy()
+            A[0] = trace_row(self.n)
+            self._lu = lu_factor(A)
+
+        return self._lu
+
+    def eig(self):
+        """ The eigenvalues, eigenvectors and LU factorisation of the
+        eigenvectors of L, or None if L is defective or nearly so. """
+
+        from scipy.linalg import lu_factor
+
+        if self._eig is None:
+            lam, V = np.linalg.eig(self.L)
+            if np.linalg.cond(V) < self.cond_max:
+                self._eig = (lam, V, lu_factor(V))
+            else:
+                self._eig = False
+
+        return self._eig or None
+
+    def solve(self, b):
+        """ Solves the steady-state system A x = b, where A is L with its
+        first row replaced by the trace row, for one or a stack of b. Row 0
+        of b is the trace of the solution; the other rows are the right-hand
+        side of L x, e.g. -dL x for the linear response to a change dL.
+
+        Args:
+            b: (n²,) or (K, n²) array.
+
+        Returns:
+            x: array of the shape of b.
+        """
+
+        from scipy.linalg import lu_solve
+
+        b = np.asarray(b, dtype=complex)
+
+        return lu_solve(self.lu(), b.T).T
+
+    def steadystate(self):
+        """ Returns: the (n, n) steady-state density matrix. """
+
+        b = np.zeros(self.n**2, dtype=complex)
+        b[0] = 1.
+
+        return unvec(self.solve(b))
+
+    def evolve(self, rho0, tlist):
+        """ rho(t) = expm(L t) rho(0) for one or a stack of initial states,
+        from the kept eigendecomposition (see evolve_eig), or by matrix
+        exponentials if L is defective.
+
+        Args:
+            rho0: (n, n) density matrix or (K, n, n) stack of them.
+            tlist: (T,) array of times.
+
+        Returns:
+            states: (T, n, n) or (K, T, n, n) array of density matrices.
+        """
+
+        rho0 = np.asarray(rho0, dtype=complex)
+        R0 = rho0.reshape((-1, self.n**2)).T # (n², K)
+
+        tlist = np.asarray(tlist, dtype=float)
+        eig = self.eig()
+
+        if eig is not None:
+            from scipy.linalg import lu_solve
+
+            lam, V, V_lu = eig
+            C = lu_solve(V_lu, R0) # (n², K)
+
+            # (T, n², K), one matrix product per time.
+            R_t = np.matmul(V, np.exp(tlist[:, None]*lam)[:, :, None]*C)
+        else:
+            from scipy.linalg import expm
+
+            R_t = np.empty((len(tlist),) + R0.shape, dtype=complex)
+            R = expm(self.L*tlist[0]).dot(R0) if len(tlist) else R0
+            dt_prev = None
+
+            for i, t in enumerate(tlist):
+                if i > 0:
+                    dt = t - tlist[i-1]
+                    if dt_prev is None or not np.isclose(dt, dt_prev):
+                        P = expm(self.L*dt)
+                        dt_prev = dt
+                    R = P.dot(R)
+                R_t[i] = R
+
+        states = unvec(np.moveaxis(R_t, -1, 0)) # (K, T, n, n)
+
+        return states if rho0.ndim == 3 else states[0]
+
+    def resolvent(self, z, b):
+        """ (L - z)^-1 b for each z, from the kept eigendecomposition, e.g.
+        for the response at a set of frequencies z = -i omega.
+
+        Args:
+            z: (Z,) array of complex numbers, not eigenvalues of L.
+            b: (n²,) or (K, n²) array.
+
+        Returns:
+            (Z, n²) or (Z, K, n²) array.
+
+        Raises:
+            ValueError: if L is defective.
+        """
+
+        from scipy.linalg import lu_solve
+
+        eig = self.eig()
+
+        if eig is None:
+            raise ValueError('The Liouvillian is defective, so has no '
+                             'eigendecomposition.')
+
+        lam, V, V_lu = eig
+
+        b = np.asarray(b, dtype=complex)
+        C = lu_solve(V_lu, b.reshape((-1, len(lam))).T) # (n², K)
+
+        z = np.asarray(z, dtype=complex)
+        X = np.matmul(V, C/(lam[:, None] - z[:, None, None])) # (Z, n², K)
+
+        X = np.swapaxes(X, -1, -2)
+
+        return X if b.ndim == 2 else X[:, 0]
+
+def to_sparse(op):
+    """ Returns a CSR matrix for a QuTiP Qobj, sparse matrix or array-like. """
+
+    if hasattr(op, 'data'): # Qobj
+        op = op.data
+
+    return sp.csr_matrix(op, dtype=complex)
+
+def liouvillian_sparse(H, c_ops=[]):
+    """ Builds the Liouvillian superoperator as a sparse CSR matrix, with
+    the same (row-major) vectorisation as liouvillian.
+
+    Args:
+        H: Hamiltonian (Qobj, sparse matrix or array)
+        c_ops: list of collapse operators
+
+    Returns:
+        L: (n², n²) CSR matrix such that d/dt vec(rho) = L vec(rho)
+    """
+
+    H = to_sparse(H)
+    n = H.shape[0]
+    eye = sp.identity(n, dtype=complex, format='csr')
+
+    L = -1j*(sp.kron(H, eye) - sp.kron(eye, H.T))
+
+    for c in c_ops:
+        c = to_sparse(c)
+        cdc = c.conj().T.dot(c)
+        L = L + (sp.kron(c, c.conj()) - 0.5*sp.kron(cdc, eye)
+                 - 0.5*sp.kron(eye, cdc.T))
+
+    return sp.csr_matrix(L)
+
+def _krylov(solver, A, b, x0, M, tol, maxiter, callback=None):
+    """ Calls a scipy.sparse.linalg Krylov solver, whose tolerance keyword
+    is rtol in newer versions of SciPy and tol in older ones. """
+
+    kwargs = {'x0': x0, 'M': M, 'atol': 0., 'maxiter': maxiter,
+              'callback': callback}
+
+    if solver is spla.gmres:
+        kwargs['callback_type'] = 'pr_norm'
+
+    try:
+        return solver(A, b, rtol=tol, **kwargs)
+    except TypeError:
+        return solver(A, b, tol=tol, **kwargs)
+
+def steadystate_system(L):
+    """ The steady-state equations of a sparse Liouvillian, with the first
+    (population) equation replaced by the trace condition Tr(rho) = 1.
+
+    Returns:
+        A: (n², n²) CSC matrix.
+        b: (n²,) array, such that A vec(rho) = b.
+    """
+
+    n2 = L.shape[0]
+    n = int(round(np.sqrt(n2)))
+
+    A = sp.vstack([sp.csr_matrix(trace_row(n)), sp.csr_matrix(L)[1:]],
+                  format='csc')
+
+    b = np.zeros(n2, dtype=complex)
+    b[0] = 1.
+
+    return A, b
+
+def ilu_preconditioner(A, drop_tol=1e-6, fill_factor=20):
+    """ An incomplete LU factorisation of A as a preconditioner for the
+    Krylov solvers. """
+
+    ilu = spla.spilu(sp.csc_matrix(A), drop_tol=drop_tol,
+                     fill_factor=fill_factor)
+
+    return spla.LinearOperator(A.shape, ilu.solve, dtype=complex)
+
+def steadystate_iterative(L, method='gmres', x0=None, tol=1e-12,
+                          maxiter=1000, drop_tol=1e-6, fill_factor=20,
+                          M=None, info=None):
+    """ Finds the steady state of a sparse Liouvillian with a Krylov solver
+    preconditioned by an incomplete LU factorisation. As for the dense
+    solvers the first (population) equation is replaced by the trace
+    condition Tr(rho) = 1.
+
+    Args:
+        L: (n², n²) sparse Liouvillian.
+        method: 'gmres' or 'bicgstab'.
+        x0: optional initial guess for vec(rho), e.g. a nearby solution.
+        tol: relative tolerance of the solver.
+        maxiter: maximum number of iterations.
+        drop_tol: drop tolerance of the ILU preconditioner.
+        fill_factor: fill factor of the ILU preconditioner.
+        M: a preconditioner to use in place of a new ILU factorisation, e.g.
+            that of a nearby Liouvillian (see ilu_preconditioner).
+        info: optional dict, which is set to hold the number of
+            'iterations' taken and the preconditioner 'M' used, so it can be
+            passed on to the next solve.
+
+    Returns:
+        rho: (n, n) array, the steady-state density matrix.
+
+    Raises:
+        ValueError: if the solver doesn't converge.
+    """
+
+    solver = {'gmres': spla.gmres, 'bicgstab': spla.bicgstab}[method]
+
+    A, b = steadystate_system(L)
+
+    if M is None:
+        M = ilu_preconditioner(A, drop_tol, fill_factor)
+
+    iterations = [0]
+
+    def count(*args):
+        iterations[0] += 1
+
+    x, status = _krylov(solver, A, b, x0, M, tol, maxiter, callback=count)
+
+    if info is not None:
+        info['iterations'] = iterations[0]
+        info['M'] = M
+
+    if status != 0:
+        raise ValueError('Iterative steady state solver did not converge '
+                         '(info = ' + str(status) + ').')
+
+    return unvec(x)
+
+def evolve_piecewise(L_0, L_terms, pulses, rho0_vec, tlist, out=None,
+                     rtol=1e-8, atol=1e-10):
+    """ Evolves d/dt vec(rho) = (L_0 + sum_k f_k(t) L_k) vec(rho) for pulses
+    f_k (see the pulses module), with rho(tlist[0]) = rho0.
+
+    The time range is split at the breakpoints of the pulses, so a pulse
+    switching on or off can't be stepped over. Segments on which every pulse
+    is constant are stepped exactly with matrix exponentials (see
+    evolve_expm), and the others with the adaptive RK45 integrator of
+    scipy.integrate.solve_ivp.
+
+    Args:
+        L_0: (n², n²) Liouvillian of the static part.
+        L_terms: list of (n², n²) Liouvillians of the pulsed terms.
+        pulses: list of the pulses f_k, one per term.
+        rho0_vec: (n²,) vectorised density matrix at tlist[0].
+        tlist: (T,) increasing array of times.
+        out: optional (T, n, n) complex array to write the states into.
+        rtol, atol: tolerances of the RK45 integrator.
+
+    Returns:
+        out: (T, n, n) array of density matrices.
+    """
+
+    from scipy.integrate import solve_ivp
+
+    tlist = np.asarray(tlist, dtype=float)
+    n2 = L_0.shape[0]
+    n = int(round(np.sqrt(n2)))
+
+    if out is None:
+        out = np.empty((len(tlist), n, n), dtype=complex)
+
+    out_vec = out.reshape((len(tlist), n2))
+    out_vec[0] = rho0_vec
+
+    edges = _edges(pulses, tlist[0], tlist[-1])
+
+    funcs = [p.func() for p in pulses]
+    rho = np.asarray(rho0_vec, dtype=complex)
+    i = 1
+
+    for a, b in zip(edges[:-1], edges[1:]):
+
+        # Times in (a, b], and b itself to restart the next segment from.
+        j = np.searchsorted(tlist, b, side='right')
+        t_seg = tlist[i:j]
+        if not len(t_seg) or t_seg[-1] != b:
+            t_seg = np.append(t_seg, b)
+
+        if all(p.is_constant(a, b) for p in pulses):
+            L = L_0 + sum(f(0.5*(a + b))*L_k for f, L_k in zip(funcs, L_terms))
+            rho_seg = evolve_expm(L, rho, np.append(0., t_seg - a))[1:]
+        else:
+            def rhs(t, y):
+                dy = L_0.dot(y)
+                for f, L_k in zip(funcs, L_terms):
+                    dy = dy + f(t)*L_k.dot(y)
+                return dy
+
+            sol = solve_ivp(rhs, (a, b), rho, method='RK45', t_eval=t_seg,
+                            rtol=rtol, atol=atol)
+            rho_seg = sol.y.T
+
+        out_vec[i:j] = rho_seg[:j - i]
+        rho = rho_seg[-1]
+        i = j
+
+    return out
+
+def _edges(pulses, t_0, t_end):
+    """ t_0, t_end and the breakpoints of the pulses between them. """
+
+    return sorted(set([t_0, t_end] +
+                      [b for p in pulses for b in p.breakpoints()
+                       if t_0 < b < t_end]))
+
+def propagator_piecewise(L_0, L_terms, pulses, t_0, t_1, rtol=1e-8,
+                         atol=1e-10):
+    """ The propagator P with vec(rho(t_1)) = P vec(rho(t_0)) for
+    d/dt vec(rho) = (L_0 + sum_k f_k(t) L_k) vec(rho), split at the
+    breakpoints of the pulses as in evolve_piecewise, so constant segments
+    are matrix exponentials and the others are integrated with RK45 for all
+    n² columns at once.
+
+    Returns:
+        P: (n², n²) array.
+    """
+
+    from scipy.integrate import solve_ivp
+    from scipy.linalg import expm
+
+    n2 = L_0.shape[0]
+    funcs = [p.func() for p in pulses]
+
+    P = np.eye(n2, dtype=complex)
+    edges = _edges(pulses, t_0, t_1)
+
+    for a, b in zip(edges[:-1], edges[1:]):
+
+        if all(p.is_constant(a, b) for p in pulses):
+            L = L_0 + sum(f(0.5*(a + b))*L_k for f, L_k in zip(funcs, L_terms))
+            P = expm(L*(b - a)).dot(P)
+        else:
+            def rhs(t, y):
+                Y = y.reshape((n2, n2))
+                dY = L_0.dot(Y)
+                for f, L_k in zip(funcs, L_terms):
+                    dY = dY + f(t)*L_k.dot(Y)
+                return dY.ravel()
+
+            sol = solve_ivp(rhs, (a, b), P.ravel(), method='RK45',
+                            t_eval=[b], rtol=rtol, atol=atol)
+            P = sol.y[:, -1].reshape((n2, n2))
+
+    return P
+
+def periodic_steadystate(P):
+    """ The fixed point P vec(rho) = vec(rho) with Tr(rho) = 1 of a one-period
+    propagator, i.e. the state at the start of each period once transients
+    have died out.
+
+    Returns:
+        rho: (n, n) array.
+    """
+
+    n2 = P.shape[0]
+    n = int(round(np.sqrt(n2)))
+
+    A = P - np.eye(n2)
+    A[0] = trace_row(n)
+
+    b = np.zeros(n2, dtype=complex)
+    b[0] = 1.
+
+    return unvec(np.linalg.solve(A, b))
+
+def floquet_steadystate(L_0, L_terms, pulses, t_0, period, harmonics,
+                        num_samples=None):
+    """ The periodic steady state in a truncated Floquet basis,
+
+        rho(t) = sum_{|m| <= harmonics} rho_m exp(i m omega (t - t_0)),
+
+    with omega = 2π/period, from the coupled equations
+
+        i m omega rho_m = L_0 rho_m + sum_k sum_m' f_k[m - m'] L_k rho_m'
+
+    and Tr(rho_0) = 1, where f_k[m] are the Fourier coefficients of the
+    pulses over one period. Suited to smooth modulation, whose Fourier
+    coefficients fall off quickly.
+
+    Args:
+        L_0: (n², n²) Liouvillian of the static part.
+        L_terms: list of (n², n²) Liouvillians of the modulated terms.
+        pulses: list of the pulses f_k, one per term, over one period.
+        t_0: the start of the period.
+        period: the period.
+        harmonics: the number of harmonics M kept either side of 0.
+        num_samples: number of samples of each pulse over the period for
+            its Fourier coefficients. Default is 8M + 64.
+
+    Returns:
+        rho_m: (2M + 1, n, n) array of the harmonics, m = -M, ..., M.
+    """
+
+    n2 = L_0.shape[0]
+    n = int(round(np.sqrt(n2)))
+    M = harmonics
+    omega = 2*np.pi/period
+
+    if num_samples is None:
+        num_samples = 8*M + 64
+
+    ts = t_0 + period*np.arange(num_samples)/num_samples
+
+    # Fourier coefficients f[d] for d = -2M, ..., 2M.
+    d = np.arange(-2*M, 2*M + 1)
+    phases = np.exp(-1.j*omega*np.outer(d, ts - t_0))/num_samples
+    coeffs = [phases.dot(np.array([f(t) for t in ts], dtype=complex))
+              for f in (p.func() for p in pulses)]
+
+    N = 2*M + 1
+    A = np.zeros((N, n2, N, n2), dtype=complex)
+
+    for i, m in enumerate(range(-M, M + 1)):
+        A[i, :, i] += L_0 - 1.j*m*omega*np.eye(n2)
+        for j, m_j in enumerate(range(-M, M + 1)):
+            for c, L_k in zip(coeffs, L_terms):
+                A[i, :, j] += c[m - m_j + 2*M]*L_k
+
+    # The trace condition on rho_0 in place of its first equation.
+    A[M, 0] = 0.
+    A[M, 0, M] = trace_row(n)
+
+    b = np.zeros((N, n2), dtype=complex)
+    b[M, 0] = 1.
+
+    rho_m = np.linalg.solve(A.reshape((N*n2, N*n2)), b.ravel())
+
+    return unvec(rho_m.reshape((N, n2)))
+
+def linear_response(L_u, L_p, L_Delta, shifts, cond_max=1e10):
+    """ The steady state to first order in a weak probe, for every shift of a
+    scanned detuning, from one eigendecomposition per coherence sector.
+
+    The elements of rho fall into sectors by their entry in L_Delta, i.e. by
+    how the scanned detuning enters their phase. If the unperturbed
+    Liouvillian L_u doesn't connect different sectors, then in each sector
+    the scanned detuning adds shift*c times the identity, and
+
+        rho_1(shift) = -(L_u + shift*c)^-1 L_p rho_0
+
+    is found for all shifts from the eigendecomposition of the sector's
+    block. The unperturbed steady state rho_0 lies in the sector with c = 0,
+    so doesn't depend on the shift.
+
+    Args:
+        L_u: (n², n²) Liouvillian without the probe, at zero shift.
+        L_p: (n², n²) Liouvillian of the probe term, -i[H_p, .].
+        L_Delta: (n²,) diagonal Liouvillian per unit shift (see
+            commutator_diag).
+        shifts: (N,) array of shifts, e.g. the probe detuning range.
+        cond_max: largest condition number of the eigenvectors of a block
+            accepted, above which the block is solved at each shift.
+
+    Returns:
+        rho_0: (n, n) unperturbed steady state.
+        rho_1: (N, n, n) first-order change at each shift.
+
+    Raises:
+        ValueError: if L_u connects different sectors, so the scanned
+            detuning can't be treated this way.
+    """
+
+    n2 = L_u.shape[0]
+    n = int(round(np.sqrt(n2)))
+    shifts = np.asarray(shifts, dtype=float)
+
+    # Label the sectors by their (rounded) shift per unit detuning.
+    scale = max(np.abs(L_Delta).max(), 1.)
+    labels = np.round(L_Delta/scale*1e8)
+    sectors, sector_idx = np.unique(labels, return_inverse=True)
+
+    crossing = sector_idx[:, None] != sector_idx[None, :]
+    if np.abs(L_u[crossing]).max(initial=0.) > 1e-12*np.abs(L_u).max():
+        raise ValueError('The Liouvillian without the probe connects '
+                         'elements shifted differently by the detuning, so '
+                         'it is not block diagonal in the sectors.')
+
+    rho_0 = steadystate_solve(L_u[np.newaxis].copy())[0]
+    b = L_p.dot(vec(rho_0))
+
+    rho_1 = np.zeros((len(shifts), n2), dtype=complex)
+
+    for k in range(len(sectors)):
+        idx = np.flatnonzero(sector_idx == k)
+
+        if not np.any(b[idx]):
+            continue
+
+        block = L_u[np.ix_(idx, idx)]
+        c = L_Delta[idx[0]]
+
+        if c == 0:
+            # The unperturbed sector is singular, so solve with the trace
+            # condition Tr(rho_1) = 0 in place of its first population.
+            A = block.copy()
+            b_k = -b[idx]
+            diag = np.flatnonzero(idx % (n + 1) == 0)
+            A[diag[0]] = 0.
+            A[diag[0], diag] = 1.
+            b_k[diag[0]] = 0.
+            rho_1[:, idx] = np.linalg.solve(A, b_k)
+            continue
+
+        lam, V = np.linalg.eig(block)
+
+        if np.linalg.cond(V) < cond_max:
+            coeffs = np.linalg.solve(V, b[idx])
+            rho_1[:, idx] = -(coeffs/(lam + shifts[:, None]*c)).dot(V.T)
+        else:
+            A = block + shifts[:, None, None]*c*np.eye(len(idx))
+            b_k = np.broadcast_to(-b[idx], (len(shifts), len(idx)))
+            rho_1[:, idx] = np.linalg.solve(A, b_k[..., None])[..., 0]
+
+    return rho_0, unvec(rho_1)
@@ -6,7 +6,7 @@ solutions of the optical Bloch equations.
 Thomas Ogden <t@ogden.eu>
 """
 
-from scipy import exp, log10, sqrt, pi
+import numpy as np
 from scipy import constants as si
 
 ### Constants
@@ -73,7 +73,7 @@ def calc_electric_field_ampl_from_intensity(I, refr_index=1.):
         electric field amplitude [V/m]
     """
 
-    return sqrt(I/(refr_index*si.c*si.epsilon_0)) # [V/m]
+    return np.sqrt(I/(refr_index*si.c*si.epsilon_0)) # [V/m]
 
 
 def calc_susceptibility(tdme, E, N, coh):
@@ -106,7 +106,7 @@ def calc_absorption_coeff(k, chi):
         alpha: Absorption coefficient [/m]
     """
 
-    n = sqrt(1. + chi)
+    n = np.sqrt(1. + np.asarray(chi, dtype=complex))
     alpha = 2.*k*n.imag # [/m]
 
     return alpha
@@ -122,24 +122,71 @@ def calc_transmission(alpha, L):
 
     """
 
-    return exp(-alpha*L)
+    return np.exp(-alpha*L)
 
 def maxwell_boltzmann(v, width=1.):
     """ Maxwell Boltzmann probability distribution function. """
 
-    return 1./(width*sqrt(pi))*exp(-(v/width)**2)
+    return 1./(width*np.sqrt(np.pi))*np.exp(-(v/width)**2)
 
 def calc_N_Rb(T):
     """ Calculates the Rubidium number density [/m3].
         Taken from ElecSus. 
 
     Args:
-        T: Temperature [K]
+        T: Temperature [K], a number or an array.
+
+    Returns:
+        N: Number density [/m3], of the shape of T.
+    """
+
+    T = np.asarray(T, dtype=float)
+
+    # Vapour pressure [atm] of the solid below the melting point and of the
+    # liquid above it.
+    p = np.where(T < 312.46, 10.0**(4.857 - 4215./T),
+                 10.0**(8.316 - 4275./T - 1.3102*np.log10(T)))
+
+    N = 101325.0*p/(si.k*T)
+
+    return N[()]
+
+def calc_spectrum(rho_Delta, k, tdme, E, T, L, levels=(0, 1),
+                  calc_N=calc_N_Rb):
+    """ The susceptibility, absorption coefficient and transmission of a
+    vapour cell over a detuning scan, for every temperature and cell length
+    at once.
+
+    Args:
+        rho_Delta: (N_Delta, n, n) array of density matrices, e.g. from
+            OBScan.get_rho_Delta().
+        k: Wavenumber of the probe [/m]
+        tdme: Transition dipole matrix element [e a_0]
+        E: Electric field amplitude of the probe [V/m]
+        T: Temperature [K], a number or an array of any shape.
+        L: Length of medium [m], a number or an array of any shape.
+        levels: (a, b), the coherence rho_ab of the probed transition.
+        calc_N: function of T giving the number density [/m3].
+
+    Returns:
+        chi: Susceptibility [], shape T.shape + (N_Delta,)
+        alpha: Absorption coefficient [/m], shape T.shape + (N_Delta,)
+        transmission: Transmission [], shape T.shape + L.shape + (N_Delta,)
     """
-    
-    if T<312.46:
-        p=10.0**(4.857-4215./T)
-    else:
-        p=10.0**(8.316-4275./T-1.3102*log10(T))
-    N=101325.0*p/(si.k*T)
-    return N
\ No newline at end of file
+
+    a, b = levels
+
+    coh = np.asarray(rho_Delta)[:, a, b]
+
+    T = np.asarray(T, dtype=float)
+    L = np.asarray(L, dtype=float)
+
+    N = np.asarray(calc_N(T))
+
+    chi = calc_susceptibility(tdme, E, N[..., None], coh)
+    alpha = calc_absorption_coeff(k, chi)
+
+    alpha_TL = alpha.reshape(T.shape + (1,)*L.ndim + coh.shape)
+    transmission = calc_transmission(alpha_TL, L[..., None])
+
+    return chi, alpha, transmission
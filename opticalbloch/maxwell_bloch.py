@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+""" Propagation of a field through a medium described by an OB object.
+
+The medium is cut into z-slices. In the frame moving with the field (t is
+the retarded time t - z/c) the complex Rabi frequency Omega(z, t) of the
+propagated field on the a-b transition obeys
+
+    dOmega/dz = -i g rho_ba(z, t)
+
+with b the upper level and g the coupling constant, which for a density N of
+atoms with dipole moment d on a transition of angular frequency omega is
+g = N omega d²/(ε_0 hbar c). At each z the atoms see the Hamiltonian of the
+OB object plus the field term
+
+    (Omega/2)|b><a| + (Omega*/2)|a><b|,
+
+so the OB object's own coupling on the propagated transition should be set to
+zero. The Liouvillian is L_0 + Re(Omega) L_re + Im(Omega) L_im, so every slice
+is advanced at once by three (n², n²) by (n², num_z) products per stage of a
+classical fourth-order Runge-Kutta step, with the field found from the
+states of all slices by cumulative trapezoidal integration in z.
+
+The Runge-Kutta step h is explicit, so it is only stable while h|λ| stays
+inside the RK4 stability region (about 2.8 along the real and imaginary
+axes) for every eigenvalue λ of the linearised right-hand side. solve
+bounds |λ| by the spectral radius of L_0 plus the field terms, which grow
+with the peak Rabi frequency and the optical depth g times the medium
+length, and takes more steps per interval where the requested number would
+exceed RK4_MAX_STEP.
+"""
+
+import numpy as np
+
+import liouville
+
+# The largest h|λ| solve allows, inside the RK4 stability region.
+RK4_MAX_STEP = 2.5
+
+class MaxwellBloch(object):
+    """ A field propagating through slices of an OB medium.
+
+    Attributes:
+        ob_obj: the OB object of the medium.
+        z_range: (num_z,) array of the slice positions, from the entry face.
+        levels: (a, b), the lower and upper levels of the field's transition.
+        g: the coupling constant of the field equation.
+        Omega_zt: (T, num_z) complex array of the Rabi frequency, after solve.
+        rho_zt: (T, num_z, n, n) array of the states, after solve with
+            keep_rho.
+    """
+
+    def __init__(self, ob_obj, z_range, levels=(0, 1), g=1.):
+
+        self.ob_obj = ob_obj
+        self.z_range = np.asarray(z_range, dtype=float)
+        self.levels = levels
+        self.g = g
+
+        self.tlist = None
+        self.Omega_zt = None
+        self.rho_zt = None
+
+    def __repr__(self):
+
+        return "<MaxwellBloch :: %d slices>" % len(self.z_range)
+
+    def liouvillian_parts(self):
+        """ Returns L_0, L_re and L_im, the Liouvillians of the medium and of
+        the field term per unit real and imaginary Rabi frequency. """
+
+        ob_obj = self.ob_obj
+        a, b = self.levels
+
+        L_0 = ob_obj.liouvillian()
+
+        s_ba = liouville.to_array(ob_obj.sigma(b, a))
+        s_ab = liouville.to_array(ob_obj.sigma(a, b))
+
+        L_re = liouville.liouvillian(0.5*(s_ba + s_ab))
+        L_im = liouville.liouvillian(0.5j*(s_ba - s_ab))
+
+        return L_0, L_re, L_im
+
+    def field(self, Omega_0, rho_vecs):
+        """ The Rabi frequency at every slice, integrating the field equation
+        from the entry value Omega_0 across the states of all slices.
+
+        Args:
+            Omega_0: the Rabi frequency at the entry face.
+            rho_vecs: (n², num_z) array of the vectorised state of each slice.
+
+        Returns:
+            Omega: (num_z,) complex array.
+        """
+
+        a, b = self.levels
+        n = self.ob_obj.num_states
+
+        rho_ba = rho_vecs[b*n + a]
+
+        dOmega = -0.5j*self.g*np.diff(self.z_range)*(rho_ba[1:] +
+                                                     rho_ba[:-1])
+
+        return Omega_0 + np.concatenate(([0.], np.cumsum(dOmega)))
+
+    def rate_bound(self, Omega_max):
+        """ An upper bound on |λ| for the eigenvalues λ of the linearised
+        right-hand side of solve, while |Omega_in| <= Omega_max.
+
+        It is the spectral radius of L_0, plus the norm of the field terms
+        times the largest Rabi frequency in the medium, Omega_max plus
+        g length |rho_ba| with |rho_ba| <= 1/2, plus the same norm times the
+        change of the field with the states, g length.
+        """
+
+        L_0, L_re, L_im = self.liouvillian_parts()
+
+        length = self.z_range[-1] - self.z_range[0]
+        depth = abs(self.g)*length
+
+        radius = np.abs(np.linalg.eigvals(L_0)).max()
+        field_norm = max(np.linalg.norm(L_re, 2), np.linalg.norm(L_im, 2))
+
+        return radius + field_norm*(Omega_max + 1.5*depth)
+
+    def solve(self, tlist, Omega_in, rho0=None, steps=1, keep_rho=False):
+        """ Propagates the field through the medium.
+
+        The number of Runge-Kutta steps in each interval of tlist is at
+        least steps, and raised where needed to keep h rate_bound below
+        RK4_MAX_STEP, with the peak of Omega_in estimated from its values at
+        the ends and middle of the intervals. A pulse much narrower than
+        the intervals of tlist can still be missed, so tlist should resolve
+        Omega_in.
+
+        Args:
+            tlist: increasing (retarded) times to record the field at.
+            Omega_in: the Rabi frequency at the entry face, a number or a
+                function of t (e.g. a pulses.Pulse).
+            rho0: initial density matrix of every slice. Default is the
+                ground state.
+            steps: the least number of Runge-Kutta steps per interval of
+                tlist.
+            keep_rho: record the states of every slice at every time?
+
+        Returns:
+            Omega_zt: (len(tlist), num_z) complex array of the Rabi
+                frequency at every slice and time.
+
+        Raises:
+            ValueError: if the states stop being finite, i.e. the
+                integration blew up regardless.
+        """
+
+        ob_obj = self.ob_obj
+        n = ob_obj.num_states
+        num_z = len(self.z_range)
+
+        tlist = np.asarray(tlist, dtype=float)
+
+        if rho0 is None:
+            rho0 = ob_obj.ground_state()*ob_obj.ground_state().dag()
+
+        if not callable(Omega_in):
+            Omega_value = Omega_in
+            Omega_in = lambda t: Omega_value
+
+        L_0, L_re, L_im = self.liouvillian_parts()
+
+        t_check = np.union1d(tlist, 0.5*(tlist[1:] + tlist[:-1]))
+        Omega_max = max(abs(Omega_in(t)) for t in t_check)
+        max_h = RK4_MAX_STEP/self.rate_bound(Omega_max)
+
+        # Every slice is one column, so each product advances all of them.
+        rho = np.empty((n**2, num_z), dtype=complex)
+        rho[:] = liouville.vec(liouville.to_dm(rho0))[:, None]
+
+        def rhs(t, rho):
+            Omega = self.field(Omega_in(t), rho)
+            return (L_0.dot(rho) + Omega.real*L_re.dot(rho) +
+                    Omega.imag*L_im.dot(rho))
+
+        self.tlist = tlist
+        self.Omega_zt = np.empty((len(tlist), num_z), dtype=complex)
+
+        if keep_rho:
+            self.rho_zt = np.empty((len(tlist), num_z, n, n), dtype=complex)
+
+        for i, t in enumerate(tlist):
+
+            if i > 0:
+                num_steps = max(steps,
+                                int(np.ceil((t - tlist[i-1])/max_h)))
+                h = (t - tlist[i-1])/num_steps
+                t_s = tlist[i-1]
+
+                for _ in range(num_steps):
+                    k_1 = rhs(t_s, rho)
+                    k_2 = rhs(t_s + h/2., rho + h/2.*k_1)
+                    k_3 = rhs(t_s + h/2., rho + h/2.*k_2)
+                    k_4 = rhs(t_s + h, rho + h*k_3)
+
+                    rho = rho + h/6.*(k_1 + 2.*k_2 + 2.*k_3 + k_4)
+                    t_s += h
+
+                if not np.all(np.isfinite(rho)):
+                    raise ValueError('The Runge-Kutta integration blew up '
+                                     'at t = ' + str(t) + '.')
+
+            self.Omega_zt[i] = self.field(Omega_in(t), rho)
+
+            if keep_rho:
+                self.rho_zt[i] = liouville.unvec(rho.T)
+
+        return self.Omega_zt
+
+    def transmission(self):
+        """ The intensity transmission |Omega(z_end, t)|²/|Omega(0, t)|² at
+        each time of the last solve. """
+
+        return (np.abs(self.Omega_zt[:, -1])**2/
+                np.abs(self.Omega_zt[:, 0])**2)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+""" Instrumentation for the solvers and scans.
+
+An OB object reports into the Metrics object in its metrics attribute, as do
+the scans of it (OBScan, OBGrid, DopplerScan and the parscan executor). By
+default there is none and nothing is recorded or printed. To instrument a
+run, set one:
+
+    ob_obj.metrics = metrics.Metrics(callbacks=[metrics.Progress()])
+
+after which ob_obj.metrics holds
+
+    timers    phase -> [total seconds, number of times], for the phases
+              'H assembly', 'liouvillian', 'solve' and 'convert'
+    counters  e.g. 'solver_calls', 'failures', 'cache_hits', 'cache_misses'
+
+and every callback is called as callback(event, info) for each 'progress'
+and 'failure' event. Progress is a callback printing rate-limited progress
+lines.
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+
+class Metrics(object):
+    """ Per-phase timers, counters and event callbacks.
+
+    Attributes:
+        timers: dict of phase -> [total seconds, count].
+        counters: dict of name -> count.
+        callbacks: list of functions called as callback(event, info).
+    """
+
+    def __init__(self, callbacks=None):
+
+        self.timers = {}
+        self.counters = {}
+        self.callbacks = list(callbacks or [])
+
+    def __repr__(self):
+
+        return "<Metrics :: %s>" % self.as_dict()
+
+    @contextmanager
+    def phase(self, name):
+        """ Context manager adding the time spent in it to timers[name]. """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timer = self.timers.setdefault(name, [0., 0])
+            timer[0] += time.perf_counter() - start
+            timer[1] += 1
+
+    @contextmanager
+    def solver(self):
+        """ Context manager for one solver call: times the 'solve' phase,
+        counts solver_calls, and counts and reports a failure if it raises.
+        """
+
+        self.count('solver_calls')
+        try:
+            with self.phase('solve'):
+                yield
+        except Exception as e:
+            self.count('failures')
+            self.event('failure', error=repr(e))
+            raise
+
+    def count(self, name, k=1):
+
+        self.counters[name] = self.counters.get(name, 0) + k
+
+    def event(self, event, **info):
+        """ Calls every callback with the event and its info dict. """
+
+        for callback in self.callbacks:
+            callback(event, info)
+
+    def progress(self, done, total, label=''):
+        """ Reports a 'progress' event. """
+
+        self.event('progress', done=done, total=total, label=label)
+
+    def as_dict(self):
+        """ The timers and counters as a JSON-serialisable dict. """
+
+        return {'timers': dict((k, {'seconds': v[0], 'count': v[1]})
+                               for k, v in self.timers.items()),
+                'counters': dict(self.counters)}
+
+    def reset(self):
+
+        self.timers.clear()
+        self.counters.clear()
+
+class NullMetrics(Metrics):
+    """ Metrics that record nothing, used when none are set. """
+
+    @contextmanager
+    def phase(self, name):
+
+        yield
+
+    @contextmanager
+    def solver(self):
+
+        yield
+
+    def count(self, name, k=1):
+
+        pass
+
+    def event(self, event, **info):
+
+        pass
+
+NULL = NullMetrics()
+
+def of(obj):
+    """ The metrics of an OB object, or NULL if it has none. """
+
+    return getattr(obj, 'metrics', None) or NULL
+
+class Progress(object):
+    """ A callback printing progress events at most once per interval
+    seconds, and on completion.
+
+    Attributes:
+        interval: minimum seconds between lines.
+        stream: file to write to. Default is sys.stderr.
+    """
+
+    def __init__(self, interval=1., stream=None):
+
+        self.interval = interval
+        self.stream = stream
+        self._start = None
+        self._last = None
+
+    def __call__(self, event, info):
+
+        if event != 'progress':
+            return
+
+        now = time.perf_counter()
+        done, total = info['done'], info['total']
+
+        if self._start is None or done <= 0:
+            self._start = now
+            self._last = None
+
+        if (done < total and self._last is not None and
+                now - self._last < self.interval):
+            return
+
+        self._last = now
+
+        elapsed = now - self._start
+        rate = done/elapsed if elapsed > 0 else 0.
+        eta = (total - done)/rate if rate > 0 else 0.
+
+        stream = self.stream or sys.stderr
+        stream.write('%s %d/%d (%.0f%%) %.3g/s eta %.1fs\n' % (
+            info.get('label', ''), done, total, 100.*done/max(total, 1),
+            rate, eta))
+        stream.flush()
+
+        if done >= total:
+            self._start = None
@@ -1,12 +1,25 @@
 # -*- coding: utf-8 -*-
 
-import os
+import copy
+import inspect
 
 import sigma
+import liouville
+import cache
+import metrics
+import pulses
 
 import numpy as np
+import scipy.sparse as sp
 import qutip as qu
 
+# The keyword arguments liouville.steadystate_iterative takes.
+_ITERATIVE_KWARGS = inspect.signature(
+    liouville.steadystate_iterative).parameters
+
+# The methods OB.steadystate solves itself rather than with qu.steadystate.
+_LOCAL_METHODS = ('dense', 'gmres', 'bicgstab')
+
 class OB(object):
     """ TODO: Desc here. Parent class.    
 
@@ -23,8 +36,16 @@ class OB(object):
         time_range: an array of time points over which to solve the system
         ob_data: states and expectation values as solved at each step in
             time_range (see QuTip's odedata object).
+        metrics: a metrics.Metrics that the solvers, and scans of this
+            object, report timings, counts and progress into. Default is
+            None, for no instrumentation.
+        observed: dict of the quantities recorded by mesolve with
+            observables (see the observables module).
         """
 
+    metrics = None
+    observed = None
+
     def __init__(self):
         """ Initialise the OB object. This will be overridden in every child
         class, just here to make it clear what attributes an OB object has. """
@@ -56,9 +77,15 @@ class OB(object):
         return sigma.sigma(self.num_states, a, b)
 
     def ground_state(self):
-        """ Returns a state vector for the ground state. [1, 0, 0, …] """
+        """ Returns a state vector for the ground state. [1, 0, 0, …], with
+        the dims of H_0 for a system of several atoms. """
+
+        dims = self.H_0.dims[0]
+
+        if int(np.prod(dims)) != self.num_states:
+            dims = [self.num_states]
 
-        return qu.basis(self.num_states, 0)
+        return qu.basis(dims, [0]*len(dims))
 
     def set_H_0(self, energies=[]):
         """ Takes a list of energies and makes a Bare Hamiltonian with the
@@ -80,9 +107,9 @@ class OB(object):
 
         # See PEP 8: 'Use the fact that empty sequences are false.'
         if not energies:
-            H_0 = np.zeros([self.num_states, self.num_states])
+            H_0 = sp.csr_matrix((self.num_states, self.num_states))
         else:
-            H_0 = np.diag(np.array(energies))
+            H_0 = sp.diags(np.array(energies), format='csr')
 
         self.H_0 = qu.Qobj(H_0)
         return self.H_0
@@ -117,77 +144,282 @@ class OB(object):
         ## TODO: raise an error here if a time-dependent interaction has been
         ## specified, i.e. if H_I is a list of [H_I_term, time_func] pairs.
 
-        H_I = qu.Qobj(np.zeros([self.num_states, self.num_states]))
+        H_I_list = self.H_I_list()
 
-        for H_i in self.H_I_list():
-            H_I += H_i
+        # Start from the first term rather than a zero matrix, so the sum
+        # stays sparse and keeps the dims of e.g. a multi-atom system.
+        if not H_I_list:
+            return 0*self.H_0
+
+        H_I = H_I_list[0]
+
+        for H_i in H_I_list[1:]:
+            H_I = H_I + H_i
 
         return H_I
 
-    def states_t(self):
-        """ Returns: a 3D array, first dim is time, the other two are the
-        density matrix at each time slice.
+    def _static(self):
+        """ The cache of the static (non-detuning) parts of the system.
+
+        It is keyed on the identity of H_0, the H_I terms and the c_ops, so
+        it is rebuilt whenever set_H_0, set_H_Omega or a decay setter
+        assigns new operators. (Operators modified in place are not seen.)
         """
 
-        # No collapse operators, so states is a list of state vectors
-        if len(self.c_ops) == 0:
-            states_t = np.zeros((len(self.result.times), self.num_states, 1),
-                             dtype=np.complex)
+        parts = [self.H_0] + list(self.H_I_list()) + list(self.c_ops)
+        static = getattr(self, '_static_cache', None)
+
+        if (static is None or len(static['parts']) != len(parts) or
+                any(a is not b for a, b in zip(static['parts'], parts))):
+            static = {'parts': parts, 'H': None, 'L': None, 'L_diag': None,
+                      'L_total': None, 'H_Delta': None, 'full': False}
+            self._static_cache = static
+
+        return static
+
+    def H_static(self):
+        """ H_0 + H_I_sum(), built once until the static parts change. """
+
+        static = self._static()
+
+        if static['H'] is None:
+            with metrics.of(self).phase('H assembly'):
+                static['H'] = self.H_0 + self.H_I_sum()
+
+        return static['H']
+
+    def H_total(self):
+        """ The full time-independent Hamiltonian, H_static() + H_Delta. """
+
+        H_static = self.H_static()
+
+        with metrics.of(self).phase('H assembly'):
+            return H_static + self.H_Delta
 
-        # Collapse operators, so states is a list of density matrices
+    def liouvillian(self, H_Delta=None):
+        """ The Liouvillian of the time-independent system as a dense array
+        (see liouville.liouvillian).
+
+        The static part is built once until the static parts change. For the
+        object's own H_Delta the result is also kept, and when the detuning
+        changes only its diagonal is rewritten, in place, as long as H_Delta
+        is diagonal. The array returned is then a read-only view of the kept
+        one, which later detuning changes rewrite, so copy it to modify it
+        or to hold on to it across set_H_Delta.
+
+        Args:
+            H_Delta: a detuning term to use in place of self.H_Delta, e.g.
+                the fixed part from H_Delta_parts. A new array is returned.
+
+        Returns:
+            L: (n², n²) array, read-only unless H_Delta is given.
+        """
+
+        static = self._static()
+
+        if static['L'] is None:
+            H_static = self.H_static()
+            with metrics.of(self).phase('liouvillian'):
+                static['L'] = liouville.liouvillian(H_static, self.c_ops)
+                static['L_diag'] = np.diag(static['L']).copy()
+
+        if H_Delta is not None:
+            return self._add_H_Delta(static['L'].copy(), H_Delta)[0]
+
+        if static['L_total'] is None or static['full']:
+            L_total = static['L'].copy()
+        elif static['H_Delta'] is self.H_Delta:
+            return self._read_only(static['L_total'])
         else:
-            states_t = np.zeros((len(self.result.times),
-                                self.num_states, self.num_states),
-                                dtype=np.complex)
+            L_total = static['L_total']
+
+        static['L_total'], static['full'] = self._add_H_Delta(L_total,
+                                                              self.H_Delta)
+        static['H_Delta'] = self.H_Delta
+
+        return self._read_only(static['L_total'])
+
+    @staticmethod
+    def _read_only(L):
+
+        view = L.view()
+        view.setflags(write=False)
+        return view
+
+    def _add_H_Delta(self, L, H_Delta):
+        """ Sets L, a copy of the static Liouvillian (or one that differs from
+        it only on the diagonal), to the Liouvillian with H_Delta added.
+
+        Returns:
+            L: the array, modified in place.
+            full: True if H_Delta isn't diagonal, so L differs from the
+                static part off the diagonal.
+        """
 
-        for t, state_t in enumerate(self.result.states):
-            states_t[t] = state_t.full()
+        static = self._static()
+        H_Delta = liouville.to_sparse(H_Delta)
+        d = H_Delta.diagonal()
 
-        return states_t
+        if (H_Delta - sp.diags(d)).count_nonzero():
+            L += liouville.liouvillian(H_Delta.toarray())
+            return L, True
+
+        diag_idx = np.arange(L.shape[0])
+        L[diag_idx, diag_idx] = (static['L_diag'] +
+                                 liouville.commutator_diag(d))
+        return L, False
+
+    def solver(self, H_Delta=None):
+        """ A solver handle for the time-independent system, which keeps the
+        factorisations of its Liouvillian to solve many right-hand sides or
+        initial states at once (see liouville.Solver).
+
+        Args:
+            H_Delta: a detuning term to use in place of self.H_Delta.
+
+        Returns:
+            solver: liouville.Solver
+        """
+
+        return liouville.Solver(self.liouvillian(H_Delta))
+
+    def H_Delta_parts(self, Deltas, Delta_idx=0):
+        """ Splits the detuning term into a fixed part and a part that is
+        proportional to Deltas[Delta_idx], by calling set_H_Delta with that
+        detuning set to 0 and to 1. H_Delta is left as it was.
+
+        This lets a scan over one detuning treat it as an additive diagonal
+        rather than rebuilding the Hamiltonian at every point.
+
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta.
+            Delta_idx: the index of the detuning to split out.
+
+        Returns:
+            H_Delta_0: H_Delta with Deltas[Delta_idx] = 0 (Qobj)
+            dH_Delta: the diagonal of dH_Delta/dDelta (array)
+
+        Raises:
+            ValueError: if the detuning term is not diagonal.
+        """
+
+        H_Delta = self.H_Delta
+        Deltas_i = list(Deltas) # Make copy, don't modify in place
+
+        Deltas_i[Delta_idx] = 0.
+        self.set_H_Delta(Deltas_i)
+        H_Delta_0 = self.H_Delta
+
+        Deltas_i[Delta_idx] = 1.
+        self.set_H_Delta(Deltas_i)
+        dH_Delta = (self.H_Delta - H_Delta_0).full()
+
+        self.H_Delta = H_Delta
+
+        if np.count_nonzero(dH_Delta - np.diag(np.diag(dH_Delta))):
+            raise ValueError('The detuning term must be diagonal.')
+
+        return H_Delta_0, np.diag(dH_Delta)
+
+    def states_t(self):
+        """ Returns: a 3D array, first dim is time, the other two are the
+        density matrix at each time slice (or the state vector, as an (n, 1)
+        column, if there are no collapse operators).
+        """
+
+        return np.array([state_t.full() for state_t in self.result.states],
+                        dtype=complex)
+
+    def cache_key(self, *parts):
+        """ Returns a key identifying a result of this system for a
+        cache.ResultCache. It hashes the class, H_0, the H_I terms and the
+        c_ops, plus any parts the solver adds (H_Delta, times, initial state,
+        args, options...).
+        """
+
+        return cache.hash_key(type(self).__name__, self.H_0, 
+                              self.H_I_list(), self.c_ops, *parts)
 
     def mesolve(self, tlist, rho0=None, td=False, e_ops=[], 
-                args={}, opts=qu.Options(), recalc=True, savefile=None,
-                show_pbar=False):
-        
-        if not rho0:
-            rho0 = self.ground_state()*self.ground_state().dag()
+                args={}, opts=qu.Options(), cache=None, show_pbar=False,
+                observables=None):
+        """ Solves the master equation with QuTiP's mesolve.
 
-        savefile_exists = os.path.isfile(str(savefile) + '.qu')
+        Args:
+            tlist: The list of times for which to find the density matrix.
+            rho0: Define an initial density matrix. Default is ground state.
+            td: Is the interaction time-dependent?
+            e_ops: list of operators to find expectation values of.
+            args: arguments for the time functions.
+            opts: qu.Options for the solver.
+            cache: a cache.ResultCache to look the result up in and store it
+                to. If the same physics has been solved before the stored
+                result is returned.
+            show_pbar: show a progress bar?
+            observables: an observables.Observables, passed to QuTiP as
+                e_ops in place of e_ops, so no states are stored. The
+                quantities are kept in observed.
 
-        # Solve if 1) we ask for it to be recalculated or 2) it *must* be 
-        # calculated because no savefile exists.
-        if (recalc or not savefile_exists):
+        Returns:
+            result: qutip result object containing the solved data.
+        """
+        
+        m = metrics.of(self)
 
-            # Is the Hamiltonian time-dependent? 
-            if td: # If so H is a list of [H_i, t_func_i] pairs.
-                H = [self.H_0, self.H_Delta]
-                H.extend(self.H_I_list())
-            else: # If not it's a single QObj
-                H = self.H_0 + self.H_Delta + self.H_I_sum()
+        if not rho0:
+            rho0 = self.ground_state()*self.ground_state().dag()
 
-            if show_pbar:
-                pbar = qu.ui.progressbar.TextProgressBar()
-            else:
-                pbar = qu.ui.progressbar.BaseProgressBar()
+        if observables is not None:
+            e_ops = observables.qutip_e_ops(self.H_0.dims)
+
+        if cache is not None:
+            key = self.cache_key('mesolve', self.H_Delta, tlist, rho0, td,
+                                 e_ops, args, opts)
+            result = cache.get(key)
+            m.count('cache_misses' if result is None else 'cache_hits')
+
+            if result is not None:
+                self.result = result
+                self._set_observed(observables)
+                return self.result
+
+        # Is the Hamiltonian time-dependent? 
+        if td: # If so H is a list of [H_i, t_func_i] pairs.
+            H = [self.H_0, self.H_Delta]
+            H.extend(self.H_I_list())
+        else: # If not it's a single QObj
+            H = self.H_total()
+
+        if show_pbar:
+            pbar = qu.ui.progressbar.TextProgressBar()
+        else:
+            pbar = qu.ui.progressbar.BaseProgressBar()
 
+        # QuTiP sets store_states on the options it is given, which would
+        # stick to the shared default opts, so it gets a copy.
+        with m.solver():
             self.result = qu.mesolve(H, rho0, tlist,
                                       self.c_ops, e_ops,
-                                      args=args, options=opts, 
+                                      args=args, options=copy.copy(opts),
                                       progress_bar=pbar)
-            self.rho = self.result.states[-1] # Set rho to the final state.
+        self._set_observed(observables)
 
-            # Only save the file if we have a place to save it.
-            if (savefile != None):
-                qu.qsave(self.result, savefile)
+        if cache is not None:
+            cache.put(key, self.result)
 
-        # Otherwise load the steady state rho_v_delta from file
-        else:
-            self.result = qu.qload(savefile)
+        return self.result
+
+    def _set_observed(self, observables):
+        """ Sets rho to the final state, if states were stored, and
+        observed from the result's expect. """
+
+        if self.result.states:
             self.rho = self.result.states[-1]
 
-        return self.result
+        if observables is not None:
+            self.observed = observables.from_expect(self.result.expect)
 
-    def essolve(self, tlist, rho0=None, recalc=True, savefile=None):
+    def essolve(self, tlist, rho0=None, cache=None):
         """ 
         Evolution of the density matrix by
         expressing the ODE as an exponential series.
@@ -195,8 +427,8 @@ class OB(object):
         Args:
             tlist: The list of times for which to find the density matrix.
             rho0: Define an initial density matrix. Default is ground state.
-            recalc: Rerun the calculation if a saved file exists?
-            savefile: (string) Save the data to savefile.qu
+            cache: a cache.ResultCache to look the result up in and store it
+                to.
 
         Returns:
             result: qutip result object containing the solved data.
@@ -209,56 +441,248 @@ class OB(object):
             for high resolution to solve. So better when the density matrix 
             is only needed at a few points.
 
+            See the propagate method for a faster version which returns an
+            array of states.
+
         """
 
+        m = metrics.of(self)
+
         if not rho0:
             rho0 = self.ground_state()*self.ground_state().dag()
 
-        savefile_exists = os.path.isfile(str(savefile) + '.qu')
+        if cache is not None:
+            key = self.cache_key('essolve', self.H_Delta, tlist, rho0)
+            result = cache.get(key)
+            m.count('cache_misses' if result is None else 'cache_hits')
+
+            if result is not None:
+                self.result = result
+                self.rho = self.result.states[-1]
+                return self.result
 
-        # Solve if 1) we ask for it to be recalculated or 2) it *must* be 
-        # calculated because no savefile exists.
-        if (recalc or not savefile_exists):
+        H = self.H_total()
 
-            H = self.H_0 + self.H_Delta + self.H_I_sum()
+        with m.phase('liouvillian'):
             L = qu.liouvillian(H, self.c_ops)
 
+        with m.solver():
             es = qu.ode2es(L, rho0)
             states = es.value(tlist)
 
-            self.result = qu.solver.Result()
-            self.result.states = states
-            self.result.solver = "essolve"
-            self.result.times = tlist
+        self.result = qu.solver.Result()
+        self.result.states = states
+        self.result.solver = "essolve"
+        self.result.times = tlist
 
-            self.rho = self.result.states[-1] # Set rho to the final state.
+        self.rho = self.result.states[-1] # Set rho to the final state.
 
-            # Only save the file if we have a place to save it.
-            if (savefile != None):
-                qu.qsave(self.result, savefile)
+        if cache is not None:
+            cache.put(key, self.result)
 
-        # Otherwise load the steady state rho_v_delta from file
+        return self.result
+
+    def propagate(self, tlist, rho0=None):
+        """ Propagator mode of essolve. Diagonalises the Liouvillian once
+        and evaluates the density matrix at every time in tlist with one
+        vectorised contraction, falling back to matrix exponentials if the
+        Liouvillian is defective.
+
+        Args:
+            tlist: The list of times for which to find the density matrix.
+            rho0: Define an initial density matrix. Default is ground state.
+
+        Returns:
+            states: (len(tlist), n, n) array of density matrices.
+        """
+
+        if rho0 is None:
+            rho0 = self.ground_state()*self.ground_state().dag()
+
+        L = self.liouvillian()
+
+        rho0_vec = liouville.vec(liouville.to_dm(rho0))
+
+        with metrics.of(self).solver():
+            states = liouville.unvec(liouville.evolve_eig(L, rho0_vec, tlist))
+
+        self.rho = qu.Qobj(states[-1]) # Set rho to the final state.
+
+        return states
+
+    def evolve(self, tlist, rho0=None, td=False, args={}, out=None,
+               rtol=1e-8, atol=1e-10):
+        """ Solves the master equation with the native integrator in
+        liouville.evolve_piecewise, in place of QuTiP's mesolve.
+
+        The integration is split at the on/off times of the pulses, and
+        piecewise-constant segments (e.g. of square pulses) are stepped
+        exactly with matrix exponentials, so no max_step is needed to avoid
+        skipping over a pulse.
+
+        Args:
+            tlist: The list of times for which to find the density matrix.
+            rho0: Define an initial density matrix. Default is ground state.
+            td: Is the interaction time-dependent? If so H_I_list is a list
+                of [H_i, coeff_i] pairs, where each coeff is a pulses.Pulse,
+                a number or a time function f(t, args).
+            args: arguments for any time functions.
+            out: optional preallocated (len(tlist), n, n) complex array.
+            rtol, atol: tolerances of the adaptive integrator.
+
+        Returns:
+            states: (len(tlist), n, n) array of density matrices.
+        """
+
+        if rho0 is None:
+            rho0 = self.ground_state()*self.ground_state().dag()
+
+        L_0, L_terms, coeffs = self._td_parts(td, args)
+
+        rho0_vec = liouville.vec(liouville.to_dm(rho0))
+
+        with metrics.of(self).solver():
+            states = liouville.evolve_piecewise(L_0, L_terms, coeffs,
+                                                rho0_vec, tlist, out=out,
+                                                rtol=rtol, atol=atol)
+
+        self.rho = qu.Qobj(states[-1]) # Set rho to the final state.
+
+        return states
+
+    def _td_parts(self, td, args):
+        """ The static Liouvillian, the Liouvillian of each interaction term
+        and the pulse multiplying it, for the native integrators. """
+
+        if td:
+            H_I_list = self.H_I_list()
+            L_0 = liouville.liouvillian(self.H_0 + self.H_Delta, self.c_ops)
+            L_terms = [liouville.liouvillian(H_i[0]) for H_i in H_I_list]
+            coeffs = [pulses.to_pulse(H_i[1], args) for H_i in H_I_list]
         else:
-            self.result = qu.qload(savefile)
-            self.rho = self.result.states[-1]
+            L_0 = self.liouvillian()
+            L_terms, coeffs = [], []
 
-        return self.result
+        return L_0, L_terms, coeffs
+
+    def periodic_steadystate(self, period, tlist=None, t_0=0., args={},
+                             harmonics=None, rtol=1e-8, atol=1e-10):
+        """ The periodic steady state of a periodically driven system, the
+        state over one cycle once transients have died out, without
+        integrating through the transient.
+
+        H_I_list is a list of [H_i, coeff_i] pairs as for evolve with td,
+        and the pulses on [t_0, t_0 + period) are taken to repeat with the
+        period, e.g. a train of square pulses given by one of them.
+
+        By default the one-period propagator is found (see
+        liouville.propagator_piecewise), its fixed point solved for directly
+        and the cycle evolved from it. With harmonics the Floquet equations
+        truncated to that many harmonics are solved instead (see
+        liouville.floquet_steadystate), which suits smooth modulation.
+
+        Args:
+            period: the period of the drive.
+            tlist: times in [t_0, t_0 + period] at which to find the state.
+                Default is 101 times across the cycle.
+            t_0: the start of the cycle.
+            args: arguments for any time functions.
+            harmonics: number of Floquet harmonics to keep either side of
+                0, or None to use the propagator.
+            rtol, atol: tolerances of the adaptive integrator.
+
+        Returns:
+            states: (len(tlist), n, n) array of density matrices.
+        """
+
+        if tlist is None:
+            tlist = np.linspace(t_0, t_0 + period, 101)
+
+        tlist = np.asarray(tlist, dtype=float)
+
+        L_0, L_terms, coeffs = self._td_parts(True, args)
+
+        m = metrics.of(self)
+
+        with m.solver():
+            if harmonics is None:
+                P = liouville.propagator_piecewise(L_0, L_terms, coeffs, t_0,
+                                                   t_0 + period, rtol, atol)
+                rho0 = liouville.periodic_steadystate(P)
 
-    def steadystate(self, **kwargs):
+                # Evolve from the start of the cycle to each time.
+                start = 0 if tlist[0] == t_0 else 1
+                states = liouville.evolve_piecewise(
+                    L_0, L_terms, coeffs, liouville.vec(rho0),
+                    np.append(t_0, tlist)[1 - start:], rtol=rtol,
+                    atol=atol)[start:]
+            else:
+                rho_m = liouville.floquet_steadystate(L_0, L_terms, coeffs,
+                                                      t_0, period, harmonics)
+                phases = np.exp(2.j*np.pi/period*np.outer(
+                    tlist - t_0, np.arange(-harmonics, harmonics + 1)))
+                states = np.tensordot(phases, rho_m, axes=1)
+
+        self.rho = qu.Qobj(states[-1]) # Set rho to the final state.
+
+        return states
+
+    def steadystate(self, method=None, **kwargs):
         """ Calculates the steady state of the system in the case of a
         time-independent interaction, i.e. if we let time go to infinity.
 
+        Args:
+            method: 'dense' to solve with the cached Liouvillian (see
+                liouvillian), or 'gmres'/'bicgstab' to use the sparse
+                iterative solver in liouville. Any other method, e.g.
+                'direct', 'eigen', 'svd', 'power' or 'iterative-gmres', is
+                passed to qu.steadystate. Default is qu.steadystate's own
+                default if kwargs that only qu.steadystate takes are given,
+                'gmres' when the Liouville space dimension is above
+                liouville.SPARSE_THRESHOLD and 'dense' otherwise.
+            kwargs: passed to qu.steadystate, or to
+                liouville.steadystate_iterative.
+
         Returns:
             rho: The density matrix in the steady state.
         """
 
-        H = self.H_0 + self.H_Delta + self.H_I_sum()
-        self.rho = qu.steadystate(H, self.c_ops, **kwargs)
+        if method is None:
+            if any(k not in _ITERATIVE_KWARGS for k in kwargs):
+                method = 'direct'
+            elif self.num_states**2 > liouville.SPARSE_THRESHOLD:
+                method = 'gmres'
+            elif kwargs:
+                method = 'direct'
+            else:
+                method = 'dense'
+
+        m = metrics.of(self)
+
+        if method == 'dense':
+            L = self.liouvillian()[np.newaxis].copy()
+            with m.solver():
+                rho = liouville.steadystate_solve(L)[0]
+            with m.phase('convert'):
+                self.rho = qu.Qobj(rho, dims=self.H_0.dims)
+        elif method not in _LOCAL_METHODS:
+            if method != 'direct':
+                kwargs['method'] = method
+            H = self.H_total()
+            with m.solver():
+                self.rho = qu.steadystate(H, self.c_ops, **kwargs)
+        else:
+            H = self.H_total()
+            with m.phase('liouvillian'):
+                L = liouville.liouvillian_sparse(H, self.c_ops)
+            with m.solver():
+                rho = liouville.steadystate_iterative(L, method=method,
+                                                      **kwargs)
+            with m.phase('convert'):
+                self.rho = qu.Qobj(rho, dims=H.dims)
 
         return self.rho
 
-# Main
-
 def main():
     pass
 
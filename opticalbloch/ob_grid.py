@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+""" N-dimensional parameter scans of OB objects.
+
+An OBScan sweeps one detuning. An OBGrid sweeps any number of named axes,
+each of which is one item of the list passed to one of the OB object's
+setters (set_H_Delta, set_H_Omega, or a decay setter in the child class),
+for example a probe detuning by coupling detuning map for EIT.
+"""
+
+import numpy as np
+
+import liouville
+import metrics
+import parscan
+
+class LabelledArray(np.ndarray):
+    """ An ndarray carrying the labels and values of its leading axes.
+
+    Attributes:
+        labels: list of axis labels, e.g. ['set_H_Delta[0]', ...]
+        values: list of the parameter values along each labelled axis.
+    """
+
+    def __new__(cls, arr, labels=None, values=None):
+
+        obj = np.asarray(arr).view(cls)
+        obj.labels = labels
+        obj.values = values
+        return obj
+
+    def __array_finalize__(self, obj):
+
+        self.labels = getattr(obj, 'labels', None)
+        self.values = getattr(obj, 'values', None)
+
+class OBGrid(object):
+    """ An N-D scan of an OB object over the outer product of its axes.
+
+    Attributes:
+        ob_obj: the OB object to scan.
+        params: dict of setter name -> list of the values passed to that
+            setter, e.g. {'set_H_Delta': [0., 0.], 'set_H_Omega': [1., 1.]}
+        axes: list of (setter name, index, values) triples. At each grid
+            point params[setter][index] is replaced by the point's value.
+        shape: the shape of the grid.
+        labels: a label for each axis, e.g. 'set_H_Delta[0]'.
+    """
+
+    def __init__(self, ob_obj, params, axes):
+
+        self.ob_obj = ob_obj
+        self.params = dict((s, list(v)) for s, v in params.items())
+        self.axes = [(s, i, np.asarray(v)) for s, i, v in axes]
+
+        for setter, idx, _ in self.axes:
+            if setter not in self.params:
+                raise ValueError('No params given for ' + setter)
+
+        self.shape = tuple(len(v) for _, _, v in self.axes)
+        self.labels = ['%s[%d]' % (s, i) for s, i, _ in self.axes]
+
+        self._L_parts = None
+
+    def __repr__(self):
+
+        return "<OBGrid :: %s>" % dict(zip(self.labels, self.shape))
+
+    def __len__(self):
+
+        return int(np.prod(self.shape))
+
+    def set_point(self, point):
+        """ Calls the OB object's setters with the axes set to the values in
+        point (one value per axis). """
+
+        params = dict((s, list(v)) for s, v in self.params.items())
+
+        for (setter, idx, _), value in zip(self.axes, point):
+            params[setter][idx] = value
+
+        for setter, values in params.items():
+            getattr(self.ob_obj, setter)(values)
+
+    def reset(self):
+        """ Calls the OB object's setters with the base params. """
+
+        for setter, values in self.params.items():
+            getattr(self.ob_obj, setter)(list(values))
+
+    def points(self, start=0, stop=None):
+        """ Returns a (stop - start, num_axes) array of the parameter values
+        at the flat (C order) grid indices start:stop. """
+
+        if stop is None:
+            stop = len(self)
+
+        idx = np.unravel_index(np.arange(start, stop), self.shape)
+        return np.stack([v[i] for (_, _, v), i in zip(self.axes, idx)],
+                        axis=-1)
+
+    def liouvillian(self, point):
+        """ The Liouvillian at one grid point, built by the setters. """
+
+        with metrics.of(self.ob_obj).phase('H assembly'):
+            self.set_point(point)
+
+        return self.ob_obj.liouvillian().copy()
+
+    def linear_parts(self, num_checks=16, rtol=1e-10):
+        """ If the Liouvillian is linear in every axis parameter, as it is for
+        detunings, Rabi frequencies and decay rates entering as
+        sqrt(gamma)*c_op, returns L_0 and L_params such that
+
+            L(point) = L_0 + sum_k point[k]*L_params[k].
+
+        The decomposition is found by setting each parameter to 0 and 1 and
+        checked, to within rtol of the largest element, at the first and last
+        points of the grid and a random sample of num_checks others (every
+        point of a smaller grid). A setter that is nonlinear only away from
+        the points checked isn't detected, so the setters are assumed to be
+        either linear or nonlinear over the whole grid. Returns None if the
+        check fails, in which case every point has to be built by the
+        setters. The result is kept after the first call.
+
+        Args:
+            num_checks: number of random grid points to check.
+            rtol: tolerance relative to the largest element of L.
+        """
+
+        if self._L_parts is None:
+
+            num_axes = len(self.axes)
+
+            L_0 = self.liouvillian(np.zeros(num_axes))
+            L_params = np.array([self.liouvillian(np.eye(num_axes)[k]) - L_0
+                                 for k in range(num_axes)])
+
+            self._L_parts = (L_0, L_params)
+
+            N = len(self)
+            if N <= num_checks + 2:
+                checks = np.arange(N)
+            else:
+                # Seeded, so the same grid makes the same choice every run.
+                sample = np.random.RandomState(N).choice(
+                    np.arange(1, N - 1), num_checks, replace=False)
+                checks = np.concatenate(([0, N - 1], sample))
+
+            for i in checks:
+                point = self.points(i, i + 1)[0]
+                L_test = self.liouvillian(point)
+                L_lin = L_0 + np.tensordot(point, L_params, axes=1)
+
+                scale = max(1., np.abs(L_test).max())
+                if not np.allclose(L_lin, L_test, rtol=0., atol=rtol*scale):
+                    self._L_parts = False
+                    break
+
+            self.reset()
+
+        return self._L_parts or None
+
+    def iter_steadystate(self, chunk_size=None, chunks=None):
+        """ Iterates over the grid in chunks of flat (C order) indices,
+        solving each chunk with one stacked linear solve, so a large grid
+        never has to be held in memory at once.
+
+        Args:
+            chunk_size: number of points solved at once.
+            chunks: optional list of (start, stop) flat index ranges to solve,
+                e.g. the pending chunks of a storage.ScanStore. Default is the
+                whole grid in chunks of chunk_size.
+
+        Yields:
+            (start, stop, rho): the flat index range of the chunk and its
+                (stop - start, n, n) array of steady states.
+        """
+
+        n = self.ob_obj.num_states
+
+        if chunk_size is None:
+            chunk_size = liouville.chunk_length(n)
+
+        if chunks is None:
+            chunks = [(start, min(start + chunk_size, len(self)))
+                      for start in range(0, len(self), chunk_size)]
+
+        L_parts = self.linear_parts()
+        m = metrics.of(self.ob_obj)
+
+        for start, stop in chunks:
+            points = self.points(start, stop)
+
+            if L_parts:
+                with m.phase('liouvillian'):
+                    L_s = L_parts[0] + np.tensordot(points, L_parts[1],
+                                                    axes=1)
+            else:
+                L_s = np.array([self.liouvillian(p) for p in points])
+
+            with m.solver():
+                rho = liouville.steadystate_solve(L_s)
+
+            m.progress(stop, len(self), 'OBGrid.steadystate')
+
+            yield start, stop, rho
+
+        if not L_parts:
+            self.reset()
+
+    def steadystate(self, chunk_size=None, num_cpus=None, out=None,
+                    store=None):
+        """ Finds the steady state at every point of the grid.
+
+        Args:
+            chunk_size: number of points solved at once.
+            num_cpus: if given, solve the chunks in a process pool with this
+                many workers (see parscan). Needs a Liouvillian that is linear
+                in the axis parameters.
+            out: optional (*shape, n, n) complex array (e.g. a memmap) to
+                write the states into.
+            store: a storage.ScanStore to stream the states into, chunk by
+                chunk, in place of out. If it holds a partly completed run of
+                the same grid, only the missing chunks are solved.
+
+        Returns:
+            rho: LabelledArray of shape (*shape, n, n).
+        """
+
+        n = self.ob_obj.num_states
+
+        if chunk_size is None:
+            chunk_size = liouville.chunk_length(n)
+
+        if store is not None:
+            return self._steadystate_store(chunk_size, store)
+
+        if out is None:
+            out = np.empty(self.shape + (n, n), dtype=complex)
+        elif not out.flags.c_contiguous:
+            raise ValueError('out must be C contiguous.')
+
+        out_flat = out.reshape((len(self), n, n))
+
+        if num_cpus is not None:
+            L_parts = self.linear_parts()
+
+            if not L_parts:
+                raise ValueError('A parallel grid needs a Liouvillian that '
+                                 'is linear in the axis parameters.')
+
+            ops = {'L': L_parts[0], 'L_params': L_parts[1],
+                   'points': self.points()}
+
+            out_flat[:] = parscan.run((len(self), n, n), 'grid', ops,
+                                      num_cpus=num_cpus,
+                                      chunk_size=chunk_size,
+                                      metrics=metrics.of(self.ob_obj))
+        else:
+            for start, stop, rho in self.iter_steadystate(chunk_size):
+                out_flat[start:stop] = rho
+
+        return LabelledArray(out, self.labels,
+                             [v for _, _, v in self.axes])
+
+    def _steadystate_store(self, chunk_size, store):
+        """ steadystate, streaming each chunk into a storage.ScanStore. """
+
+        n = self.ob_obj.num_states
+
+        key = self.ob_obj.cache_key('OBGrid.steadystate', self.params,
+                                    self.axes)
+        store.prepare(len(self), (n, n), chunk_size, grid_shape=self.shape,
+                      meta={'key': key, 'labels': self.labels})
+
+        for start, stop, rho in self.iter_steadystate(chunk_size,
+                                                       store.pending()):
+            store.write(start, stop, rho)
+
+        return LabelledArray(store.rho, self.labels,
+                             [v for _, _, v in self.axes])
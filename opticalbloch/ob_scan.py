@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 
-import os
 import sys
+import warnings
 
 import numpy as np 
+import scipy.sparse as sp
 import qutip as qu
 
+import liouville
+import metrics
+import observables
+import parscan
+
 """
 Contains the class for making optical bloch scan objects.
 
@@ -22,172 +28,703 @@ class OBScan(object):
 
         self.rho_Delta = [None]*len(self.Delta_range)
         self.result_Delta = [None]*len(self.Delta_range)
+        self.observed = None
+
+    def essolve(self, Deltas, tlist, rho0=None, cache=None):
+        """ Runs OB.essolve at every point in Delta_range.
+
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta. The item at
+                Delta_idx is replaced by each point in Delta_range.
+            tlist: The list of times for which to find the density matrix.
+            rho0: Define an initial density matrix. Default is ground state.
+            cache: a cache.ResultCache to look the scan up in and store it to.
+
+        Returns:
+            rho_Delta: list of the final density matrices.
+            result_Delta: list of qutip result objects.
+        """
+
+        if cache is not None:
+            key = self.ob_obj.cache_key('OBScan.essolve', Deltas,
+                                        self.Delta_range, self.Delta_idx,
+                                        tlist, rho0)
+            cached = cache.get(key)
+            metrics.of(self.ob_obj).count('cache_misses' if cached is None
+                                          else 'cache_hits')
+
+            if cached is not None:
+                (self.rho_Delta, self.result_Delta) = cached
+                return self.rho_Delta, self.result_Delta
+
+        # Reset rho_Delta in case of multiple calcs
+        self.rho_Delta = [None]*len(self.Delta_range)
+        self.result_Delta = [None]*len(self.Delta_range)
+
+        Deltas_i = list(Deltas) # Make copy, don't modify in place                
+
+        m = metrics.of(self.ob_obj)
+        N = len(self.Delta_range)
+
+        for i, Delta_i in enumerate(self.Delta_range):
+
+            # Set the omega of the chosen beam to the current delta step.
+            Deltas_i[self.Delta_idx] = Delta_i
+            with m.phase('H assembly'):
+                self.ob_obj.set_H_Delta(Deltas_i)
+
+            try:
+                result = self.ob_obj.essolve(tlist, rho0=rho0)
+                self.result_Delta[i] = result
+                self.rho_Delta[i] = result.states[-1]
+
+            except ValueError:
+                warnings.warn('Failed to solve at Delta = ' + str(Delta_i))
+                m.count('failed_points')
 
-    def essolve(self, Deltas, tlist, rho0=None, recalc=True, savefile=None):
+            m.progress(i + 1, N, 'OBScan.essolve')
 
-        savefile_exists = os.path.isfile(str(savefile) + '.qu')
+        if cache is not None:
+            cache.put(key, (self.rho_Delta, self.result_Delta))
 
-        # If 1) we ask for it to be recalculated or 2) it *must* be calculated
-        # because no savefile exists: do the steady state calc. Else load file.
-        if (recalc or not savefile_exists):
+        return self.rho_Delta, self.result_Delta
 
-            # Reset rho_Delta in case of multiple calcs
-            self.rho_Delta = [None]*len(self.Delta_range)
-            self.result_Delta = [None]*len(self.Delta_range)
+    def steadystate(self, Deltas, cache=None):
+        """ Runs OB.steadystate at every point in Delta_range.
 
-            Deltas_i = list(Deltas) # Make copy, don't modify in place                
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta. The item at
+                Delta_idx is replaced by each point in Delta_range.
+            cache: a cache.ResultCache to look the scan up in and store it to.
 
-            Delta_steps = len(self.Delta_range)-1
+        Returns:
+            rho_Delta: list of the steady-state density matrices, None at
+                points where no steady state was found.
+        """
 
-            for i, Delta_i in enumerate(self.Delta_range):
+        if cache is not None:
+            key = self.ob_obj.cache_key('OBScan.steadystate', Deltas,
+                                        self.Delta_range, self.Delta_idx)
+            cached = cache.get(key)
+            metrics.of(self.ob_obj).count('cache_misses' if cached is None
+                                          else 'cache_hits')
 
+            if cached is not None:
+                self.rho_Delta = cached
+                return self.rho_Delta
+
+        # Reset rho_Delta in case of multiple calcs
+        self.rho_Delta = [None]*len(self.Delta_range)
+        Deltas_i = list(Deltas) # Make copy, don't modify in place
 
+        m = metrics.of(self.ob_obj)
+        N = len(self.Delta_range)
 
-                print("\rDelta: " + str(Delta_i) + ", " + str(i) + "/" +
-                      str(Delta_steps))
+        for i, Delta_i in enumerate(self.Delta_range):
 
-                # Set the omega of the chosen beam to the current delta step.
-                Deltas_i[self.Delta_idx] = Delta_i
+            # Set the omega of the chosen beam to the current delta step.
+            Deltas_i[self.Delta_idx] = Delta_i
+            with m.phase('H assembly'):
                 self.ob_obj.set_H_Delta(Deltas_i)
 
-                try:
-                    result = self.ob_obj.essolve(tlist, rho0=rho0)
+            try:
+                self.ob_obj.steadystate()
+                self.rho_Delta[i] = self.ob_obj.rho
+            except ValueError:
+                warnings.warn('Failed to find steadystate at Delta = ' +
+                              str(Delta_i))
+                m.count('failed_points')
 
-                except ValueError:
-                    print ("Failed to solve.")
+            m.progress(i + 1, N, 'OBScan.steadystate')
 
-                self.result_Delta[i] = result
-                self.rho_Delta[i] = result.states[-1]
+        if cache is not None:
+            cache.put(key, self.rho_Delta)
+
+        return self.rho_Delta
 
-            # Only save the file if we have a place to save it
-            if (savefile != None):
-                qu.qsave((self.rho_Delta, self.result_Delta), savefile)
+    def steadystate_batch(self, Deltas, chunk_size=None, store=None,
+                          observables=None):
+        """ Finds the steady state at every point in Delta_range with stacked
+        NumPy linear solves, instead of one call to qu.steadystate per point.
+
+        The Liouvillian is built once and the scanned detuning is added as a
+        diagonal, so the detuning term of the OB object must be diagonal and
+        linear in Deltas[Delta_idx].
+
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta. The item at
+                Delta_idx is replaced by each point in Delta_range.
+            chunk_size: number of points to solve at once. Default keeps the
+                stack of Liouvillians under liouville.MAX_STACK_BYTES.
+            store: a storage.ScanStore to stream the results into, chunk by
+                chunk. If it holds a partly completed run of the same scan,
+                only the missing chunks are solved.
+            observables: an observables.Observables to record from each
+                chunk of states, in place of keeping the states.
+
+        Returns:
+            rho_Delta: (len(Delta_range), n, n) array of density matrices (a
+                memmap if a store is given), or with observables the dict of
+                (len(Delta_range), ...) arrays it records, also kept in
+                observed, and rho_Delta is not kept.
+        """
+
+        n = self.ob_obj.num_states
+        m = metrics.of(self.ob_obj)
+
+        if chunk_size is None:
+            chunk_size = liouville.chunk_length(n)
+
+        if observables is not None and store is not None:
+            raise ValueError('Give either a store or observables.')
+
+        with m.phase('H assembly'):
+            H_Delta_0, dH_Delta = self.ob_obj.H_Delta_parts(Deltas,
+                                                            self.Delta_idx)
+
+        L = self.ob_obj.liouvillian(H_Delta_0)
+        L_Delta = liouville.commutator_diag(dH_Delta)
+
+        if observables is not None:
+            return self._observe_chunks(
+                observables, (), chunk_size, 'OBScan.steadystate_batch',
+                lambda s: liouville.steadystate_stack(L, L_Delta, s))
+
+        key = self.ob_obj.cache_key('OBScan.steadystate', Deltas,
+                                    self.Delta_range, self.Delta_idx)
+        rho_Delta, chunks = self._prepare_out((n, n), chunk_size, store, key)
+
+        for start, stop in chunks:
+            with m.solver():
+                rho = liouville.steadystate_stack(L, L_Delta,
+                                                  self.Delta_range[start:stop])
+            with m.phase('convert'):
+                if store is not None:
+                    store.write(start, stop, rho)
+                else:
+                    rho_Delta[start:stop] = rho
+
+            m.progress(stop, len(self.Delta_range), 'OBScan.steadystate_batch')
+
+        self.rho_Delta = rho_Delta
 
-        # Otherwise load the steady state rho_v_delta from file
+        return self.rho_Delta
+
+    def steadystate_continuation(self, Deltas, method='gmres', tol=1e-12,
+                                 max_change=None, min_step=None,
+                                 max_iterations=20):
+        """ Finds the steady state at every point in Delta_range in order,
+        by continuation: each point is solved with a Krylov solver (see
+        liouville.steadystate_iterative) starting from the previous point's
+        state, and with the previous point's ILU preconditioner, which is
+        only refactorised once the solver needs more than max_iterations.
+
+        If max_change is given, the grid is refined as the sweep goes: where
+        the state changes between neighbouring points by more than
+        max_change (in the largest element), the midpoint is solved first,
+        down to steps of min_step. Delta_range is then replaced by the
+        refined, sorted grid, which is finest around resonances.
+
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta. The item at
+                Delta_idx is replaced by each point in Delta_range.
+            method: 'gmres' or 'bicgstab'.
+            tol: relative tolerance of the solver.
+            max_change: largest change in any element of rho allowed between
+                neighbouring points. Default is no refinement.
+            min_step: smallest detuning step refinement goes down to.
+                Default is 1e-3 of the smallest step in Delta_range.
+            max_iterations: number of iterations above which the
+                preconditioner is rebuilt for the next point. If the solver
+                fails with the previous point's preconditioner, it is
+                rebuilt at once and the point solved again.
+
+        Returns:
+            rho_Delta: (len(Delta_range), n, n) array of density matrices.
+        """
+
+        ob_obj = self.ob_obj
+        n = ob_obj.num_states
+        m = metrics.of(ob_obj)
+
+        with m.phase('H assembly'):
+            H_Delta_0, dH_Delta = ob_obj.H_Delta_parts(Deltas, self.Delta_idx)
+            H = ob_obj.H_static() + H_Delta_0
+
+        with m.phase('liouvillian'):
+            L_0 = liouville.liouvillian_sparse(H, ob_obj.c_ops)
+            L_Delta = sp.diags(liouville.commutator_diag(dH_Delta))
+
+        Delta_range = np.asarray(self.Delta_range, dtype=float)
+
+        if min_step is None:
+            steps = np.abs(np.diff(Delta_range))
+            min_step = 1e-3*(steps[steps > 0].min() if np.any(steps > 0)
+                             else 1.)
+
+        todo = list(Delta_range[::-1]) # A stack, next point last.
+        solved = {}
+        Deltas_out, rho_out = [], []
+        x0, M = None, None
+
+        while todo:
+            Delta = todo.pop()
+
+            if Delta in solved:
+                rho = solved.pop(Delta)
+            else:
+                # A stale preconditioner can make the solver fail outright,
+                # so it is then rebuilt at this point and the solve retried.
+                for M_try in ([M] if M is None else [M, None]):
+                    info = {}
+                    try:
+                        with m.solver():
+                            rho = liouville.steadystate_iterative(
+                                L_0 + Delta*L_Delta, method=method, x0=x0,
+                                tol=tol, M=M_try, info=info)
+                        break
+                    except ValueError:
+                        if M_try is None:
+                            raise
+                        m.count('preconditioner_retries')
+                        M = None
+                m.count('iterations', info['iterations'])
+
+                if M is None:
+                    m.count('preconditioner_builds')
+                M = info['M'] if info['iterations'] <= max_iterations else None
+
+            if (max_change is not None and rho_out and
+                    np.abs(rho - rho_out[-1]).max() > max_change and
+                    abs(Delta - Deltas_out[-1]) > 2*min_step):
+                solved[Delta] = rho
+                todo.extend([Delta, 0.5*(Delta + Deltas_out[-1])])
+                continue
+
+            Deltas_out.append(Delta)
+            rho_out.append(rho)
+            x0 = liouville.vec(rho)
+
+            m.progress(len(Deltas_out), len(Deltas_out) + len(todo),
+                       'OBScan.steadystate_continuation')
+
+        self.Delta_range = np.asarray(Deltas_out)
+        self.rho_Delta = np.asarray(rho_out).reshape(-1, n, n)
+
+        if max_change is not None:
+            order = np.argsort(self.Delta_range, kind='stable')
+            self.Delta_range = self.Delta_range[order]
+            self.rho_Delta = self.rho_Delta[order]
+
+        return self.rho_Delta
+
+    def steadystate_adaptive(self, Deltas, tol=1e-3, elements=None,
+                             max_points=10000, min_step=None):
+        """ Finds the steady state on a detuning grid refined adaptively
+        until linear interpolation between the grid points reproduces the
+        chosen elements of rho to within tol.
+
+        Starting from Delta_range, each round solves the midpoints of the
+        intervals not yet accepted, in one stacked solve (see
+        steadystate_batch). An interval is accepted when the value at its
+        midpoint differs from the linear interpolant of its ends by at most
+        tol, in the real and imaginary parts of every chosen element; if
+        not, both halves are checked in the next round. Points end up
+        concentrated on narrow features, e.g. EIT windows, and sparse in the
+        flat wings. A feature must show at some midpoint to be found, so
+        Delta_range should not be much coarser than the narrowest line.
+        Delta_range is replaced by the refined, sorted grid.
+
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta. The item at
+                Delta_idx is replaced by each point of the grid.
+            tol: largest interpolation error allowed.
+            elements: list of (a, b) index pairs of the elements of rho to
+                resolve, e.g. [(0, 1)] for a coherence. Default is all.
+            max_points: the grid is refined no further than this many points.
+                A warning is given if intervals are then still not within
+                tol, and their number is counted as unconverged_intervals.
+            min_step: intervals are split no finer than this. Default is
+                1e-6 of the range.
+
+        Returns:
+            rho_Delta: (len(Delta_range), n, n) array of density matrices
+                on the refined Delta_range.
+        """
+
+        ob_obj = self.ob_obj
+        n = ob_obj.num_states
+        m = metrics.of(ob_obj)
+
+        with m.phase('H assembly'):
+            H_Delta_0, dH_Delta = ob_obj.H_Delta_parts(Deltas, self.Delta_idx)
+
+        L = ob_obj.liouvillian(H_Delta_0)
+        L_Delta = liouville.commutator_diag(dH_Delta)
+
+        if elements is None:
+            idx = np.arange(n**2)
         else:
-            (self.rho_Delta, self.result_Delta) = qu.qload(savefile)
+            idx = np.array([a*n + b for a, b in elements])
 
-        return self.rho_Delta, self.result_Delta
+        def solve(Delta_points):
+            with m.solver():
+                return liouville.steadystate_stack(L, L_Delta, Delta_points)
 
-    def steadystate(self, Deltas, recalc=True, savefile=None):# , **kwargs):
-        
-        savefile_exists = os.path.isfile(str(savefile) + '.qu')
+        grid = np.unique(np.asarray(self.Delta_range, dtype=float))
+        rho = solve(grid)
 
-        # If 1) we ask for it to be recalculated or 2) it *must* be calculated
-        # because no savefile exists: do the steady state calc. Else load file.
-        if (recalc or not savefile_exists):
+        if min_step is None:
+            min_step = 1e-6*(grid[-1] - grid[0])
 
-            # Reset rho_Delta in case of multiple calcs
-            self.rho_Delta = [None]*len(self.Delta_range)
-            Deltas_i = list(Deltas) # Make copy, don't modify in place
+        # Intervals to check, as index pairs into the (growing) grid arrays.
+        Delta_list = list(grid)
+        rho_list = list(rho)
+        todo = [(i, i + 1) for i in range(len(grid) - 1)]
 
-            Delta_steps = len(self.Delta_range)-1
+        while todo:
 
-            for i, Delta_i in enumerate(self.Delta_range):
+            todo = [(i, j) for i, j in todo
+                    if Delta_list[j] - Delta_list[i] > 2*min_step]
 
-                print("\rDelta: " + str(Delta_i) + ", " + str(i) + "/" +
-                      str(Delta_steps))
+            room = max_points - len(Delta_list)
 
-                # Set the omega of the chosen beam to the current delta step.
-                Deltas_i[self.Delta_idx] = Delta_i
-                self.ob_obj.set_H_Delta(Deltas_i)
+            if not todo or room <= 0:
+                break
 
-                try:
-                    self.ob_obj.steadystate()
-                except ValueError:
-                    print ("Failed to find steadystate.")
+            todo, skipped = todo[:room], todo[room:]
 
-                self.rho_Delta[i] = self.ob_obj.rho
+            mids = np.array([0.5*(Delta_list[i] + Delta_list[j])
+                             for i, j in todo])
+            rho_mids = solve(mids)
 
-            # Only save the file if we have a place to save it
-            if (savefile != None):
-                qu.qsave(self.rho_Delta, savefile)
+            next_todo = []
 
-        # Otherwise load the steady state rho_v_delta from file
-        else:
-            self.rho_Delta = qu.qload(savefile)
+            for (i, j), Delta, rho_mid in zip(todo, mids, rho_mids):
+                k = len(Delta_list)
+                Delta_list.append(Delta)
+                rho_list.append(rho_mid)
+
+                interp = 0.5*(rho_list[i] + rho_list[j]).ravel()[idx]
+                d = rho_mid.ravel()[idx] - interp
+
+                if max(np.abs(d.real).max(), np.abs(d.imag).max()) > tol:
+                    next_todo.extend([(i, k), (k, j)])
+
+            m.progress(len(Delta_list), len(Delta_list) + 2*len(next_todo),
+                       'OBScan.steadystate_adaptive')
+
+            todo = next_todo + skipped
+
+        if todo:
+            warnings.warn('steadystate_adaptive stopped at max_points = %d '
+                          'with %d intervals not yet within tol.' %
+                          (max_points, len(todo)))
+            m.count('unconverged_intervals', len(todo))
+
+        order = np.argsort(Delta_list)
+
+        self.Delta_range = np.asarray(Delta_list)[order]
+        self.rho_Delta = np.asarray(rho_list)[order]
+
+        return self.rho_Delta
+
+    def linear_response(self, Deltas, probe_idx=0):
+        """ The steady state at every point in Delta_range to first order in
+        a weak probe (see liouville.linear_response): the unperturbed steady
+        state is solved once, and the first-order change for the whole scan
+        from one eigendecomposition per coherence sector, in place of a full
+        nonlinear solve at each point.
+
+        The scanned detuning must be that of the probe, so that without the
+        probe it only shifts the phases of the coherences the probe drives.
+
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta. The item at
+                Delta_idx is replaced by each point in Delta_range.
+            probe_idx: the index of the probe term in H_I_list().
+
+        Returns:
+            rho_Delta: (len(Delta_range), n, n) array of the density matrices
+                to first order in the probe. The probe coherence rho_Delta[:,
+                a, b] can be passed to macro.calc_susceptibility.
+
+        Raises:
+            ValueError: if the scanned detuning mixes with the rest of the
+                system other than through the probe.
+        """
+
+        ob_obj = self.ob_obj
+        m = metrics.of(ob_obj)
+
+        with m.phase('H assembly'):
+            H_Delta_0, dH_Delta = ob_obj.H_Delta_parts(Deltas, self.Delta_idx)
+            H_p = ob_obj.H_I_list()[probe_idx]
+            H_u = ob_obj.H_static() - H_p + H_Delta_0
+
+        with m.phase('liouvillian'):
+            L_u = liouville.liouvillian(H_u, ob_obj.c_ops)
+            L_p = liouville.liouvillian(H_p)
+
+        with m.solver():
+            rho_0, rho_1 = liouville.linear_response(
+                L_u, L_p, liouville.commutator_diag(dH_Delta),
+                self.Delta_range)
+
+        self.rho_Delta = rho_0 + rho_1
 
         return self.rho_Delta
 
-    def steadystate_parfor(self, Deltas, num_cpus=None, recalc=True, 
-                           savefile=None):
+    def propagate(self, Deltas, tlist, rho0=None, chunk_size=None, 
+                  store=None, observables=None):
+        """ Propagator mode of essolve for every point in Delta_range. The
+        Liouvillians for all detunings are diagonalised as one stack and the
+        states at every time found by one contraction per chunk.
+
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta. The item at
+                Delta_idx is replaced by each point in Delta_range.
+            tlist: The list of times for which to find the density matrix.
+            rho0: Define an initial density matrix. Default is ground state.
+            chunk_size: number of points to diagonalise at once.
+            store: a storage.ScanStore to stream the results into, chunk by
+                chunk. If it holds a partly completed run of the same scan,
+                only the missing chunks are solved.
+            observables: an observables.Observables to record from each
+                chunk of states, in place of keeping the states.
+
+        Returns:
+            states: (len(Delta_range), len(tlist), n, n) array (a memmap if a
+                store is given), or with observables the dict of
+                (len(Delta_range), len(tlist), ...) arrays it records, also
+                kept in observed. The final states are kept in rho_Delta.
+        """
+
+        ob_obj = self.ob_obj
+
+        if rho0 is None:
+            rho0 = ob_obj.ground_state()*ob_obj.ground_state().dag()
+
+        m = metrics.of(ob_obj)
+
+        with m.phase('H assembly'):
+            H_Delta_0, dH_Delta = ob_obj.H_Delta_parts(Deltas, self.Delta_idx)
+
+        L = ob_obj.liouvillian(H_Delta_0)
+        L_Delta = liouville.commutator_diag(dH_Delta)
+
+        rho0_vec = liouville.vec(liouville.to_dm(rho0))
+
+        n = ob_obj.num_states
+        n2 = n**2
+
+        if chunk_size is None:
+            chunk_size = liouville.chunk_length(n)
+
+        diag_idx = np.arange(n2)
+
+        def solve(s):
+            L_s = np.empty((len(s), n2, n2), dtype=complex)
+            L_s[:] = L
+            L_s[:, diag_idx, diag_idx] += s[:, None]*L_Delta
+            return liouville.unvec(liouville.evolve_eig(L_s, rho0_vec, tlist))
 
-        savefile_exists = os.path.isfile(str(savefile) + '.qu')
+        if observables is not None:
+            if store is not None:
+                raise ValueError('Give either a store or observables.')
+            return self._observe_chunks(observables, (len(tlist),),
+                                        chunk_size, 'OBScan.propagate', solve)
 
-        # If 1) we ask for it to be recalculated or 2) it *must* be calculated
-        # because no savefile exists: do the steady state calc. Else load file.
-        if (recalc or not savefile_exists):
+        key = ob_obj.cache_key('OBScan.propagate', Deltas, self.Delta_range,
+                               self.Delta_idx, tlist, rho0)
+        states, chunks = self._prepare_out((len(tlist), n, n), chunk_size,
+                                           store, key)
 
-            # Reset rho_Delta in case of multiple calcs
-            self.rho_Delta = [None]*len(self.Delta_range)
-            Deltas_i = list(Deltas) # Make copy, don't modify in place
+        for start, stop in chunks:
+            with m.solver():
+                states_s = solve(np.asarray(self.Delta_range[start:stop]))
+            with m.phase('convert'):
+                if store is not None:
+                    store.write(start, stop, states_s)
+                else:
+                    states[start:stop] = states_s
 
-            Delta_steps = len(self.Delta_range)-1
+            m.progress(stop, len(self.Delta_range), 'OBScan.propagate')
 
-            self.rho_Delta = qu.parfor(steadystate_parfor_func, 
-                                       self.Delta_range, 
-                                       Delta_idx=self.Delta_idx, 
-                                       Deltas=Deltas_i, ob_obj=self.ob_obj,
-                                       num_cpus=num_cpus)
+        self.rho_Delta = states[:, -1]
 
-            # Only save the file if we have a place to save it
-            if (savefile != None):
-                qu.qsave(self.rho_Delta, savefile)
+        return states
 
-        # Otherwise load the steady state rho_v_delta from file
+    def _observe_chunks(self, observables, point_shape, chunk_size, label,
+                        solve):
+        """ Solves Delta_range chunk by chunk with solve(Deltas), which
+        returns the (chunk, *point_shape, n, n) states, keeping only what
+        observables records, and for time series the final states. """
+
+        n = self.ob_obj.num_states
+        N = len(self.Delta_range)
+        m = metrics.of(self.ob_obj)
+
+        self.observed = observables.empty((N,) + point_shape)
+        self.rho_Delta = (np.empty((N, n, n), dtype=complex) if point_shape
+                          else None)
+
+        for start in range(0, N, chunk_size):
+            stop = min(start + chunk_size, N)
+
+            with m.solver():
+                rho = solve(np.asarray(self.Delta_range[start:stop]))
+
+            with m.phase('convert'):
+                for name, values in observables(rho).items():
+                    self.observed[name][start:stop] = values
+                if point_shape:
+                    self.rho_Delta[start:stop] = rho[:, -1]
+
+            m.progress(stop, N, label)
+
+        return self.observed
+
+    def _prepare_out(self, point_shape, chunk_size, store, key):
+        """ Returns the array to hold a scan's results and the list of
+        (start, stop) chunks to solve: all of them for a new in-memory array,
+        or the ones still missing from a store. """
+
+        N = len(self.Delta_range)
+
+        if store is None:
+            out = np.empty((N,) + point_shape, dtype=complex)
+            chunks = [(start, min(start + chunk_size, N))
+                      for start in range(0, N, chunk_size)]
         else:
-            self.rho_Delta = qu.qload(savefile)
+            store.prepare(N, point_shape, chunk_size, meta={'key': key})
+            out = store.rho
+            chunks = store.pending()
+
+        return out, chunks
+
+    def steadystate_parfor(self, Deltas, num_cpus=None, chunk_size=None,
+                           cache=None):
+        """ Runs the steady state calc for each point in Delta_range in
+        parallel with the process pool in parscan.
+
+        Args:
+            Deltas: list of detunings, as passed to set_H_Delta. The item at
+                Delta_idx is replaced by each point in Delta_range.
+            num_cpus: number of processes to use. Default is all of them.
+            chunk_size: number of points per task.
+            cache: a cache.ResultCache to look the scan up in and store it to.
+
+        Returns:
+            rho_Delta: (len(Delta_range), n, n) array of steady states.
+        """
+
+        if cache is not None:
+            # Not shared with steadystate, which stores a list of Qobj.
+            key = self.ob_obj.cache_key('OBScan.steadystate_parfor', Deltas,
+                                        self.Delta_range, self.Delta_idx)
+            cached = cache.get(key)
+            metrics.of(self.ob_obj).count('cache_misses' if cached is None
+                                          else 'cache_hits')
+
+            if cached is not None:
+                self.rho_Delta = cached
+                return self.rho_Delta
+
+        self.rho_Delta = parscan.scan(self.ob_obj, Deltas, self.Delta_range,
+                                      self.Delta_idx, mode='steadystate',
+                                      num_cpus=num_cpus,
+                                      chunk_size=chunk_size)
+
+        if cache is not None:
+            cache.put(key, self.rho_Delta)
 
         return self.rho_Delta
 
-    def get_rho_Delta(self):
+    def essolve_parfor(self, Deltas, tlist, rho0=None, num_cpus=None,
+                       chunk_size=None):
+        """ The propagator mode of essolve (see propagate) for each point in
+        Delta_range, in parallel with the process pool in parscan.
 
-        rho_Delta = np.zeros((len(self.Delta_range), self.ob_obj.num_states, 
-                              self.ob_obj.num_states), dtype=np.complex)
+        Returns:
+            states: (len(Delta_range), len(tlist), n, n) array. The final
+                states are also kept in rho_Delta.
+        """
 
-        for i, rho_i in enumerate(self.rho_Delta):
-            rho_Delta[i] = self.rho_Delta[i].full()
+        states = parscan.scan(self.ob_obj, Deltas, self.Delta_range,
+                              self.Delta_idx, mode='essolve', tlist=tlist,
+                              rho0=rho0, num_cpus=num_cpus,
+                              chunk_size=chunk_size)
 
-        return rho_Delta
+        self.rho_Delta = states[:, -1]
 
-    def get_rho_Delta_element_sum(self, rho_list):
+        return states
 
-        rho_sum = np.zeros(len(self.Delta_range), dtype=np.complex)
+    def mesolve_parfor(self, Deltas, tlist, rho0=None, td=False, args={},
+                       opts=qu.Options(), num_cpus=None, chunk_size=None):
+        """ Runs OB.mesolve for each point in Delta_range, in parallel with
+        the process pool in parscan. Time functions for td interactions must
+        be module-level functions (e.g. from t_funcs) if the platform starts
+        worker processes by spawning rather than forking.
 
-        rho_Delta = self.get_rho_Delta()
+        Returns:
+            states: (len(Delta_range), len(tlist), n, n) array. The final
+                states are also kept in rho_Delta.
+        """
 
-        for i, Delta in enumerate(self.Delta_range):
-            for j in rho_list:         
-                rho_sum[i] += rho_Delta[i].item(j)
+        states = parscan.scan(self.ob_obj, Deltas, self.Delta_range,
+                              self.Delta_idx, mode='mesolve', tlist=tlist,
+                              rho0=rho0, td=td, args=args, opts=opts,
+                              num_cpus=num_cpus, chunk_size=chunk_size)
 
-        return rho_sum
+        self.rho_Delta = states[:, -1]
 
-    def get_rho_Delta_element_sum_cutoff(self, rho_list, cutoff):
+        return states
+
+    def get_rho_Delta(self):
+        """ Returns: rho_Delta as a (len(Delta_range), n, n) array. A list of
+        Qobj states from the per-point solvers is converted once and kept
+        until rho_Delta changes. Points the solver failed at (None) are NaN.
+        """
+
+        # The batched solvers already store a dense array.
+        if isinstance(self.rho_Delta, np.ndarray):
+            return self.rho_Delta
+
+        states, rho_Delta = getattr(self, '_rho_Delta_array', ([], None))
+
+        if (len(states) != len(self.rho_Delta) or
+                any(a is not b for a, b in zip(states, self.rho_Delta))):
+            n = next((rho.shape[0] for rho in self.rho_Delta
+                      if rho is not None), self.ob_obj.num_states)
+            nan = np.full((n, n), np.nan, dtype=complex)
+            rho_Delta = np.array([nan if rho is None else rho.full()
+                                  for rho in self.rho_Delta], dtype=complex)
+            self._rho_Delta_array = (list(self.rho_Delta), rho_Delta)
 
-        rho_sum = np.zeros(len(self.Delta_range), dtype=np.complex)
+        return rho_Delta
 
-        rho_Delta = self.get_rho_Delta()
+    def get_rho_Delta_element_sum(self, rho_list):
+        """ Returns: the sum of the elements (a, b) in rho_list at each
+        point of Delta_range. """
 
-        for j in rho_list:
-            if (j[0] == j[1]): # If we're looking at a population
-                pass
-            else: # we're looking at a coherence
-                omega_0 = (self.ob_obj.H_0[j[1],j[1]] - 
-                           self.ob_obj.H_0[j[0],j[0]])
-                for i, Delta in enumerate(self.Delta_range):
-                    # rho_sum[i] += rho_Delta[i].item(j)
-                    rho_sum[i] += (rho_Delta[i].item(j)*
-                                   (abs(Delta - omega_0) < cutoff))
+        return observables.element_sum(self.get_rho_Delta(), rho_list)
+
+    def get_rho_Delta_element_sum_cutoff(self, rho_list, cutoff):
+        """ Returns: the sum of the coherences (a, b) in rho_list at each
+        point of Delta_range within cutoff of their transition frequency
+        H_0[b, b] - H_0[a, a]. Populations are left out. """
 
-        return rho_sum
+        coherences = [j for j in rho_list if j[0] != j[1]]
 
-def steadystate_parfor_func(Delta, Delta_idx=0, Deltas=[], ob_obj=None):
+        if not coherences:
+            return np.zeros(len(self.Delta_range), dtype=complex)
 
-    print("Delta: " + str(Delta) + "\r")
+        H_0 = liouville.to_array(self.ob_obj.H_0).diagonal()
+        omega_0 = np.array([H_0[b] - H_0[a] for a, b in coherences])
 
-    Deltas[Delta_idx] = Delta
-    
-    ob_obj.set_H_Delta(Deltas)
-    H = ob_obj.H_0 + ob_obj.H_Delta + ob_obj.H_I_sum()
+        mask = (np.abs(np.asarray(self.Delta_range)[:, None] - omega_0) <
+                cutoff)
 
-    return qu.steadystate(H, ob_obj.c_ops)
\ No newline at end of file
+        return observables.element_sum(self.get_rho_Delta(), coherences,
+                                       mask)
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+""" Recording chosen quantities from states, in place of the states.
+
+An Observables object names the elements of rho, operator expectations and
+whether the trace are wanted. The batched scans take one and apply it to
+each chunk of states as it is solved, so only the compact results are kept:
+
+    obs = observables.Observables(elements=[(0, 1), (1, 1)], e_ops=[sz])
+    result = scan.steadystate_batch(Deltas, observables=obs)
+    result['elements']   # (len(Delta_range), 2)
+    result['expect']     # (len(Delta_range), 1)
+
+For OB.mesolve the same quantities are passed to QuTiP as e_ops, so no
+states are stored at all.
+"""
+
+import numpy as np
+import qutip as qu
+
+import liouville
+import sigma
+
+class Observables(object):
+    """ The quantities to record from each state.
+
+    Attributes:
+        elements: list of (a, b) index pairs of elements of rho.
+        e_ops: list of (n, n) operator arrays, recorded as Tr(A rho).
+        trace: record Tr(rho)?
+    """
+
+    def __init__(self, elements=[], e_ops=[], trace=False):
+
+        self.elements = [tuple(e) for e in elements]
+        self.e_ops = [liouville.to_array(A) for A in e_ops]
+        self.trace = trace
+
+    def __repr__(self):
+
+        return "<Observables :: %d elements, %d e_ops%s>" % (
+            len(self.elements), len(self.e_ops),
+            ', trace' if self.trace else '')
+
+    def __call__(self, rho):
+        """ The quantities of a stack of density matrices.
+
+        Args:
+            rho: (..., n, n) array.
+
+        Returns:
+            dict with, of those requested, 'elements': (..., len(elements)),
+            'expect': (..., len(e_ops)) and 'trace': (...) arrays.
+        """
+
+        rho = np.asarray(rho)
+        result = {}
+
+        if self.elements:
+            rows, cols = np.array(self.elements).T
+            result['elements'] = rho[..., rows, cols]
+
+        if self.e_ops:
+            # Tr(A rho) = sum_ij A_ji rho_ij
+            result['expect'] = np.einsum('kji,...ij->...k',
+                                         np.array(self.e_ops), rho)
+
+        if self.trace:
+            result['trace'] = np.trace(rho, axis1=-2, axis2=-1)
+
+        return result
+
+    def empty(self, shape):
+        """ Arrays to hold the quantities at each point of a scan.
+
+        Args:
+            shape: the leading shape, e.g. (len(Delta_range), len(tlist)).
+
+        Returns:
+            dict of uninitialised complex arrays, as returned by __call__.
+        """
+
+        shape = tuple(shape)
+        result = {}
+
+        if self.elements:
+            result['elements'] = np.empty(shape + (len(self.elements),),
+                                          dtype=complex)
+        if self.e_ops:
+            result['expect'] = np.empty(shape + (len(self.e_ops),),
+                                        dtype=complex)
+        if self.trace:
+            result['trace'] = np.empty(shape, dtype=complex)
+
+        return result
+
+    def qutip_e_ops(self, dims):
+        """ The quantities as a list of operators for QuTiP's e_ops:
+        rho_ab = Tr(|b><a| rho), then the e_ops, then the identity for the
+        trace.
+
+        Args:
+            dims: the QuTiP dims of the system's operators, e.g. H_0.dims,
+                which mesolve requires the e_ops to match for systems of
+                several atoms.
+        """
+
+        n = int(np.prod(dims[0]))
+
+        ops = [sigma.sigma(n, b, a).full() for a, b in self.elements]
+        ops += self.e_ops
+
+        if self.trace:
+            ops.append(np.eye(n))
+
+        return [qu.Qobj(A, dims=dims) for A in ops]
+
+    def from_expect(self, expect):
+        """ The quantities from a list of expectation arrays in the order of
+        qutip_e_ops, e.g. a QuTiP result's expect. """
+
+        expect = np.array(expect, dtype=complex)
+        k = len(self.elements)
+        result = {}
+
+        if self.elements:
+            result['elements'] = expect[:k].T
+        if self.e_ops:
+            result['expect'] = expect[k:k + len(self.e_ops)].T
+        if self.trace:
+            result['trace'] = expect[-1]
+
+        return result
+
+def element_sum(rho, elements, mask=None):
+    """ The sum of chosen elements of a stack of density matrices.
+
+    Args:
+        rho: (N, n, n) array.
+        elements: list of (a, b) index pairs.
+        mask: optional (N, len(elements)) array of bools or weights
+            multiplying each element before summing.
+
+    Returns:
+        (N,) complex array.
+    """
+
+    rows, cols = np.array(list(elements), dtype=int).reshape((-1, 2)).T
+    values = np.asarray(rho)[:, rows, cols]
+
+    if mask is not None:
+        values = values*mask
+
+    return values.sum(axis=-1).astype(complex)
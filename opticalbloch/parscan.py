@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+""" A parallel executor for OBScan detuning scans.
+
+The detuning range is split into chunks which are farmed out to a process
+pool. Each worker is sent the (small) operator matrices once, in the pool
+initializer, and writes its results straight into a shared-memory array, so
+neither the OB object nor the results are pickled per point.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count, shared_memory
+
+import numpy as np
+import qutip as qu
+
+import liouville
+import metrics
+
+# State of a worker process, set once by _init_worker.
+_worker = {}
+
+def _init_worker(shm_name, shape, Delta_range, mode, ops):
+
+    _worker['shm'] = shared_memory.SharedMemory(name=shm_name)
+    _worker['out'] = np.ndarray(shape, dtype=complex,
+                                buffer=_worker['shm'].buf)
+    _worker['Delta_range'] = Delta_range
+    _worker['mode'] = mode
+
+    if mode == 'mesolve':
+        # Only build the Qobjs once per worker.
+        ops = dict(ops)
+        ops['H_fixed'] = qu.Qobj(ops['H_fixed'])
+        ops['dH_Delta'] = qu.Qobj(np.diag(ops['dH_Delta']))
+        ops['H_I_list'] = [[qu.Qobj(H_i[0]), H_i[1]] if ops['td']
+                           else qu.Qobj(H_i) for H_i in ops['H_I_list']]
+        ops['c_ops'] = [qu.Qobj(c) for c in ops['c_ops']]
+        ops['rho0'] = qu.Qobj(ops['rho0'])
+
+    _worker['ops'] = ops
+
+def _solve_chunk(start, stop):
+    """ Solves the points start:stop in a worker and writes them into the
+    shared output array. """
+
+    ops = _worker['ops']
+    out = _worker['out']
+
+    if _worker['Delta_range'] is not None:
+        Deltas = _worker['Delta_range'][start:stop]
+
+    if _worker['mode'] == 'steadystate':
+        out[start:stop] = liouville.steadystate_stack(ops['L'],
+                                                      ops['L_Delta'], Deltas)
+
+    elif _worker['mode'] == 'essolve':
+        n2 = ops['L'].shape[0]
+        L_s = np.empty((len(Deltas), n2, n2), dtype=complex)
+        L_s[:] = ops['L']
+        L_s[:, np.arange(n2), np.arange(n2)] += (Deltas[:, None]*
+                                                 ops['L_Delta'])
+        out[start:stop] = liouville.unvec(
+            liouville.evolve_eig(L_s, ops['rho0_vec'], ops['tlist']))
+
+    elif _worker['mode'] == 'grid':
+        step = liouville.chunk_length(out.shape[-1])
+        for i in range(start, stop, step):
+            j = min(i + step, stop)
+            L_s = ops['L'] + np.tensordot(ops['points'][i:j],
+                                          ops['L_params'], axes=1)
+            out[i:j] = liouville.steadystate_solve(L_s)
+
+    elif _worker['mode'] == 'mesolve':
+        for i, Delta in enumerate(Deltas):
+            H_Delta = ops['H_fixed'] + Delta*ops['dH_Delta']
+
+            if ops['td']:
+                H = [H_Delta]
+                H.extend(ops['H_I_list'])
+            else:
+                H = H_Delta
+                for H_i in ops['H_I_list']:
+                    H += H_i
+
+            result = qu.mesolve(H, ops['rho0'], ops['tlist'], ops['c_ops'],
+                                [], args=ops['args'], options=ops['opts'])
+
+            for t, state_t in enumerate(result.states):
+                # Without c_ops QuTiP may evolve the state vector.
+                if state_t.isket:
+                    state_t = qu.ket2dm(state_t)
+                out[start + i, t] = state_t.full()
+
+    return stop - start
+
+def scan(ob_obj, Deltas, Delta_range, Delta_idx=0, mode='steadystate',
+         tlist=None, rho0=None, td=False, args={}, opts=None, num_cpus=None,
+         chunk_size=None):
+    """ Solves the OB object at every point in Delta_range in a process pool.
+
+    Args:
+        ob_obj: the OB object to scan.
+        Deltas: list of detunings, as passed to set_H_Delta. The item at
+            Delta_idx is replaced by each point in Delta_range.
+        Delta_range: array of detunings to solve for.
+        Delta_idx: the index of the detuning to scan.
+        mode: 'steadystate', 'essolve' (the eigendecomposition propagator of
+            OB.propagate) or 'mesolve'.
+        tlist: The list of times for 'essolve' and 'mesolve'.
+        rho0: initial density matrix for 'essolve' and 'mesolve'. Default is
+            the ground state.
+        td: ('mesolve' only) is the interaction time-dependent?
+        args: ('mesolve' only) arguments for the time functions.
+        opts: ('mesolve' only) qu.Options for the solver.
+        num_cpus: number of worker processes. Default is all of them.
+        chunk_size: number of points per task. Default gives each worker
+            about four chunks.
+
+    Returns:
+        (len(Delta_range), n, n) array of steady states for 'steadystate',
+        or (len(Delta_range), len(tlist), n, n) for 'essolve' and 'mesolve'.
+    """
+
+    if mode not in ('steadystate', 'essolve', 'mesolve'):
+        raise ValueError('Unknown scan mode: ' + str(mode))
+
+    Delta_range = np.asarray(Delta_range, dtype=float)
+    N = len(Delta_range)
+    n = ob_obj.num_states
+
+    if rho0 is None:
+        rho0 = ob_obj.ground_state()*ob_obj.ground_state().dag()
+
+    H_Delta_0, dH_Delta = ob_obj.H_Delta_parts(Deltas, Delta_idx)
+
+    if mode == 'mesolve':
+        ops = {'H_fixed': (ob_obj.H_0 + H_Delta_0).full(),
+               'dH_Delta': dH_Delta,
+               'H_I_list': [[H_i[0].full(), H_i[1]] if td else H_i.full()
+                            for H_i in ob_obj.H_I_list()],
+               'c_ops': [c.full() for c in ob_obj.c_ops],
+               'rho0': liouville.to_dm(rho0), 'tlist': tlist, 'td': td,
+               'args': args, 'opts': opts}
+    else:
+        ops = {'L': ob_obj.liouvillian(H_Delta_0),
+               'L_Delta': liouville.commutator_diag(dH_Delta)}
+
+        if mode == 'essolve':
+            ops['rho0_vec'] = liouville.vec(liouville.to_dm(rho0))
+            ops['tlist'] = np.asarray(tlist, dtype=float)
+
+    if mode == 'steadystate':
+        shape = (N, n, n)
+    else:
+        shape = (N, len(tlist), n, n)
+
+    return run(shape, mode, ops, Delta_range=Delta_range,
+               num_cpus=num_cpus, chunk_size=chunk_size,
+               metrics=metrics.of(ob_obj))
+
+def run(shape, mode, ops, Delta_range=None, num_cpus=None, chunk_size=None,
+        metrics=metrics.NULL):
+    """ Runs the chunks of a scan in a process pool, with the output held
+    in shared memory. The first axis of shape is the one split into chunks.
+
+    Args:
+        shape: shape of the (complex) output array.
+        mode: 'steadystate', 'essolve', 'mesolve' or 'grid'.
+        ops: dict of the operators the workers need for mode.
+        Delta_range: the detunings, for the scan modes.
+        num_cpus: number of worker processes. Default is all of them.
+        chunk_size: number of points per task. Default gives each worker
+            about four chunks.
+        metrics: a metrics.Metrics to report the solve time, the number of
+            chunks solved and progress into.
+
+    Returns:
+        out: the output array, copied out of shared memory.
+    """
+
+    N = shape[0]
+
+    if num_cpus is None:
+        num_cpus = cpu_count()
+
+    if chunk_size is None:
+        chunk_size = max(1, -(-N//(4*num_cpus)))
+
+    shm = shared_memory.SharedMemory(create=True,
+                                     size=max(1, 16*int(np.prod(shape))))
+
+    try:
+        with ProcessPoolExecutor(max_workers=num_cpus,
+                                 initializer=_init_worker,
+                                 initargs=(shm.name, shape, Delta_range,
+                                           mode, ops)) as executor:
+
+            futures = [executor.submit(_solve_chunk, start,
+                                       min(start + chunk_size, N))
+                       for start in range(0, N, chunk_size)]
+
+            with metrics.phase('solve'):
+                done = 0
+                for f in futures:
+                    metrics.count('solver_calls')
+                    try:
+                        done += f.result() # Raises if a worker failed.
+                    except Exception as e:
+                        metrics.count('failures')
+                        metrics.event('failure', error=repr(e))
+                        raise
+                    metrics.progress(done, N, 'parscan.' + mode)
+
+        out = np.ndarray(shape, dtype=complex, buffer=shm.buf).copy()
+
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return out
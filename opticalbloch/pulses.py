@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+
+""" Parameterised pulse shapes for the time-dependent solvers.
+
+Each pulse takes its parameters at construction, so any number of pulses can
+be used together without one function (and one set of args keys) per pulse
+as in t_funcs. Pulses can be added and multiplied, by each other or by
+numbers, e.g.
+
+    coupling = pulses.RampOn(ampl=1., centre=2., width=1.)
+    probe = (pulses.Gaussian(ampl=.1, centre=5., fwhm=1.) +
+             pulses.Gaussian(ampl=.1, centre=10., fwhm=1.))
+
+A pulse can be used as a time function directly, pulse(t, args) with args
+ignored, or compiled to:
+
+    func()       a single vectorised NumPy callable for the whole expression
+    string()     a QuTiP string coefficient, compiled once by QuTiP
+    array(tlist) the pulse sampled on tlist, a QuTiP array coefficient
+
+Pulses also report their breakpoints (the times at which they switch on or
+off) and whether they are constant between two times, for solvers that step
+over piecewise-constant segments exactly.
+"""
+
+import numpy as np
+
+# Names the expressions may use. QuTiP's string coefficients know the same
+# functions, apart from sinc which Sinc writes out for them.
+_namespace = {'exp': np.exp, 'log': np.log, 'sqrt': np.sqrt, 'pi': np.pi,
+              'sin': np.sin, 'cos': np.cos, 'sinc': np.sinc,
+              'where': np.where}
+
+def _num(x):
+    """ A float as an exact literal for an expression. """
+
+    return repr(float(x))
+
+class Pulse(object):
+    """ Base class of the pulse shapes.
+
+    Subclasses set the parameters as attributes and implement expr, and
+    breakpoints and is_constant if the pulse has any flat parts.
+    """
+
+    def __repr__(self):
+
+        params = ', '.join('%s=%r' % (k, v) for k, v in
+                           sorted(vars(self).items())
+                           if not k.startswith('_'))
+        return '%s(%s)' % (type(self).__name__, params)
+
+    def __call__(self, t, args=None):
+        """ The pulse at time(s) t. The args parameter is ignored, and only
+        there so a pulse can be passed to qu.mesolve as a time function. """
+
+        return self.func()(t)
+
+    def __add__(self, other):
+
+        return Sum([self, _to_pulse(other)])
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+
+        return Product([self, _to_pulse(other)])
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+
+        return Product([Constant(-1.), self])
+
+    def __sub__(self, other):
+
+        return self + (-_to_pulse(other))
+
+    def __rsub__(self, other):
+
+        return _to_pulse(other) + (-self)
+
+    def expr(self, qutip=False):
+        """ The pulse as a string expression in t.
+
+        Args:
+            qutip: if True, only use functions known to QuTiP's string
+                coefficients.
+        """
+
+        raise NotImplementedError
+
+    def string(self):
+        """ The pulse as a QuTiP string coefficient. """
+
+        return self.expr(qutip=True)
+
+    def func(self):
+        """ The pulse compiled to one vectorised NumPy function of t, built
+        once and kept. """
+
+        try:
+            return self._func
+        except AttributeError:
+            self._func = eval('lambda t, args=None: (' + self.expr() +
+                              ')*np.ones_like(t, dtype=float)',
+                              dict(_namespace, np=np))
+            return self._func
+
+    def array(self, tlist):
+        """ The pulse sampled on tlist, as a QuTiP array coefficient (which
+        must be used with the same tlist). """
+
+        return self.func()(np.asarray(tlist, dtype=float))
+
+    def breakpoints(self):
+        """ Sorted list of the times at which the pulse is discontinuous or
+        switches between flat and varying. """
+
+        return []
+
+    def is_constant(self, t_0, t_1):
+        """ Is the pulse constant on the open interval (t_0, t_1)? """
+
+        return False
+
+class Constant(Pulse):
+    """ A constant amplitude. """
+
+    def __init__(self, ampl=1.):
+
+        self.ampl = ampl
+
+    def expr(self, qutip=False):
+
+        return _num(self.ampl)
+
+    def is_constant(self, t_0, t_1):
+
+        return True
+
+class Gaussian(Pulse):
+    """ A Gaussian pulse, ampl*exp(-4 ln 2 ((t - centre)/fwhm)²). """
+
+    def __init__(self, ampl, centre, fwhm):
+
+        self.ampl = ampl
+        self.centre = centre
+        self.fwhm = fwhm
+
+    def expr(self, qutip=False):
+
+        return '%s*exp(-4.*log(2.)*((t - %s)/%s)**2)' % (
+            _num(self.ampl), _num(self.centre), _num(self.fwhm))
+
+class Sech(Pulse):
+    """ A hyperbolic secant pulse, ampl*sech((t - centre)/width). """
+
+    def __init__(self, ampl, centre, width):
+
+        self.ampl = ampl
+        self.centre = centre
+        self.width = width
+
+    def expr(self, qutip=False):
+
+        x = '((t - %s)/%s)' % (_num(self.centre), _num(self.width))
+        return '%s*2./(exp(%s) + exp(-%s))' % (_num(self.ampl), x, x)
+
+class Square(Pulse):
+    """ A square pulse of amplitude ampl, on for on <= t <= off. """
+
+    def __init__(self, ampl, on, off):
+
+        self.ampl = ampl
+        self.on = on
+        self.off = off
+
+    def expr(self, qutip=False):
+
+        return '%s*(t >= %s)*(t <= %s)' % (_num(self.ampl), _num(self.on),
+                                           _num(self.off))
+
+    def breakpoints(self):
+
+        return [self.on, self.off]
+
+    def is_constant(self, t_0, t_1):
+
+        return not (t_0 < self.on < t_1 or t_0 < self.off < t_1)
+
+class RampOn(Pulse):
+    """ A half-Gaussian ramp up to ampl at centre, constant after. As
+    t_funcs.ramp_on_1, width is the FWHM of the full Gaussian over √2. """
+
+    def __init__(self, ampl, centre, width):
+
+        self.ampl = ampl
+        self.centre = centre
+        self.width = width
+
+    def expr(self, qutip=False):
+
+        c = _num(self.centre)
+        return ('%s*(exp(-2.*log(2.)*((t - %s)/%s)**2)*(t <= %s) + '
+                '(t > %s))' % (_num(self.ampl), c, _num(self.width), c, c))
+
+    def breakpoints(self):
+
+        return [self.centre]
+
+    def is_constant(self, t_0, t_1):
+
+        return t_0 >= self.centre
+
+class RampOff(Pulse):
+    """ Constant at ampl until centre, then a half-Gaussian ramp down. """
+
+    def __init__(self, ampl, centre, width):
+
+        self.ampl = ampl
+        self.centre = centre
+        self.width = width
+
+    def expr(self, qutip=False):
+
+        c = _num(self.centre)
+        return ('%s*(exp(-2.*log(2.)*((t - %s)/%s)**2)*(t >= %s) + '
+                '(t < %s))' % (_num(self.ampl), c, _num(self.width), c, c))
+
+    def breakpoints(self):
+
+        return [self.centre]
+
+    def is_constant(self, t_0, t_1):
+
+        return t_1 <= self.centre
+
+class RampOnOff(Pulse):
+    """ Ramps on to ampl at on, constant, then ramps off from off. """
+
+    def __init__(self, ampl, on, off, width):
+
+        self.ampl = ampl
+        self.on = on
+        self.off = off
+        self.width = width
+
+    def expr(self, qutip=False):
+
+        on = RampOn(1., self.on, self.width).expr(qutip)
+        off = RampOff(1., self.off, self.width).expr(qutip)
+        return '%s*(%s + %s - 1.)' % (_num(self.ampl), on, off)
+
+    def breakpoints(self):
+
+        return [self.on, self.off]
+
+    def is_constant(self, t_0, t_1):
+
+        return t_0 >= self.on and t_1 <= self.off
+
+class Sinc(Pulse):
+    """ A sinc pulse, ampl*sinc(width*(t - centre))/sqrt(pi/2), with the
+    normalised sinc(x) = sin(pi x)/(pi x) as t_funcs.sinc_1. """
+
+    def __init__(self, ampl, width, centre=0.):
+
+        self.ampl = ampl
+        self.width = width
+        self.centre = centre
+
+    def expr(self, qutip=False):
+
+        x = '(%s*(t - %s))' % (_num(self.width), _num(self.centre))
+
+        if qutip:
+            sinc = '(sin(pi*%s)/(pi*%s) if %s != 0. else 1.)' % (x, x, x)
+        else:
+            sinc = 'sinc(%s)' % x
+
+        return '%s*%s/sqrt(pi/2.)' % (_num(self.ampl), sinc)
+
+class _Combination(Pulse):
+    """ A combination of pulses, joined by the operator _op. """
+
+    _op = None
+
+    def __init__(self, pulses):
+
+        # Flatten nested combinations of the same kind.
+        self.pulses = []
+        for p in pulses:
+            if type(p) is type(self):
+                self.pulses.extend(p.pulses)
+            else:
+                self.pulses.append(p)
+
+    def expr(self, qutip=False):
+
+        return self._op.join('(' + p.expr(qutip) + ')' for p in self.pulses)
+
+    def breakpoints(self):
+
+        return sorted(set(b for p in self.pulses for b in p.breakpoints()))
+
+    def is_constant(self, t_0, t_1):
+
+        return all(p.is_constant(t_0, t_1) for p in self.pulses)
+
+class Sum(_Combination):
+    """ The sum of a list of pulses. """
+
+    _op = ' + '
+
+class Product(_Combination):
+    """ The product of a list of pulses. """
+
+    _op = '*'
+
+class TimeFunction(Pulse):
+    """ Wraps a time function f(t, args), e.g. from t_funcs, as a pulse.
+    It can't be compiled to a string and, having no known breakpoints, is
+    treated as varying everywhere. """
+
+    def __init__(self, f, args={}):
+
+        self.f = f
+        self.args = args
+
+    def __call__(self, t, args=None):
+
+        return self.f(t, self.args)
+
+    def func(self):
+
+        return self
+
+    def expr(self, qutip=False):
+
+        raise NotImplementedError('A TimeFunction has no expression.')
+
+def to_pulse(coeff, args={}):
+    """ Returns a pulse for a time-dependent coefficient: a Pulse, a number
+    or a time function f(t, args) as passed to qu.mesolve.
+
+    Raises:
+        ValueError: for QuTiP string or array coefficients.
+    """
+
+    if isinstance(coeff, Pulse):
+        return coeff
+    elif callable(coeff):
+        return TimeFunction(coeff, args)
+    elif np.isscalar(coeff) and not isinstance(coeff, str):
+        return Constant(coeff)
+
+    raise ValueError('Coefficient must be a Pulse, number or time function, '
+                     'not ' + repr(type(coeff)))
+
+def _to_pulse(x):
+
+    if isinstance(x, Pulse):
+        return x
+
+    return Constant(x)
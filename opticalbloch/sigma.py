@@ -5,6 +5,7 @@
 Thomas Ogden <t@ogden.eu>
 """
 
+import scipy.sparse as sp
 import qutip as qu
 
 def sigma(n, a, b):
@@ -54,9 +55,11 @@ def sigma_N(n, a, b, i, N):
         |a><b|_i
     """
     
-    # Make a list of identity matrices. Then we'll change the ith one to be our
-    # subsystem flip operator.
-    sigma_list = [qu.identity(n) for j in range(N)]  
-    sigma_list[i] = sigma(n, a, b)
-
-    return qu.tensor(sigma_list)
\ No newline at end of file
+    # The tensor product I ⊗ ... ⊗ |a><b| ⊗ ... ⊗ I, built directly as a sparse
+    # matrix: |a><b| on the ith subsystem between identities on the n**i
+    # subsystems before and n**(N-i-1) after.
+    flip = sp.coo_matrix(([1.], ([a], [b])), shape=(n, n))
+    sigma_sparse = sp.kron(sp.kron(sp.identity(n**i), flip),
+                           sp.identity(n**(N-i-1)), format='csr')
+
+    return qu.Qobj(sigma_sparse, dims=[[n]*N, [n]*N])
\ No newline at end of file
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+""" Streaming on-disk storage for scan results.
+
+A ScanStore is a directory holding:
+
+    rho.npy    the results, as a .npy file opened as a memmap
+    done.npy   a flag for each chunk of points that has been written
+    meta.json  the shape, chunk size and any metadata of the scan
+
+Results are written chunk by chunk as they are solved, so a large scan never
+has to be held in memory, and the in-memory view of the results is the
+memmap itself. A scan that is interrupted resumes from the chunks that were
+completed, as long as it is rerun with the same shape and metadata.
+"""
+
+import json
+import os
+
+import numpy as np
+
+class ScanStore(object):
+    """ A directory of memmapped scan results.
+
+    Attributes:
+        path: the directory.
+        rho: memmap of the results, shape grid_shape + point_shape.
+        done: memmap of a bool for each chunk, True once it is written.
+        chunk_size: number of points per chunk.
+        meta: dict of metadata, e.g. the scan's cache key and Delta_range.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+
+        self.rho = None
+        self.done = None
+        self.chunk_size = None
+        self.meta = None
+        self.num_points = 0
+        self.point_shape = ()
+
+    def __repr__(self):
+
+        return "<ScanStore :: %s>" % self.path
+
+    def prepare(self, num_points, point_shape, chunk_size, grid_shape=None,
+                meta={}):
+        """ Creates the store, or opens it to resume if it already holds a
+        scan with the same shape, chunk size and metadata.
+
+        Args:
+            num_points: number of points in the scan.
+            point_shape: shape of the result at each point, e.g. (n, n).
+            chunk_size: number of points written at once.
+            grid_shape: shape of the points, for N-D grids. Default is
+                (num_points,).
+            meta: dict of JSON-serialisable metadata identifying the scan.
+
+        Returns:
+            self
+
+        Raises:
+            ValueError: if the directory holds a different scan.
+        """
+
+        if grid_shape is None:
+            grid_shape = (num_points,)
+
+        shape = tuple(grid_shape) + tuple(point_shape)
+        num_chunks = -(-num_points//chunk_size)
+
+        info = {'shape': list(shape), 'num_points': num_points,
+                'chunk_size': chunk_size, 'meta': meta}
+        # Round trip so that tuples and lists compare equal.
+        info = json.loads(json.dumps(info))
+
+        meta_path = os.path.join(self.path, 'meta.json')
+        rho_path = os.path.join(self.path, 'rho.npy')
+        done_path = os.path.join(self.path, 'done.npy')
+
+        if os.path.isfile(meta_path):
+            with open(meta_path) as f:
+                if json.load(f) != info:
+                    raise ValueError(self.path + ' holds a different scan. '
+                                     'Delete it or choose a new path.')
+            mode = 'r+'
+        else:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            mode = 'w+'
+
+        self.rho = np.lib.format.open_memmap(rho_path, mode=mode,
+                                             dtype=complex, shape=shape)
+        self.done = np.lib.format.open_memmap(done_path, mode=mode,
+                                              dtype=bool,
+                                              shape=(num_chunks,))
+
+        if mode == 'w+':
+            # Written last, so a store is only resumable once it exists.
+            with open(meta_path, 'w') as f:
+                json.dump(info, f)
+
+        self.chunk_size = chunk_size
+        self.meta = meta
+        self.num_points = num_points
+        self.point_shape = tuple(point_shape)
+
+        return self
+
+    def flat(self):
+        """ View of rho with the points along one flat (C order) axis. """
+
+        return self.rho.reshape((self.num_points,) + self.point_shape)
+
+    def pending(self):
+        """ Returns a list of (start, stop) point ranges of chunks not yet
+        written. """
+
+        return [(i*self.chunk_size,
+                 min((i + 1)*self.chunk_size, self.num_points))
+                for i in np.flatnonzero(~self.done)]
+
+    def write(self, start, stop, data):
+        """ Writes the results for points start:stop and marks the chunk
+        done once they are flushed to disk. """
+
+        self.flat()[start:stop] = data
+        self.rho.flush()
+
+        self.done[start//self.chunk_size] = True
+        self.done.flush()
+
+    def complete(self):
+        """ Has every chunk been written? """
+
+        return bool(self.done.all())
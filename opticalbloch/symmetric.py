@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+
+""" N identical atoms in the permutation-invariant subspace.
+
+With sigma.sigma_N the state of N n-level atoms lives in a space of dimension
+n^N, so the Liouvillian is n^(2N) square. When every atom has the same
+Hamiltonian and decay, and the collective terms treat all atoms alike, a
+state that starts symmetric under exchange of atoms stays symmetric. Such a
+state is determined by how many atoms are in each of the n² single-atom
+operators |a><b|, so it lives in a space of dimension
+
+    C(N + n² - 1, n² - 1),
+
+e.g. 23426 for N = 50 two-level atoms in place of 2^100.
+
+Each basis element is labelled by the counts c[p] of atoms in each
+single-atom operator p = |a><b| (p = a*n + b, as in liouville.vec), and is the
+average over the distinct ways of assigning those operators to the atoms,
+so that a state
+
+    rho = sum_c y[c] B_c
+
+has Tr(rho) = sum of y[c] over the c with every atom in a diagonal |a><a|,
+and the product state of N atoms in |0> is y = (1, 0, ..., 0). A sum over
+atoms of a one-atom superoperator l, sum_k l^(k), maps B_c to
+
+    sum_{p, q} l[q, p] c[p] B_{c - e_p + e_q},
+
+which is a sparse matrix with at most n⁴ entries per column. Collective
+operators such as J = sum_k s^(k) are built from products of these.
+
+Because each B_c is an average over its M_c = N!/prod(c[p]!) assignments,
+the coefficients y[c] grow like these multinomial multiplicities, to about
+1e28 for N = 50 two-level atoms, and a solve in y loses most of its digits.
+The solvers work instead in u[c] = y[c]/M_c, the coefficient of a single
+assignment, which for the product state is prod(rho1[p]**c[p]) and so at
+most 1, with the Liouvillian scaled to D⁻¹ L D for D = diag(M).
+"""
+
+import itertools
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from scipy.special import gammaln
+import qutip as qu
+
+import liouville
+import metrics
+
+def symmetric_counts(n2, N):
+    """ The counts labelling the permutation-invariant basis: every way of
+    putting N atoms in n2 single-atom operators.
+
+    Args:
+        n2: number of single-atom operators, n² for n levels.
+        N: number of atoms.
+
+    Returns:
+        counts: (C(N + n2 - 1, n2 - 1), n2) int array. The first row has
+            every atom in operator 0.
+    """
+
+    combos = np.array(list(itertools.combinations_with_replacement(
+        range(n2), N)), dtype=int).reshape((-1, N))
+
+    return (combos[:, :, None] == np.arange(n2)).sum(axis=1)
+
+class SymmetricOB(object):
+    """ N identical atoms, each described by an OB object, with optional
+    collective decay and interactions, solved in the permutation-invariant
+    subspace.
+
+    The single-atom Hamiltonian (including H_Delta) and c_ops are those of
+    ob_obj, so its set_H_Delta and set_H_Omega change every atom.
+
+    Attributes:
+        ob_obj: the OB object of one atom.
+        N: number of atoms.
+        collective_c_ops: list of single-atom operators s, each giving the
+            collective decay D[J] with J = sum_k s^(k).
+        collective_H: list of (A, B) pairs of single-atom operators, each
+            adding (sum_k A^(k))(sum_l B^(l)) to the Hamiltonian, e.g.
+            (g*σ_10, σ_01) for an exchange interaction.
+        counts: (dim, n²) array of the counts labelling the basis.
+        y: the state in the basis after steadystate, (dim,), or evolve,
+            (len(tlist), dim).
+        rho: the reduced density matrix of one atom, as a Qobj, in the
+            steady state or at the last time of evolve.
+    """
+
+    def __init__(self, ob_obj, N, collective_c_ops=[], collective_H=[]):
+
+        self.ob_obj = ob_obj
+        self.N = N
+        self.collective_c_ops = list(collective_c_ops)
+        self.collective_H = list(collective_H)
+
+        n2 = ob_obj.num_states**2
+
+        if float(N + 1)**n2 >= 2.**62:
+            raise ValueError('Too many atoms or levels for the symmetric '
+                             'basis.')
+
+        self.counts = symmetric_counts(n2, N)
+
+        # Each count vector as a base-(N + 1) integer, to look up the index
+        # of the basis element an operator maps to.
+        self._radix = (N + 1)**np.arange(n2)
+        keys = self.counts.dot(self._radix)
+        self._order = np.argsort(keys)
+        self._keys = keys[self._order]
+
+        self._moves = {}
+        self._weights = {}
+        self._multiplicity = None
+
+        self.y = None
+        self.rho = None
+
+    def __repr__(self):
+
+        return "<SymmetricOB :: %d atoms, dimension %d>" % (self.N, self.dim)
+
+    @property
+    def dim(self):
+        """ The dimension of the permutation-invariant space. """
+
+        return len(self.counts)
+
+    def multiplicity(self):
+        """ M_c, the number of assignments of atoms to operators of each
+        basis element. """
+
+        if self._multiplicity is None:
+            log_multi = (gammaln(self.N + 1) -
+                         gammaln(self.counts + 1).sum(axis=1))
+            self._multiplicity = np.exp(log_multi)
+
+        return self._multiplicity
+
+    def scaled_liouvillian(self):
+        """ D⁻¹ L D, with D = diag(multiplicity()), the Liouvillian acting
+        on the coefficients u = y/M of single assignments.
+
+        Returns:
+            (dim, dim) CSR matrix.
+        """
+
+        M = self.multiplicity()
+
+        return (sp.diags(1./M).dot(self.liouvillian()).dot(sp.diags(M))
+                ).tocsr()
+
+    def index(self, counts):
+        """ The basis indices of an (..., n²) array of count vectors. """
+
+        keys = np.asarray(counts).dot(self._radix)
+        return self._order[np.searchsorted(self._keys, keys)]
+
+    def _move(self, p, q):
+        """ The columns with an atom in p, and the rows they go to when it
+        moves to q. Cached. """
+
+        if (p, q) not in self._moves:
+            cols = np.flatnonzero(self.counts[:, p])
+            if p == q:
+                rows = cols
+            else:
+                target = self.counts[cols].copy()
+                target[:, p] -= 1
+                target[:, q] += 1
+                rows = self.index(target)
+            self._moves[p, q] = (rows, cols)
+
+        return self._moves[p, q]
+
+    def one_body(self, l):
+        """ The sum over atoms of a one-atom superoperator in the symmetric
+        basis.
+
+        Args:
+            l: (n², n²) superoperator acting on vec of a one-atom operator,
+                e.g. from liouville.liouvillian.
+
+        Returns:
+            (dim, dim) CSR matrix of sum_k l^(k).
+        """
+
+        l = liouville.to_array(l)
+
+        rows, cols, data = [], [], []
+
+        for q, p in zip(*np.nonzero(l)):
+            r, c = self._move(p, q)
+            rows.append(r)
+            cols.append(c)
+            data.append(l[q, p]*self.counts[c, p])
+
+        if not data:
+            return sp.csr_matrix((self.dim, self.dim), dtype=complex)
+
+        return sp.csr_matrix((np.concatenate(data).astype(complex),
+                              (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(self.dim, self.dim))
+
+    def left(self, A):
+        """ sum_k A^(k) rho, as a (dim, dim) CSR matrix. """
+
+        A = liouville.to_array(A)
+        return self.one_body(np.kron(A, np.eye(A.shape[0])))
+
+    def right(self, A):
+        """ rho sum_k A^(k), as a (dim, dim) CSR matrix. """
+
+        A = liouville.to_array(A)
+        return self.one_body(np.kron(np.eye(A.shape[0]), A.T))
+
+    def liouvillian(self):
+        """ The Liouvillian in the symmetric basis: the single-atom
+        Liouvillian of ob_obj summed over atoms, plus the collective terms.
+
+        Returns:
+            (dim, dim) CSR matrix.
+        """
+
+        ob_obj = self.ob_obj
+
+        L = self.one_body(liouville.liouvillian(ob_obj.H_total(),
+                                                ob_obj.c_ops))
+
+        for s in self.collective_c_ops:
+            s = liouville.to_array(s)
+            s_dag = s.conj().T
+            L = L + (self.left(s).dot(self.right(s_dag)) -
+                     0.5*self.left(s_dag).dot(self.left(s)) -
+                     0.5*self.right(s).dot(self.right(s_dag)))
+
+        for A, B in self.collective_H:
+            L = L - 1.j*(self.left(A).dot(self.left(B)) -
+                         self.right(B).dot(self.right(A)))
+
+        return L.tocsr()
+
+    def trace_row(self):
+        """ The row vector t such that t.y = Tr(rho): 1 where every atom is
+        in a diagonal operator |a><a|. """
+
+        n = self.ob_obj.num_states
+        off = np.ones((n, n), dtype=bool)
+        np.fill_diagonal(off, False)
+
+        return (self.counts[:, off.ravel()].sum(axis=1) == 0).astype(complex)
+
+    def product_state(self, rho1=None):
+        """ The state with every atom in rho1.
+
+        Args:
+            rho1: the single-atom density matrix or state vector. Default is
+                the ground state of ob_obj.
+
+        Returns:
+            y: (dim,) array.
+        """
+
+        ob_obj = self.ob_obj
+
+        if rho1 is None:
+            rho1 = ob_obj.ground_state()
+
+        rho1 = liouville.vec(liouville.to_dm(rho1))
+
+        # The number of assignments of each basis element, times the product
+        # of the single-atom elements.
+        return self.multiplicity()*np.prod(rho1**self.counts, axis=1)
+
+    def _weights_1(self):
+
+        if 1 not in self._weights:
+            n = self.ob_obj.num_states
+            off = (1 - np.eye(n, dtype=int)).ravel()
+            num_off = self.counts.dot(off)
+            self._weights[1] = (self.counts*(num_off[:, None] == off)/
+                                float(self.N))
+
+        return self._weights[1]
+
+    def _weights_2(self):
+
+        if 2 not in self._weights:
+            n = self.ob_obj.num_states
+            n2 = n**2
+            N = self.N
+            off = (1 - np.eye(n, dtype=int)).ravel()
+            num_off = self.counts.dot(off)
+            C = self.counts
+            pairs = C[:, :, None]*(C[:, None, :] - np.eye(n2, dtype=int))
+            rest = num_off[:, None, None] == off[:, None] + off[None, :]
+            self._weights[2] = (pairs*rest/float(N*(N - 1))).reshape(
+                (-1, n2**2))
+
+        return self._weights[2]
+
+    def rho_1(self, y=None):
+        """ The reduced density matrix of one atom.
+
+        Args:
+            y: (..., dim) array of states. Default is self.y.
+
+        Returns:
+            (..., n, n) array.
+        """
+
+        if y is None:
+            y = self.y
+
+        return liouville.unvec(np.dot(y, self._weights_1()))
+
+    def rho_2(self, y=None):
+        """ The reduced density matrix of two atoms, in the space of
+        sigma.sigma_N(n, a, b, i, 2).
+
+        Args:
+            y: (..., dim) array of states. Default is self.y.
+
+        Returns:
+            (..., n², n²) array.
+        """
+
+        if y is None:
+            y = self.y
+
+        n = self.ob_obj.num_states
+
+        if self.N < 2:
+            raise ValueError('rho_2 needs at least two atoms.')
+
+        r = np.dot(y, self._weights_2()).reshape(np.shape(y)[:-1] +
+                                                 (n, n, n, n))
+
+        # [a1, b1, a2, b2] -> [a1, a2, b1, b2]
+        return r.swapaxes(-3, -2).reshape(np.shape(y)[:-1] + (n**2, n**2))
+
+    def expect(self, A, y=None):
+        """ The expectation of sum_k A^(k), for a single-atom operator A. """
+
+        A = liouville.to_array(A)
+
+        return self.N*np.einsum('ij,...ji->...', A, self.rho_1(y))
+
+    def expect_pair(self, A, B, y=None):
+        """ The expectation of (sum_k A^(k))(sum_l B^(l)), e.g. J+J- for the
+        collective emission rate. """
+
+        A = liouville.to_array(A)
+        B = liouville.to_array(B)
+
+        N = self.N
+        same = N*np.einsum('ij,...ji->...', A.dot(B), self.rho_1(y))
+
+        if N < 2:
+            return same
+
+        return same + N*(N - 1)*np.einsum('ij,...ji->...', np.kron(A, B),
+                                          self.rho_2(y))
+
+    def to_dm(self, y=None):
+        """ The full n^N density matrix of a state, in the space of
+        sigma.sigma_N. Only feasible for a few atoms; for checking.
+
+        Args:
+            y: (dim,) state. Default is self.y.
+
+        Returns:
+            (n^N, n^N) array.
+        """
+
+        if y is None:
+            y = self.y
+
+        n = self.ob_obj.num_states
+        N = self.N
+        n2 = n**2
+
+        coeffs = y/self.multiplicity()
+
+        assign = np.array(list(itertools.product(range(n2), repeat=N)))
+        counts = (assign[:, :, None] == np.arange(n2)).sum(axis=1)
+
+        place = n**np.arange(N - 1, -1, -1)
+
+        rho = np.zeros((n**N, n**N), dtype=complex)
+        np.add.at(rho, ((assign//n).dot(place), (assign % n).dot(place)),
+                  coeffs[self.index(counts)])
+
+        return rho
+
+    def steadystate(self):
+        """ Finds the steady state with a sparse direct solve for the
+        coefficients of single assignments, u = y/M (see the module
+        docstring), the first equation replaced by the trace condition
+        Tr(rho) = 1.
+
+        Unlike OB.steadystate, which returns the density matrix as a Qobj,
+        this returns the coefficients in the symmetric basis, as the full
+        density matrix is too large to form for more than a few atoms. The
+        reduced density matrix of one atom is kept as a Qobj in self.rho;
+        see also rho_1, rho_2 and to_dm.
+
+        Returns:
+            y: (dim,) array of the coefficients of the state in the
+                symmetric basis, also kept in self.y.
+        """
+
+        m = metrics.of(self.ob_obj)
+
+        with m.phase('liouvillian'):
+            L = self.scaled_liouvillian()
+
+        M = self.multiplicity()
+
+        # Tr(rho) = sum of trace_row M u; the row is scaled to a largest
+        # element of 1, like those of the scaled L.
+        t = self.trace_row()*M
+        scale = np.abs(t).max()
+
+        A = sp.vstack([sp.csr_matrix(t/scale), L[1:]], format='csc')
+
+        b = np.zeros(self.dim, dtype=complex)
+        b[0] = 1./scale
+
+        with m.solver():
+            self.y = M*spla.spsolve(A, b)
+
+        self.rho = qu.Qobj(self.rho_1())
+
+        return self.y
+
+    def evolve(self, tlist, rho0=None):
+        """ Evolves the state by the action of the sparse propagator
+        expm(L t) between consecutive times, on the coefficients of single
+        assignments u = y/M.
+
+        Args:
+            tlist: The list of times for which to find the state, starting
+                from rho0 at tlist[0].
+            rho0: (dim,) initial state, e.g. from product_state. Default is
+                every atom in the ground state.
+
+        Returns:
+            y: (len(tlist), dim) array of the coefficients of the state in
+                the symmetric basis at each time, also kept in self.y. The
+                reduced density matrix of one atom at the last time is kept
+                in self.rho.
+        """
+
+        m = metrics.of(self.ob_obj)
+
+        if rho0 is None:
+            rho0 = self.product_state()
+
+        with m.phase('liouvillian'):
+            L = self.scaled_liouvillian().tocsc()
+
+        M = self.multiplicity()
+
+        tlist = np.asarray(tlist, dtype=float)
+        u = np.empty((len(tlist), self.dim), dtype=complex)
+
+        u_t = np.asarray(rho0, dtype=complex)/M
+        t_prev = tlist[0]
+
+        with m.solver():
+            for i, t in enumerate(tlist):
+                if t != t_prev:
+                    u_t = spla.expm_multiply(L*(t - t_prev), u_t)
+                    t_prev = t
+                u[i] = u_t
+
+        y = M*u
+        self.y = y
+        self.rho = qu.Qobj(self.rho_1(y[-1]))
+
+        return self.y
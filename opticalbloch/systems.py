@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+""" Example OB systems, used by the benchmarks and the tests.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import numpy as np
+
+import ob
+import sigma
+
+class OBLadder(ob.OB):
+    """ An n-level ladder with one detuning and Rabi frequency per step and
+    decay down each step. """
+
+    def __init__(self, num_states, gamma=1., Omega=1.):
+
+        self.num_states = num_states
+        self.set_H_0()
+        self.c_ops = [np.sqrt(gamma)*self.sigma(i, i + 1)
+                      for i in range(num_states - 1)]
+
+        self.set_H_Delta([0.]*(num_states - 1))
+        self.set_H_Omega([Omega]*(num_states - 1))
+
+    def set_H_Delta(self, Deltas):
+
+        self.H_Delta = -sum(sum(Deltas[:i])*self.sigma(i, i)
+                            for i in range(1, self.num_states))
+
+    def set_H_Omega(self, Omegas):
+
+        self.H_Omega_list = [Omegas[i]/2.*(self.sigma(i, i + 1) +
+                                           self.sigma(i + 1, i))
+                             for i in range(self.num_states - 1)]
+
+class OBAtoms(ob.OB):
+    """ N driven two-level atoms built with sigma_N, n^N = 2^N states. """
+
+    def __init__(self, N, gamma=1., Omega=1.):
+
+        self.num_states = 2**N
+        self.c_ops = [np.sqrt(gamma)*sigma.sigma_N(2, 0, 1, i, N)
+                      for i in range(N)]
+
+        self.H_0 = 0*sigma.sigma_N(2, 0, 0, 0, N)
+        self.H_Delta = sum(-.5*sigma.sigma_N(2, 1, 1, i, N)
+                           for i in range(N))
+        self.H_Omega_list = [Omega/2.*(sigma.sigma_N(2, 0, 1, i, N) +
+                                       sigma.sigma_N(2, 1, 0, i, N))
+                             for i in range(N)]
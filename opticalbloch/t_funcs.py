@@ -9,6 +9,11 @@ time-dependent parts to the Hamiltonian. (Say one laser is ramped on then CW
     multiple versions. Yes this is wasteful, I would like a better way to do
     it but this works.
 
+The pulses module is that better way: its pulse shapes take their parameters
+at construction, so need no numbered versions, and compile to vectorised
+NumPy functions or QuTiP string and array coefficients. These functions are
+kept for existing code.
+
 Thomas Ogden <t@ogden.eu>
 """
 
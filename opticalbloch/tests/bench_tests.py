@@ -0,0 +1,61 @@
+"""Unit tests for the bench module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import bench
+
+class TestBench(unittest.TestCase):
+    """ Tests for running, saving and comparing benchmarks. """
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run_save_load(self):
+        """ Test a case runs and its results round trip through JSON. """
+
+        results = bench.run(['three_level_propagate'], repeat=1)
+        path = os.path.join(self.tmp_dir, 'results.json')
+        bench.save(results, path)
+
+        self.assertEqual(bench.load(path), results)
+        self.assertGreater(results['results']['three_level_propagate']
+                           ['best'], 0.)
+
+    def test_compare(self):
+        """ Test only cases slower than the tolerance are regressions. """
+
+        baseline = {'results': {'a': {'best': 1.}, 'b': {'best': 1.},
+                                'c': {'best': 1.}}}
+        results = {'results': {'a': {'best': 1.2}, 'b': {'best': 2.},
+                               'd': {'best': 5.}}}
+
+        ratios, regressions = bench.compare(results, baseline,
+                                            tolerance=1.5)
+
+        self.assertEqual(sorted(ratios), ['a', 'b'])
+        self.assertEqual(regressions, ['b'])
+
+    def test_baseline_covers_cases(self):
+        """ Test the saved baseline has a result for every case. """
+
+        baseline = bench.load(bench.BASELINE_PATH)
+
+        self.assertEqual(sorted(baseline['results']), sorted(bench.CASES))
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
@@ -0,0 +1,127 @@
+"""Unit tests for the cache module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+import numpy as np
+import qutip as qu
+import cache
+import ob_scan
+from ob_systems import OBTwo
+
+class TestHashKey(unittest.TestCase):
+    """ Tests for cache.hash_key. """
+
+    def test_same_content_same_key(self):
+        """ Test equal Qobjs, arrays and dicts give the same key. """
+
+        key_1 = cache.hash_key(qu.sigmax(), np.arange(3.), {'a': 1, 'b': 2})
+        key_2 = cache.hash_key(qu.sigmax(), np.arange(3.), {'b': 2, 'a': 1})
+
+        self.assertEqual(key_1, key_2)
+
+    def test_changed_content_new_key(self):
+        """ Test a changed Qobj element gives a different key. """
+
+        self.assertNotEqual(cache.hash_key(qu.sigmax()),
+                            cache.hash_key(2*qu.sigmax()))
+
+    def test_lambda_key(self):
+        """ Test equal lambdas give the same key and different ones don't. """
+
+        f_1 = lambda t, args: t*args['a']
+        f_2 = lambda t, args: t*args['a']
+        f_3 = lambda t, args: t*args['b']
+
+        self.assertEqual(cache.hash_key(f_1), cache.hash_key(f_2))
+        self.assertNotEqual(cache.hash_key(f_1), cache.hash_key(f_3))
+
+    def test_closure_key(self):
+        """ Test closures differing only in a captured value or a default
+        give different keys. """
+
+        def make(a):
+            return lambda t, args: a*t
+
+        def make_default(a):
+            return lambda t, args, a=a: a*t
+
+        self.assertEqual(cache.hash_key(make(1.)), cache.hash_key(make(1.)))
+        self.assertNotEqual(cache.hash_key(make(1.)), cache.hash_key(make(2.)))
+        self.assertNotEqual(cache.hash_key(make_default(1.)),
+                            cache.hash_key(make_default(2.)))
+
+    def test_undeterministic_raises(self):
+        """ Test a callable that can't be hashed by content raises. """
+
+        self.assertRaises(ValueError, cache.hash_key, [].append)
+        self.assertRaises(ValueError, cache.hash_key, object())
+
+class TestResultCache(unittest.TestCase):
+    """ Tests for cache.ResultCache. """
+
+    def setUp(self):
+
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.cache_dir)
+
+    def test_put_get(self):
+        """ Test a stored result is returned and a missing key is None. """
+
+        result_cache = cache.ResultCache(self.cache_dir)
+        result_cache.put('abc', [1, 2, 3])
+
+        self.assertEqual(result_cache.get('abc'), [1, 2, 3])
+        self.assertIsNone(result_cache.get('def'))
+        self.assertEqual((result_cache.hits, result_cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        """ Test the least recently used result is evicted first. """
+
+        result_cache = cache.ResultCache(self.cache_dir, max_bytes=3*2**19)
+        data = np.zeros(2**16) # 512 kB pickled
+
+        result_cache.put('a', data)
+        time.sleep(0.01)
+        result_cache.put('b', data)
+        time.sleep(0.01)
+        result_cache.get('a')
+        time.sleep(0.01)
+        result_cache.put('c', data)
+
+        self.assertTrue(os.path.isfile(result_cache.path('a')))
+        self.assertFalse(os.path.isfile(result_cache.path('b')))
+        self.assertTrue(os.path.isfile(result_cache.path('c')))
+
+    def test_scan_steadystate_hit(self):
+        """ Test a repeated scan is a hit and changed physics is a miss. """
+
+        result_cache = cache.ResultCache(self.cache_dir)
+
+        two_obj = OBTwo(gamma=1.)
+        two_obj.set_H_Omega([1.])
+        scan = ob_scan.OBScan(two_obj, np.linspace(-1., 1., 3))
+
+        scan.steadystate(Deltas=[None], cache=result_cache)
+        scan.steadystate(Deltas=[None], cache=result_cache)
+        self.assertEqual(result_cache.hits, 1)
+
+        two_obj.set_H_Omega([2.])
+        scan.steadystate(Deltas=[None], cache=result_cache)
+        self.assertEqual(result_cache.hits, 1)
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
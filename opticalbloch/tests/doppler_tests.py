@@ -0,0 +1,144 @@
+"""Unit tests for the doppler module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import doppler
+import macro
+import ob_scan
+from ob_systems import OBTwo
+
+class TestGaussHermite(unittest.TestCase):
+    """ Tests for doppler.gauss_hermite. """
+
+    def test_moments(self):
+        """ Test the weights are normalised and give the second moment of the
+        Maxwell-Boltzmann distribution, width²/2. """
+
+        v, weights = doppler.gauss_hermite(width=3., num_classes=9)
+
+        self.assertAlmostEqual(weights.sum(), 1.)
+        self.assertAlmostEqual(np.dot(weights, v**2), 4.5)
+
+class TestDopplerScan(unittest.TestCase):
+    """ Tests for doppler.DopplerScan. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Omega([.5])
+
+        self.Delta_range = np.linspace(-10., 10., 41)
+
+        # Explicit classes, to test the batching against the same classes.
+        v, weights = doppler.gauss_hermite(width=5., num_classes=15)
+        self.d_scan = doppler.DopplerScan(self.two_obj, self.Delta_range,
+                                          k=[.8], v=v, weights=weights)
+
+    def brute_force(self, tlist=None):
+        """ One OBScan per velocity class, summed by hand. """
+
+        rho = 0.
+        for v, w in zip(self.d_scan.v, self.d_scan.weights):
+            scan = ob_scan.OBScan(self.two_obj, self.Delta_range - .8*v)
+            if tlist is None:
+                rho = rho + w*scan.steadystate_batch(Deltas=[None])
+            else:
+                rho = rho + w*scan.propagate(Deltas=[None], tlist=tlist)
+        return rho
+
+    def test_steadystate_matches_brute_force(self):
+        """ Test the batched average against one scan per velocity class. """
+
+        rho_Delta = self.d_scan.steadystate(Deltas=[None], chunk_size=100)
+
+        np.testing.assert_allclose(rho_Delta, self.brute_force(), atol=1e-12)
+        self.assertEqual(self.d_scan.rho_v.shape, (15, 41, 2, 2))
+
+    def test_propagate_matches_brute_force(self):
+        """ Test the transient average against one scan per class. """
+
+        tlist = np.linspace(0., 4., 9)
+        states = self.d_scan.propagate(Deltas=[None], tlist=tlist)
+
+        np.testing.assert_allclose(states, self.brute_force(tlist),
+                                   atol=1e-10)
+
+    def test_broadening_and_susceptibility(self):
+        """ Test the averaged line is broadened and χ is built from the
+        averaged coherence. """
+
+        rho_Delta = self.d_scan.steadystate(Deltas=[None])
+
+        scan = ob_scan.OBScan(self.two_obj, self.Delta_range)
+        rho_0 = scan.steadystate_batch(Deltas=[None])
+
+        self.assertLess(rho_Delta[20, 1, 1].real, rho_0[20, 1, 1].real)
+        self.assertGreater(rho_Delta[30, 1, 1].real, rho_0[30, 1, 1].real)
+
+        chi = self.d_scan.susceptibility(tdme=1., E=1., N=1e16)
+        np.testing.assert_allclose(chi, macro.calc_susceptibility(
+            1., 1., 1e16, rho_Delta[:, 0, 1]))
+
+class TestThermalVapour(unittest.TestCase):
+    """ Tests of the Doppler average for a Doppler width much larger than
+    the natural width, as in a thermal vapour. """
+
+    def setUp(self):
+
+        # k u/Γ = 50, as for Rb at room temperature.
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Omega([.5])
+
+        self.k, self.width = 1., 50.
+        self.Delta_range = np.array([-60., -5., 0., .3, 2.])
+
+    def reference(self):
+        """ The average on a velocity grid far finer than the line. """
+
+        v = np.linspace(-5*self.width, 5*self.width, 100001)
+        weights = macro.maxwell_boltzmann(v, self.width)
+        weights /= weights.sum()
+
+        rho = []
+        for Delta in self.Delta_range:
+            scan = ob_scan.OBScan(self.two_obj, Delta - self.k*v)
+            rho.append(np.tensordot(weights,
+                                    scan.steadystate_batch(Deltas=[None]),
+                                    axes=1))
+        return np.array(rho)
+
+    def test_default_classes_converged(self):
+        """ Test the default velocity classes against the fine reference.
+        """
+
+        d_scan = doppler.DopplerScan(self.two_obj, self.Delta_range,
+                                     k=[self.k], width=self.width)
+        rho_Delta = d_scan.steadystate(Deltas=[None])
+
+        rho_ref = self.reference()
+        np.testing.assert_allclose(rho_Delta[:, 0, 1].imag,
+                                   rho_ref[:, 0, 1].imag, rtol=1e-4)
+        np.testing.assert_allclose(rho_Delta[:, 1, 1].real,
+                                   rho_ref[:, 1, 1].real, rtol=1e-4)
+
+    def test_gauss_hermite_warns(self):
+        """ Test Gauss-Hermite classes too far apart to resolve the line
+        give a warning. """
+
+        d_scan = doppler.DopplerScan(self.two_obj, self.Delta_range,
+                                     k=[self.k], width=self.width,
+                                     num_classes=31)
+
+        with self.assertWarns(UserWarning):
+            d_scan.steadystate(Deltas=[None])
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
@@ -0,0 +1,99 @@
+"""Unit tests for the fit module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import fit
+import macro
+import ob_scan
+from ob_systems import OBTwo, pop_1_analytic
+
+def set_params(ob_obj, params):
+
+    ob_obj.set_H_Omega([params['Omega']])
+    ob_obj.c_ops = [np.sqrt(params['Gamma'])*ob_obj.sigma(0, 1)]
+
+class TestSpectrumFit(unittest.TestCase):
+    """ Tests for fit.SpectrumFit. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.scan = ob_scan.OBScan(self.two_obj, np.linspace(-10., 10., 81))
+
+        self.true = {'Omega': 1.2, 'Gamma': 2., 'Delta_offset': .7,
+                     'depth': 3.}
+
+        # The upper population, scaled by a depth only observe depends on.
+        self.observe = lambda rho, p: p['depth']*rho[:, 1, 1].real
+
+        self.data = self.true['depth']*pop_1_analytic(
+            self.scan.Delta_range + self.true['Delta_offset'],
+            self.true['Omega'], self.true['Gamma'])
+
+    def test_jacobian(self):
+        """ Test the Jacobian against finite differences of whole scans. """
+
+        sf = fit.SpectrumFit(self.scan, [None], self.data, self.true,
+                             set_params, self.observe)
+        y, J = sf.model(self.true, jacobian=True, chunk_size=30)
+
+        np.testing.assert_allclose(y, self.data, atol=1e-12)
+
+        for i, name in enumerate(sf.names):
+            h = 1e-5
+            p_plus, p_minus = dict(self.true), dict(self.true)
+            p_plus[name] += h
+            p_minus[name] -= h
+            J_fd = (sf.model(p_plus) - sf.model(p_minus))/(2.*h)
+            np.testing.assert_allclose(J[:, i], J_fd, atol=1e-7)
+
+    def test_fit(self):
+        """ Test the fit recovers the parameters from a poor start. """
+
+        # The depth can't be told apart from Omega in a Lorentzian.
+        start = {'Omega': .8, 'Gamma': 1.2, 'Delta_offset': 0.,
+                 'depth': self.true['depth']}
+
+        sf = fit.SpectrumFit(self.scan, [None], self.data, start,
+                             set_params, self.observe, fixed=['depth'])
+        params = sf.fit()
+
+        for name in self.true:
+            self.assertAlmostEqual(params[name], self.true[name], places=5)
+
+        self.assertLess(sf.num_iterations, 50)
+        self.assertEqual(sf.covariance.shape, (3, 3))
+
+    def test_fit_temperature(self):
+        """ Test fitting a temperature through macro.calc_spectrum. """
+
+        k = macro.calc_wavenumber(2*np.pi*384e6)
+        E = macro.calc_electric_field_ampl(.1, 1.)
+
+        def observe(rho, p):
+            return macro.calc_spectrum(rho, k, 1., E, p['T'], .001)[2]
+
+        true = {'Omega': .1, 'Gamma': 6., 'T': 310.}
+        self.scan.Delta_range = np.linspace(-30., 30., 61)
+
+        set_params(self.two_obj, true)
+        data = observe(self.scan.steadystate_batch(Deltas=[None]), true)
+
+        sf = fit.SpectrumFit(self.scan, [None], data,
+                             {'Omega': .1, 'Gamma': 4., 'T': 300.},
+                             set_params, observe, fixed=['Omega'])
+        params = sf.fit()
+
+        self.assertAlmostEqual(params['T'], 310., places=3)
+        self.assertAlmostEqual(params['Gamma'], 6., places=5)
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
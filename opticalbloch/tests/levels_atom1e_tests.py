@@ -0,0 +1,81 @@
+"""Unit tests for the levels_atom1e module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import ang_mom
+import levels_atom1e
+
+def rb87_d_lines():
+    """ Rb87 with the 5S and 5P levels, with arbitrary energies. """
+
+    rb87 = levels_atom1e.Atom1e('Rb', 87, I=1.5, S=.5)
+
+    level_5S = levels_atom1e.LevelNL(5, 0, 0.)
+    level_5S.build_J_levels(.5, 1.5, [0.], [[0., 1.]], None)
+    rb87.add_nL_level(level_5S)
+
+    level_5P = levels_atom1e.LevelNL(5, 1, 10.)
+    level_5P.build_J_levels(.5, 1.5, [10., 11.],
+                            [[10., 11.], [11., 12., 13., 14.]], None)
+    rb87.add_nL_level(level_5P)
+
+    return rb87
+
+class TestMFIndex(unittest.TestCase):
+    """ Tests for Atom1e.get_mF_index. """
+
+    def test_index_matches_list(self):
+        """ Test the index has the same levels in the same order. """
+
+        rb87 = rb87_d_lines()
+        index = rb87.get_mF_index()
+        mF_list = rb87.get_mF_list()
+
+        self.assertEqual(len(index), 8 + 24)
+        for field in ('n', 'L', 'J', 'F', 'mF', 'energy'):
+            np.testing.assert_array_equal(index[field],
+                                          [m[field] for m in mF_list])
+
+    def test_levels_built_after_adding(self):
+        """ Test the index picks up sublevels built after an nL level was
+        added. """
+
+        rb87 = levels_atom1e.Atom1e('Rb', 87, I=1.5, S=.5)
+        level_5S = levels_atom1e.LevelNL(5, 0, 0.)
+        rb87.add_nL_level(level_5S)
+        self.assertEqual(rb87.get_num_mF_levels(), 0)
+
+        level_5S.build_J_levels(.5, 1.5, [0.], [[0., 1.]], None)
+        self.assertEqual(rb87.get_num_mF_levels(), 8)
+
+class TestDipoleTensor(unittest.TestCase):
+    """ Tests for Atom1e.get_dipole_tensor. """
+
+    def test_matches_calc_clebsch_hf(self):
+        """ Test every element against the scalar calc_clebsch_hf. """
+
+        rb87 = rb87_d_lines()
+        d = rb87.get_dipole_tensor(0, 1)
+        mF_list = rb87.get_mF_list()
+
+        for q, d_q in zip((-1, 0, 1), d):
+            d_q = d_q.toarray()
+            for i, a in enumerate(mF_list[:8]):
+                for j, b in enumerate(mF_list[8:], 8):
+                    self.assertAlmostEqual(d_q[i,j],
+                        ang_mom.calc_clebsch_hf(a['J'], 1.5, a['F'], a['mF'],
+                                                b['J'], 1.5, b['F'], b['mF'],
+                                                q))
+
+        self.assertIs(rb87.get_dipole_tensor(0, 1), d)
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
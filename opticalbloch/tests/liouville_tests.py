@@ -0,0 +1,221 @@
+"""Unit tests for the liouville module and the batched OBScan solvers.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import qutip as qu
+import liouville
+import ob_scan
+import sigma
+from ob_systems import OBTwo, OBTwoN, pop_1_analytic
+
+class TestLiouvillian(unittest.TestCase):
+    """ Tests for liouville.liouvillian. """
+
+    def test_liouvillian_matches_qutip(self):
+        """ Test the action on rho against qutip's liouvillian. """
+
+        two_obj = OBTwo(gamma=1.)
+        two_obj.set_H_Delta([.3])
+        two_obj.set_H_Omega([.7])
+
+        H = two_obj.H_0 + two_obj.H_Delta + two_obj.H_I_sum()
+        rho = qu.rand_dm(2)
+
+        L_qu = qu.liouvillian(H, two_obj.c_ops)
+        drho_qu = qu.vector_to_operator(L_qu*qu.operator_to_vector(rho))
+
+        L = liouville.liouvillian(H, two_obj.c_ops)
+        drho = liouville.unvec(L.dot(liouville.vec(rho.full())))
+
+        np.testing.assert_allclose(drho, drho_qu.full(), atol=1e-12)
+
+class TestSparse(unittest.TestCase):
+    """ Tests for the sparse Liouvillian and iterative steady state. """
+
+    def setUp(self):
+
+        self.N_obj = OBTwoN(N=3, gamma=1., Omega=1.3, Delta=.4)
+        self.H = (self.N_obj.H_0 + self.N_obj.H_Delta +
+                  self.N_obj.H_I_sum())
+
+    def test_liouvillian_sparse_matches_dense(self):
+        """ Test the sparse Liouvillian equals the dense one. """
+
+        L_sp = liouville.liouvillian_sparse(self.H, self.N_obj.c_ops)
+        L = liouville.liouvillian(self.H, self.N_obj.c_ops)
+
+        np.testing.assert_allclose(L_sp.toarray(), L, atol=1e-14)
+
+    def test_iterative_matches_direct(self):
+        """ Test GMRES and BiCGSTAB against the dense solve, and the single
+        atom populations against the analytic lineshape. """
+
+        L = liouville.liouvillian(self.H, self.N_obj.c_ops)
+        rho_direct = liouville.steadystate_solve(L[np.newaxis])[0]
+
+        for method in ('gmres', 'bicgstab'):
+            rho = self.N_obj.steadystate(method=method).full()
+            np.testing.assert_allclose(rho, rho_direct, atol=1e-9)
+
+        # Excited population of atom 0, the atoms being independent.
+        pop_1 = (self.N_obj.rho*sigma.sigma_N(2, 1, 1, 0, 3)).tr().real
+        self.assertAlmostEqual(pop_1, pop_1_analytic(.4, 1.3, 1.), places=9)
+
+class TestSteadystateBatch(unittest.TestCase):
+    """ Tests for OBScan.steadystate_batch. """
+
+    def test_two_level_analytic(self):
+        """ Test the excited population against the analytic lineshape. """
+
+        Omega, Gamma = 1.3, 1.
+        Delta_range = np.linspace(-5., 5., 101)
+
+        two_obj = OBTwo(gamma=Gamma)
+        two_obj.set_H_Delta([0.])
+        two_obj.set_H_Omega([Omega])
+
+        scan = ob_scan.OBScan(two_obj, Delta_range)
+        rho_Delta = scan.steadystate_batch(Deltas=[None], chunk_size=7)
+
+        np.testing.assert_allclose(rho_Delta[:,1,1].real,
+                                   pop_1_analytic(Delta_range, Omega, Gamma),
+                                   atol=1e-12)
+        np.testing.assert_allclose(np.trace(rho_Delta, axis1=1, axis2=2), 1.)
+
+    def test_H_Delta_restored(self):
+        """ Test the OB object's detuning term is left unchanged. """
+
+        two_obj = OBTwo(gamma=1.)
+        two_obj.set_H_Delta([.5])
+        two_obj.set_H_Omega([1.])
+        H_Delta = two_obj.H_Delta
+
+        scan = ob_scan.OBScan(two_obj, np.linspace(-1., 1., 3))
+        scan.steadystate_batch(Deltas=[None])
+
+        self.assertEqual(two_obj.H_Delta, H_Delta)
+
+class TestPropagate(unittest.TestCase):
+    """ Tests for OB.propagate and OBScan.propagate. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Delta([.4])
+        self.two_obj.set_H_Omega([2.])
+        self.tlist = np.linspace(0., 5., 21)
+
+    def test_propagate_matches_essolve(self):
+        """ Test the eigendecomposition against qutip's ode2es. """
+
+        result = self.two_obj.essolve(self.tlist)
+        states_es = np.array([s.full() for s in result.states])
+
+        states = self.two_obj.propagate(self.tlist)
+
+        np.testing.assert_allclose(states, states_es, atol=1e-10)
+
+    def test_defective_falls_back_to_expm(self):
+        """ Test a defective Liouvillian gives the matrix exponential. """
+
+        L = np.array([[0., 1.], [0., 0.]])
+        rho_t = liouville.evolve_eig(L, np.array([0., 1.]), [0., 1., 2.])
+
+        np.testing.assert_allclose(rho_t, [[0., 1.], [1., 1.], [2., 1.]])
+
+    def test_scan_propagate_matches_single(self):
+        """ Test the stacked scan against one OB.propagate per point. """
+
+        Delta_range = np.linspace(-2., 2., 5)
+        scan = ob_scan.OBScan(self.two_obj, Delta_range)
+        states = scan.propagate([None], self.tlist, chunk_size=2)
+
+        for i, Delta in enumerate(Delta_range):
+            self.two_obj.set_H_Delta([Delta])
+            np.testing.assert_allclose(states[i],
+                                       self.two_obj.propagate(self.tlist),
+                                       atol=1e-10)
+
+        np.testing.assert_allclose(scan.get_rho_Delta(), states[:, -1])
+
+class TestSolver(unittest.TestCase):
+    """ Tests for liouville.Solver and OB.solver. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Delta([.4])
+        self.two_obj.set_H_Omega([2.])
+        self.tlist = np.linspace(0., 5., 21)
+
+        rho0 = np.random.rand(6, 2, 2) + 1.j*np.random.rand(6, 2, 2)
+        rho0 = np.matmul(rho0, rho0.conj().swapaxes(-1, -2))
+        self.rho0 = rho0/np.trace(rho0, axis1=1, axis2=2)[:, None, None]
+
+    def test_steadystate_and_solve(self):
+        """ Test the steady state and a stack of solves. """
+
+        solver = self.two_obj.solver()
+
+        np.testing.assert_allclose(solver.steadystate(),
+                                   self.two_obj.steadystate(method='dense')
+                                   .full(), atol=1e-12)
+
+        b = np.random.rand(5, 4)
+        A = solver.L.copy()
+        A[0] = liouville.trace_row(2)
+        np.testing.assert_allclose(solver.solve(b),
+                                   np.linalg.solve(A, b.T).T, atol=1e-12)
+
+    def test_evolve_stack(self):
+        """ Test a stack of initial states against one propagate each. """
+
+        solver = self.two_obj.solver()
+        states = solver.evolve(self.rho0, self.tlist)
+
+        self.assertEqual(states.shape, (6, 21, 2, 2))
+        for rho0, states_i in zip(self.rho0, states):
+            np.testing.assert_allclose(
+                states_i, self.two_obj.propagate(self.tlist, rho0),
+                atol=1e-10)
+
+    def test_evolve_defective(self):
+        """ Test a defective Liouvillian falls back to the matrix
+        exponential. """
+
+        solver = liouville.Solver(np.diag(np.ones(3), 1))
+        self.assertIsNone(solver.eig())
+
+        states = solver.evolve(self.rho0[:2], self.tlist)
+        for rho0, states_i in zip(self.rho0, states):
+            rho_t = liouville.evolve_expm(solver.L, liouville.vec(rho0),
+                                          self.tlist)
+            np.testing.assert_allclose(states_i, liouville.unvec(rho_t),
+                                       atol=1e-10)
+
+        self.assertRaises(ValueError, solver.resolvent, [1.j], np.ones(4))
+
+    def test_resolvent(self):
+        """ Test the resolvent against direct solves. """
+
+        solver = self.two_obj.solver()
+        z = -1.j*np.array([.5, 1., 2.])
+        b = np.random.rand(3, 4)
+
+        X = solver.resolvent(z, b)
+
+        for z_i, X_i in zip(z, X):
+            np.testing.assert_allclose(
+                X_i, np.linalg.solve(solver.L - z_i*np.eye(4), b.T).T,
+                atol=1e-12)
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
@@ -0,0 +1,79 @@
+"""Unit tests for the macro module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import macro
+import ob_scan
+from ob_systems import OBTwo
+
+class TestCalcNRb(unittest.TestCase):
+    """ Tests for macro.calc_N_Rb. """
+
+    def test_array_matches_scalar(self):
+        """ Test an array of temperatures either side of the melting point
+        against one call per temperature. """
+
+        T = np.array([[290., 312.], [313., 400.]])
+        N = macro.calc_N_Rb(T)
+
+        self.assertEqual(N.shape, (2, 2))
+        for T_i, N_i in zip(T.ravel(), N.ravel()):
+            self.assertEqual(macro.calc_N_Rb(T_i), N_i)
+
+    def test_continuous_at_melting_point(self):
+        """ Test the two branches roughly agree at the melting point. """
+
+        N = macro.calc_N_Rb([312.46 - 1e-9, 312.46])
+
+        self.assertLess(abs(N[1]/N[0] - 1.), .05)
+
+class TestCalcSpectrum(unittest.TestCase):
+    """ Tests for macro.calc_spectrum. """
+
+    def setUp(self):
+
+        two_obj = OBTwo(gamma=6.)
+        two_obj.set_H_Omega([.1])
+
+        self.scan = ob_scan.OBScan(two_obj, np.linspace(-20., 20., 41))
+        self.rho_Delta = self.scan.steadystate_batch(Deltas=[None])
+
+        self.k = macro.calc_wavenumber(2*np.pi*384e6)
+        self.E = macro.calc_electric_field_ampl(.1, 1.)
+
+    def test_grid_matches_scalar(self):
+        """ Test the broadcast temperature x length grid against the scalar
+        functions at each point. """
+
+        T = np.array([300., 320., 340.])
+        L = np.array([.002, .01])
+
+        chi, alpha, trans = macro.calc_spectrum(self.rho_Delta, self.k, 1.,
+                                                self.E, T, L)
+
+        self.assertEqual(chi.shape, (3, 41))
+        self.assertEqual(trans.shape, (3, 2, 41))
+
+        for i, T_i in enumerate(T):
+            chi_i = macro.calc_susceptibility(1., self.E, macro.calc_N_Rb(T_i),
+                                              self.rho_Delta[:, 0, 1])
+            alpha_i = macro.calc_absorption_coeff(self.k, chi_i)
+            np.testing.assert_allclose(chi[i], chi_i)
+            for j, L_j in enumerate(L):
+                np.testing.assert_allclose(
+                    trans[i, j], macro.calc_transmission(alpha_i, L_j))
+
+        # Hotter and longer cells absorb more on resonance.
+        self.assertTrue(np.all(np.diff(trans[:, 0, 20]) < 0))
+        self.assertTrue(np.all(trans[:, 1, 20] < trans[:, 0, 20]))
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
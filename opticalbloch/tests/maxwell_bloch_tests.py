@@ -0,0 +1,74 @@
+"""Unit tests for the maxwell_bloch module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import maxwell_bloch
+import pulses
+from ob_systems import OBTwo
+
+class TestMaxwellBloch(unittest.TestCase):
+    """ Tests for maxwell_bloch.MaxwellBloch. """
+
+    def setUp(self):
+
+        self.Gamma = 1.
+        self.two_obj = OBTwo(gamma=self.Gamma)
+        self.z_range = np.linspace(0., 1., 51)
+
+    def test_weak_field_beer_law(self):
+        """ Test a weak resonant CW field is absorbed as
+        Omega(z) = Omega(0) exp(-g z/Gamma) once the medium is steady. """
+
+        g = 2.
+        mb = maxwell_bloch.MaxwellBloch(self.two_obj, self.z_range, g=g)
+
+        tlist = np.linspace(0., 20., 201)
+        Omega_zt = mb.solve(tlist, Omega_in=1e-3)
+
+        np.testing.assert_allclose(Omega_zt[-1],
+                                   1e-3*np.exp(-g*self.z_range/self.Gamma),
+                                   rtol=1e-3)
+        self.assertAlmostEqual(mb.transmission()[-1],
+                               np.exp(-2.*g/self.Gamma), places=3)
+
+    def test_no_coupling_matches_single_atom(self):
+        """ Test that with g = 0 every slice evolves as the OB object does
+        with the same pulse. """
+
+        pulse = pulses.Gaussian(ampl=2., centre=2., fwhm=1.)
+
+        mb = maxwell_bloch.MaxwellBloch(self.two_obj, self.z_range[:5], g=0.)
+        tlist = np.linspace(0., 5., 51)
+        mb.solve(tlist, Omega_in=pulse, steps=4, keep_rho=True)
+
+        self.two_obj.set_H_Omega([1.])
+        self.two_obj.H_Omega_list = [[self.two_obj.H_Omega_list[0], pulse]]
+        states = self.two_obj.evolve(tlist, td=True)
+
+        for z in range(5):
+            np.testing.assert_allclose(mb.rho_zt[:, z], states, atol=1e-6)
+
+    def test_coarse_tlist_stable(self):
+        """ Test a tlist too coarse for one stable step per interval gives
+        the same field as a fine one. """
+
+        g = 2.
+        mb = maxwell_bloch.MaxwellBloch(self.two_obj, self.z_range, g=g)
+
+        Omega_coarse = mb.solve(np.linspace(0., 20., 5), Omega_in=1e-3)
+        Omega_fine = mb.solve(np.linspace(0., 20., 401), Omega_in=1e-3)
+
+        self.assertTrue(np.all(np.isfinite(Omega_coarse)))
+        np.testing.assert_allclose(Omega_coarse[-1], Omega_fine[-1],
+                                   rtol=1e-6)
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
@@ -0,0 +1,93 @@
+"""Unit tests for the metrics module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import io
+import sys
+import unittest
+from contextlib import redirect_stdout
+import numpy as np
+import metrics
+import ob_scan
+import timer
+from ob_systems import OBTwo
+
+class TestMetrics(unittest.TestCase):
+    """ Tests for metrics.Metrics reported into by the scans. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Omega([1.])
+        self.scan = ob_scan.OBScan(self.two_obj, np.linspace(-1., 1., 5))
+
+    def test_no_metrics_no_output(self):
+        """ Test a scan without metrics prints nothing. """
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.scan.steadystate(Deltas=[None])
+
+        self.assertEqual(out.getvalue(), '')
+
+    def test_scan_timers_and_counters(self):
+        """ Test a scan records its phases, solver calls and progress. """
+
+        events = []
+        m = metrics.Metrics(callbacks=[lambda e, info: events.append(info)])
+        self.two_obj.metrics = m
+
+        self.scan.steadystate(Deltas=[None])
+
+        self.assertEqual(m.counters['solver_calls'], 5)
+        for phase in ('H assembly', 'liouvillian', 'solve', 'convert'):
+            self.assertIn(phase, m.timers)
+        self.assertEqual(m.timers['solve'][1], 5)
+        self.assertEqual([i['done'] for i in events], [1, 2, 3, 4, 5])
+
+        m.reset()
+        self.scan.steadystate_batch(Deltas=[None], chunk_size=2)
+        self.assertEqual(m.counters['solver_calls'], 3)
+
+    def test_failure_counted(self):
+        """ Test a failing solve is counted and reported, then raised. """
+
+        events = []
+        m = metrics.Metrics(callbacks=[lambda e, info: events.append(e)])
+
+        with self.assertRaises(ValueError):
+            with m.solver():
+                raise ValueError('singular')
+
+        self.assertEqual(m.counters, {'solver_calls': 1, 'failures': 1})
+        self.assertEqual(events, ['failure'])
+
+    def test_progress_rate_limited(self):
+        """ Test Progress only writes the first and last of a fast scan. """
+
+        out = io.StringIO()
+        m = metrics.Metrics(callbacks=[metrics.Progress(interval=60.,
+                                                        stream=out)])
+        for i in range(100):
+            m.progress(i + 1, 100, 'scan')
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[-1].startswith('scan 100/100'))
+
+    def test_timer_records_phase(self):
+        """ Test timer.Timer adds its time to a Metrics. """
+
+        m = metrics.Metrics()
+        with timer.Timer('block', metrics=m, verbose=False) as t:
+            pass
+
+        self.assertEqual(m.timers['block'], [t.elapsed, 1])
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
@@ -0,0 +1,98 @@
+"""Unit tests for the ob_grid module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import ob_grid
+from ob_systems import OBTwo, pop_1_analytic
+
+class OBTwoGamma(OBTwo):
+    """ A two-level system with a decay setter. """
+
+    def set_gammas(self, gammas):
+
+        self.c_ops = [np.sqrt(gammas[0])*self.sigma(0,1)]
+
+class TestOBGrid(unittest.TestCase):
+    """ Tests for ob_grid.OBGrid. """
+
+    def setUp(self):
+
+        self.Delta_range = np.linspace(-4., 4., 9)
+        self.Omega_range = np.array([.5, 1., 2.])
+        self.gamma_range = np.array([.5, 1.])
+
+        self.two_obj = OBTwoGamma(gamma=1.)
+        self.grid = ob_grid.OBGrid(self.two_obj,
+                        params={'set_H_Delta': [0.], 'set_H_Omega': [1.],
+                                'set_gammas': [1.]},
+                        axes=[('set_H_Delta', 0, self.Delta_range),
+                              ('set_H_Omega', 0, self.Omega_range),
+                              ('set_gammas', 0, self.gamma_range)])
+
+        D, O, G = np.meshgrid(self.Delta_range, self.Omega_range,
+                              self.gamma_range, indexing='ij')
+        self.pop_1 = pop_1_analytic(D, O, G)
+
+    def test_3d_grid_analytic(self):
+        """ Test a Delta x Omega x gamma grid against the analytic result. """
+
+        rho = self.grid.steadystate(chunk_size=5)
+
+        self.assertEqual(rho.shape, (9, 3, 2, 2, 2))
+        self.assertEqual(rho.labels, ['set_H_Delta[0]', 'set_H_Omega[0]',
+                                      'set_gammas[0]'])
+        self.assertIsNotNone(self.grid.linear_parts())
+        np.testing.assert_allclose(rho[..., 1, 1].real, self.pop_1,
+                                   atol=1e-12)
+
+    def test_nonlinear_setter(self):
+        """ Test a setter nonlinear in its parameter is built per point. """
+
+        def set_gammas(gammas):
+            self.two_obj.c_ops = [gammas[0]*self.two_obj.sigma(0,1)]
+
+        self.two_obj.set_gammas = set_gammas
+
+        rho = self.grid.steadystate()
+
+        self.assertIsNone(self.grid.linear_parts())
+        np.testing.assert_allclose(rho[..., 1, 1].real,
+            pop_1_analytic(*np.meshgrid(self.Delta_range, self.Omega_range,
+                                        self.gamma_range**2, indexing='ij')),
+            atol=1e-12)
+
+    def test_nonlinear_between_checked_points(self):
+        """ Test a setter that is linear at the ends and centre of its axis
+        but not in between is found nonlinear. """
+
+        def set_gammas(gammas):
+            self.two_obj.c_ops = [gammas[0]*self.two_obj.sigma(0,1)]
+
+        self.two_obj.set_gammas = set_gammas
+
+        grid = ob_grid.OBGrid(self.two_obj,
+                              params={'set_H_Omega': [1.],
+                                      'set_gammas': [1.]},
+                              axes=[('set_gammas', 0,
+                                     [0., .3, .6, 1., .4, .2, 1.])])
+
+        self.assertIsNone(grid.linear_parts())
+
+    def test_parallel_grid(self):
+        """ Test the process pool gives the same grid. """
+
+        rho = self.grid.steadystate(num_cpus=2)
+
+        np.testing.assert_allclose(rho[..., 1, 1].real, self.pop_1,
+                                   atol=1e-12)
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
@@ -0,0 +1,271 @@
+"""Unit tests for the ob_scan module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import warnings
+import numpy as np
+import liouville
+import macro
+import metrics
+import ob_scan
+from ob_systems import OBLadder, OBTwo, OBTwoN, pop_1_analytic
+
+class TestSteadystate(unittest.TestCase):
+    """ Tests for OBScan.steadystate. """
+
+    def test_failed_point(self):
+        """ Test a point where the solver fails is stored as None, counted,
+        and NaN in the array and element sums. """
+
+        two_obj = OBTwo(gamma=1.)
+        two_obj.set_H_Omega([.8])
+        two_obj.metrics = metrics.Metrics()
+
+        steadystate = two_obj.steadystate
+        calls = []
+
+        def failing_steadystate(*args, **kwargs):
+            calls.append(None)
+            if len(calls) == 3:
+                raise ValueError('No convergence.')
+            return steadystate(*args, **kwargs)
+
+        two_obj.steadystate = failing_steadystate
+
+        scan = ob_scan.OBScan(two_obj, np.linspace(-2., 2., 5))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            rho_Delta = scan.steadystate(Deltas=[None])
+
+        self.assertIsNone(rho_Delta[2])
+        self.assertEqual(two_obj.metrics.counters['failed_points'], 1)
+
+        rho = scan.get_rho_Delta()
+        self.assertTrue(np.all(np.isnan(rho[2])))
+        np.testing.assert_allclose(rho[3], rho_Delta[3].full())
+
+        sums = scan.get_rho_Delta_element_sum([(1, 1)])
+        self.assertTrue(np.isnan(sums[2]))
+        np.testing.assert_allclose(sums[[0, 1, 3, 4]].real,
+            pop_1_analytic(scan.Delta_range[[0, 1, 3, 4]], .8, 1.))
+
+class TestSteadystateContinuation(unittest.TestCase):
+    """ Tests for OBScan.steadystate_continuation. """
+
+    def test_matches_batch(self):
+        """ Test the continuation sweep against the stacked solves. """
+
+        N_obj = OBTwoN(N=3, gamma=1., Omega=1.3, Delta=0.)
+        Delta_range = np.linspace(-3., 3., 31)
+
+        scan = ob_scan.OBScan(N_obj, Delta_range)
+        rho_batch = scan.steadystate_batch(Deltas=[0.])
+        rho_cont = scan.steadystate_continuation(Deltas=[0.])
+
+        np.testing.assert_allclose(rho_cont, rho_batch, atol=1e-9)
+
+    def test_warm_start_saves_work(self):
+        """ Test the sweep reuses preconditioners, and that starting from the
+        previous point's state takes fewer iterations than a cold start. """
+
+        N_obj = OBTwoN(N=3, gamma=1., Omega=1.3, Delta=0.)
+        N_obj.metrics = metrics.Metrics()
+        scan = ob_scan.OBScan(N_obj, np.linspace(-3., 3., 61))
+
+        scan.steadystate_continuation(Deltas=[0.])
+        self.assertLess(N_obj.metrics.counters['preconditioner_builds'], 20)
+
+        N_obj.set_H_Delta([1.])
+        L_1 = liouville.liouvillian_sparse(N_obj.H_total(), N_obj.c_ops)
+        N_obj.set_H_Delta([1.1])
+        L_2 = liouville.liouvillian_sparse(N_obj.H_total(), N_obj.c_ops)
+
+        info = {}
+        rho_1 = liouville.steadystate_iterative(L_1, info=info)
+        M = liouville.ilu_preconditioner(liouville.steadystate_system(L_1)[0],
+                                         drop_tol=1e-2)
+
+        iterations = []
+        for x0 in (None, liouville.vec(rho_1)):
+            liouville.steadystate_iterative(L_2, x0=x0, M=M, info=info)
+            iterations.append(info['iterations'])
+
+        self.assertLess(iterations[1], iterations[0])
+
+    def test_stale_preconditioner_failure(self):
+        """ Test a solve failing with the reused preconditioner is retried
+        with a new one rather than ending the sweep. """
+
+        N_obj = OBTwoN(N=3, gamma=1., Omega=1.3, Delta=0.)
+        N_obj.metrics = metrics.Metrics()
+        scan = ob_scan.OBScan(N_obj, np.linspace(-3., 3., 31))
+        rho_batch = scan.steadystate_batch(Deltas=[0.]).copy()
+
+        steadystate_iterative = liouville.steadystate_iterative
+        calls = []
+
+        def failing(L, M=None, **kwargs):
+            calls.append(M)
+            if M is not None and len(calls) % 5 == 0:
+                raise ValueError('Iterative steady state solver did not '
+                                 'converge.')
+            return steadystate_iterative(L, M=M, **kwargs)
+
+        liouville.steadystate_iterative = failing
+        try:
+            rho_cont = scan.steadystate_continuation(Deltas=[0.])
+        finally:
+            liouville.steadystate_iterative = steadystate_iterative
+
+        self.assertGreater(N_obj.metrics.counters['preconditioner_retries'],
+                           0)
+        np.testing.assert_allclose(rho_cont, rho_batch, atol=1e-9)
+
+    def test_refines_near_resonance(self):
+        """ Test refinement adds points around the line centre only, and the
+        refined states are correct. """
+
+        Omega, Gamma = .5, 1.
+        two_obj = OBTwo(gamma=Gamma)
+        two_obj.set_H_Omega([Omega])
+
+        scan = ob_scan.OBScan(two_obj, np.linspace(-20., 20., 11))
+        rho = scan.steadystate_continuation(Deltas=[None], max_change=.02)
+
+        Delta_range = scan.Delta_range
+        self.assertGreater(len(Delta_range), 11)
+        self.assertTrue(np.all(np.diff(Delta_range) > 0))
+
+        steps = np.diff(Delta_range)
+        centre = np.abs(Delta_range[:-1]) < 2.
+        self.assertLess(steps[centre].max(), steps[~centre].max())
+
+        np.testing.assert_allclose(rho[:, 1, 1].real,
+                                   pop_1_analytic(Delta_range, Omega, Gamma),
+                                   atol=1e-9)
+        self.assertLessEqual(np.abs(np.diff(rho, axis=0)).max(), .02)
+
+class TestSteadystateAdaptive(unittest.TestCase):
+    """ Tests for OBScan.steadystate_adaptive. """
+
+    def setUp(self):
+
+        # A narrow line on a wide scan.
+        self.Omega, self.Gamma = .02, .05
+        self.two_obj = OBTwo(gamma=self.Gamma)
+        self.two_obj.set_H_Omega([self.Omega])
+
+    def test_interpolation_error(self):
+        """ Test linear interpolation of the refined grid is within tol of
+        the analytic line everywhere, using fewer solves than the uniform
+        grid of the finest step. """
+
+        tol = 1e-3
+
+        scan = ob_scan.OBScan(self.two_obj, np.linspace(-20., 20., 11))
+        rho = scan.steadystate_adaptive(Deltas=[None], tol=tol,
+                                        elements=[(1, 1)])
+
+        Delta_range = scan.Delta_range
+        self.assertTrue(np.all(np.diff(Delta_range) > 0))
+
+        np.testing.assert_allclose(rho[:, 1, 1].real,
+                                   pop_1_analytic(Delta_range, self.Omega,
+                                                  self.Gamma), atol=1e-12)
+
+        Delta_check = np.linspace(-20., 20., 40001)
+        interp = np.interp(Delta_check, Delta_range, rho[:, 1, 1].real)
+        err = np.abs(interp - pop_1_analytic(Delta_check, self.Omega,
+                                             self.Gamma))
+        self.assertLess(err.max(), tol)
+
+        num_uniform = 40./np.diff(Delta_range).min()
+        self.assertLess(len(Delta_range), num_uniform/20.)
+
+    def test_coherence(self):
+        """ Test the real and imaginary parts of a coherence are each
+        interpolated to within tol. """
+
+        tol = 1e-3
+
+        scan = ob_scan.OBScan(self.two_obj, np.linspace(-20., 20., 11))
+        rho = scan.steadystate_adaptive(Deltas=[None], tol=tol,
+                                        elements=[(0, 1)])
+        Delta_range = scan.Delta_range
+
+        check = ob_scan.OBScan(self.two_obj, np.linspace(-20., 20., 4001))
+        rho_check = check.steadystate_batch(Deltas=[None])[:, 0, 1]
+
+        for part in (np.real, np.imag):
+            interp = np.interp(check.Delta_range, Delta_range,
+                               part(rho[:, 0, 1]))
+            self.assertLess(np.abs(interp - part(rho_check)).max(), tol)
+
+    def test_max_points(self):
+        """ Test refinement stops at max_points, with a warning that tol
+        wasn't reached. """
+
+        self.two_obj.metrics = metrics.Metrics()
+        scan = ob_scan.OBScan(self.two_obj, np.linspace(-20., 20., 11))
+
+        with self.assertWarns(UserWarning):
+            scan.steadystate_adaptive(Deltas=[None], tol=1e-9, max_points=40)
+
+        self.assertGreater(
+            self.two_obj.metrics.counters['unconverged_intervals'], 0)
+
+        self.assertEqual(len(scan.Delta_range), 40)
+        self.assertEqual(scan.rho_Delta.shape, (40, 2, 2))
+
+class TestLinearResponse(unittest.TestCase):
+    """ Tests for OBScan.linear_response. """
+
+    def test_two_level(self):
+        """ Test the first-order coherence against the full steady state
+        for a weak probe. """
+
+        two_obj = OBTwo(gamma=1.)
+        two_obj.set_H_Omega([1e-3])
+
+        scan = ob_scan.OBScan(two_obj, np.linspace(-5., 5., 41))
+        rho = scan.steadystate_batch(Deltas=[None]).copy()
+        rho_lr = scan.linear_response(Deltas=[None])
+
+        np.testing.assert_allclose(rho_lr[:, 0, 1], rho[:, 0, 1], rtol=1e-5)
+        np.testing.assert_allclose(
+            macro.calc_susceptibility(1., 1., 1e16, rho_lr[:, 0, 1]),
+            macro.calc_susceptibility(1., 1., 1e16, rho[:, 0, 1]),
+            rtol=1e-5)
+
+    def test_ladder_eit(self):
+        """ Test a weak probe on a ladder with a strong coupling beam. """
+
+        ladder = OBLadder(3, gamma=1.)
+        ladder.set_H_Omega([1e-3, 2.])
+
+        scan = ob_scan.OBScan(ladder, np.linspace(-4., 4., 81))
+        rho = scan.steadystate_batch(Deltas=[None, .5]).copy()
+        rho_lr = scan.linear_response(Deltas=[None, .5], probe_idx=0)
+
+        np.testing.assert_allclose(rho_lr[:, 0, 1], rho[:, 0, 1], rtol=1e-5,
+                                   atol=1e-12)
+
+    def test_not_block_diagonal(self):
+        """ Test scanning the coupling detuning raises ValueError. """
+
+        ladder = OBLadder(3, gamma=1.)
+        ladder.set_H_Omega([1e-3, 2.])
+
+        scan = ob_scan.OBScan(ladder, np.linspace(-4., 4., 5), Delta_idx=1)
+
+        self.assertRaises(ValueError, scan.linear_response, [0., None])
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
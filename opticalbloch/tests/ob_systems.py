@@ -0,0 +1,57 @@
+"""Systems shared by the unit tests.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import numpy as np
+import ob
+import sigma
+from systems import OBLadder
+
+class OBTwo(ob.OB):
+    """ A two-level system to test against. """
+
+    def __init__(self, gamma):
+
+        self.num_states = 2
+        self.set_H_0()
+        self.c_ops = [np.sqrt(gamma)*self.sigma(0,1)]
+
+        self.set_H_Delta([0.])
+        self.set_H_Omega([0.])
+
+    def set_H_Delta(self, Deltas):
+
+        self.H_Delta = -Deltas[0]*self.sigma(1,1)
+
+    def set_H_Omega(self, Omegas):
+
+        self.H_Omega_list = [Omegas[0]/2.*(self.sigma(0,1) +
+                                           self.sigma(1,0))]
+
+class OBTwoN(ob.OB):
+    """ N independent two-level atoms, built with sigma_N, to test the
+    sparse solvers on. """
+
+    def __init__(self, N, gamma, Omega, Delta):
+
+        self.N = N
+        self.num_states = 2**N
+        self.c_ops = [np.sqrt(gamma)*sigma.sigma_N(2, 0, 1, i, N)
+                      for i in range(N)]
+
+        self.H_0 = 0*sigma.sigma_N(2, 0, 0, 0, N)
+        self.set_H_Delta([Delta])
+        self.H_Omega_list = [Omega/2.*(sigma.sigma_N(2, 0, 1, i, N) +
+                                       sigma.sigma_N(2, 1, 0, i, N))
+                             for i in range(N)]
+
+    def set_H_Delta(self, Deltas):
+
+        self.H_Delta = sum(-Deltas[0]*sigma.sigma_N(2, 1, 1, i, self.N)
+                           for i in range(self.N))
+
+def pop_1_analytic(Delta, Omega, Gamma):
+    """ Steady-state excited population of a two-level atom. """
+
+    return (Omega**2/4.)/(Delta**2 + Gamma**2/4. + Omega**2/2.)
@@ -0,0 +1,164 @@
+"""Unit tests for the ob module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import qutip as qu
+import liouville
+import pulses
+from ob_systems import OBTwo, pop_1_analytic
+
+class TestLiouvillianCache(unittest.TestCase):
+    """ Tests for the cached Hamiltonian and Liouvillian of OB. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Omega([.7])
+
+    def fresh(self):
+        """ The Liouvillian built from scratch. """
+
+        two_obj = self.two_obj
+        H = two_obj.H_0 + two_obj.H_Delta + two_obj.H_I_sum()
+        return liouville.liouvillian(H, two_obj.c_ops)
+
+    def test_reused_until_changed(self):
+        """ Test a read-only view of the same array is returned until
+        something changes. """
+
+        L_1 = self.two_obj.liouvillian()
+        self.assertIs(self.two_obj.liouvillian().base, L_1.base)
+        self.assertFalse(L_1.flags.writeable)
+        with self.assertRaises(ValueError):
+            L_1[0, 0] = 1.
+
+        self.two_obj.set_H_Omega([1.1])
+        np.testing.assert_allclose(self.two_obj.liouvillian(), self.fresh())
+
+    def test_detuning_patches_diagonal(self):
+        """ Test a detuning update patches the cached array in place. """
+
+        L_1 = self.two_obj.liouvillian()
+
+        for Delta in (.3, -2., 0.):
+            self.two_obj.set_H_Delta([Delta])
+            L = self.two_obj.liouvillian()
+            self.assertIs(L.base, L_1.base)
+            np.testing.assert_allclose(L, self.fresh(), atol=1e-15)
+
+    def test_decay_and_off_diagonal_detuning(self):
+        """ Test a new decay rate and a non-diagonal detuning term. """
+
+        self.two_obj.liouvillian()
+
+        self.two_obj.c_ops = [np.sqrt(2.)*self.two_obj.sigma(0, 1)]
+        np.testing.assert_allclose(self.two_obj.liouvillian(), self.fresh())
+
+        self.two_obj.H_Delta = .2*qu.sigmax()
+        np.testing.assert_allclose(self.two_obj.liouvillian(), self.fresh())
+
+        self.two_obj.set_H_Delta([.5])
+        np.testing.assert_allclose(self.two_obj.liouvillian(), self.fresh())
+
+    def test_steadystate_methods(self):
+        """ Test the dense, direct and iterative steady states agree with the
+        analytic lineshape. """
+
+        self.two_obj.set_H_Delta([.4])
+        pop_1 = pop_1_analytic(.4, .7, 1.)
+
+        for method in (None, 'dense', 'direct', 'gmres'):
+            rho = self.two_obj.steadystate(method=method)
+            self.assertAlmostEqual(rho[1, 1].real, pop_1, places=10)
+
+    def test_steadystate_qutip_methods(self):
+        """ Test methods other than dense and the liouville iterative ones
+        still go to qu.steadystate. """
+
+        self.two_obj.set_H_Delta([.4])
+        pop_1 = pop_1_analytic(.4, .7, 1.)
+
+        for method in ('eigen', 'svd', 'iterative-gmres'):
+            rho = self.two_obj.steadystate(method=method)
+            self.assertAlmostEqual(rho[1, 1].real, pop_1, places=8)
+
+    def test_steadystate_kwargs_above_threshold(self):
+        """ Test qu.steadystate kwargs go to the direct solver above the
+        sparse threshold, and iterative kwargs to the iterative solver. """
+
+        self.two_obj.set_H_Delta([.4])
+        pop_1 = pop_1_analytic(.4, .7, 1.)
+
+        threshold = liouville.SPARSE_THRESHOLD
+        liouville.SPARSE_THRESHOLD = self.two_obj.num_states**2 - 1
+
+        try:
+            for kwargs in ({'use_rcm': True}, {'drop_tol': 1e-8}):
+                rho = self.two_obj.steadystate(**kwargs)
+                self.assertAlmostEqual(rho[1, 1].real, pop_1, places=10)
+        finally:
+            liouville.SPARSE_THRESHOLD = threshold
+
+class TestPeriodicSteadystate(unittest.TestCase):
+    """ Tests for OB.periodic_steadystate. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Delta([.3])
+        self.two_obj.set_H_Omega([1.])
+
+        self.H_Omega = self.two_obj.H_Omega_list[0]
+
+    def brute_force(self, period, num_periods=40):
+        """ The last cycle of an evolution through a train of square pulses
+        from 1 to 2 in each period. """
+
+        train = sum(pulses.Square(2., 1. + k*period, 2. + k*period)
+                    for k in range(num_periods))
+        self.two_obj.H_Omega_list = [[self.H_Omega, train]]
+
+        tlist = np.linspace(0., num_periods*period, 20*num_periods + 1)
+        states = self.two_obj.evolve(tlist, td=True)
+
+        return states[-21:]
+
+    def test_square_train(self):
+        """ Test a square pulse train against evolving through it. """
+
+        tlist = np.linspace(0., 5., 21)
+        expected = self.brute_force(5.)
+
+        self.two_obj.H_Omega_list = [[self.H_Omega,
+                                      pulses.Square(2., 1., 2.)]]
+        states = self.two_obj.periodic_steadystate(5., tlist)
+
+        np.testing.assert_allclose(states, expected, atol=1e-7)
+        np.testing.assert_allclose(states[0], states[-1], atol=1e-9)
+
+    def test_harmonics_match_propagator(self):
+        """ Test the truncated Floquet solution against the propagator for
+        smooth modulation. """
+
+        period = 2.
+        modulation = pulses.TimeFunction(
+            lambda t, args: 1. + .5*np.cos(2*np.pi*t/period))
+        self.two_obj.H_Omega_list = [[self.H_Omega, modulation]]
+
+        tlist = np.linspace(.5, 2., 7)
+        states = self.two_obj.periodic_steadystate(period, tlist)
+        states_f = self.two_obj.periodic_steadystate(period, tlist,
+                                                     harmonics=12)
+
+        np.testing.assert_allclose(states_f, states, atol=1e-7)
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
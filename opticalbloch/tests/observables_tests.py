@@ -0,0 +1,151 @@
+"""Unit tests for the observables module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import qutip as qu
+import observables
+import ob_scan
+from ob_systems import OBTwo, OBTwoN
+
+class TestObservables(unittest.TestCase):
+    """ Tests for observables.Observables. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Omega([.8])
+
+        self.sz = np.diag([1., -1.])
+        self.obs = observables.Observables(elements=[(0, 1), (1, 1)],
+                                           e_ops=[self.sz], trace=True)
+
+        self.Delta_range = np.linspace(-5., 5., 21)
+
+    def test_call(self):
+        """ Test the quantities of a stack of states. """
+
+        rho = np.random.rand(3, 4, 2, 2) + 1.j*np.random.rand(3, 4, 2, 2)
+        result = self.obs(rho)
+
+        np.testing.assert_allclose(result['elements'][..., 0],
+                                   rho[..., 0, 1])
+        np.testing.assert_allclose(result['expect'][..., 0],
+                                   rho[..., 0, 0] - rho[..., 1, 1])
+        np.testing.assert_allclose(result['trace'],
+                                   rho[..., 0, 0] + rho[..., 1, 1])
+
+    def test_steadystate_batch(self):
+        """ Test the recorded quantities against the full states, and that
+        the states aren't kept. """
+
+        scan = ob_scan.OBScan(self.two_obj, self.Delta_range)
+        rho = scan.steadystate_batch(Deltas=[None]).copy()
+
+        result = scan.steadystate_batch(Deltas=[None], chunk_size=4,
+                                        observables=self.obs)
+
+        self.assertIsNone(scan.rho_Delta)
+        self.assertEqual(result['elements'].shape, (21, 2))
+        np.testing.assert_allclose(result['elements'][:, 1], rho[:, 1, 1])
+        np.testing.assert_allclose(result['trace'], 1.)
+
+    def test_propagate(self):
+        """ Test the recorded time series against the full states. """
+
+        tlist = np.linspace(0., 3., 7)
+        scan = ob_scan.OBScan(self.two_obj, self.Delta_range)
+        states = scan.propagate(Deltas=[None], tlist=tlist)
+
+        result = scan.propagate(Deltas=[None], tlist=tlist, chunk_size=5,
+                                observables=self.obs)
+
+        self.assertEqual(result['expect'].shape, (21, 7, 1))
+        np.testing.assert_allclose(result['expect'][..., 0],
+                                   states[..., 0, 0] - states[..., 1, 1],
+                                   atol=1e-12)
+        np.testing.assert_allclose(scan.rho_Delta, states[:, -1])
+
+    def test_mesolve(self):
+        """ Test mesolve records the quantities with QuTiP's e_ops. """
+
+        tlist = np.linspace(0., 3., 7)
+        self.two_obj.mesolve(tlist)
+        states = self.two_obj.states_t()
+
+        self.two_obj.mesolve(tlist, observables=self.obs)
+        observed = self.two_obj.observed
+
+        self.assertEqual(len(self.two_obj.result.states), 0)
+        np.testing.assert_allclose(observed['elements'],
+                                   states[:, [0, 1], [1, 1]], atol=1e-6)
+        np.testing.assert_allclose(observed['trace'], 1., atol=1e-6)
+
+    def test_mesolve_two_atoms(self):
+        """ Test mesolve records the quantities of a two-atom system, whose
+        operators have tensor dims. """
+
+        N_obj = OBTwoN(N=2, gamma=1., Omega=.8, Delta=.3)
+        tlist = np.linspace(0., 3., 7)
+
+        N_obj.mesolve(tlist)
+        states = N_obj.states_t()
+
+        obs = observables.Observables(elements=[(0, 1), (3, 3)],
+                                      e_ops=[np.diag([1., 1., -1., -1.])],
+                                      trace=True)
+        N_obj.mesolve(tlist, observables=obs)
+        observed = N_obj.observed
+
+        np.testing.assert_allclose(observed['elements'],
+                                   states[:, [0, 3], [1, 3]], atol=1e-6)
+        np.testing.assert_allclose(observed['expect'][:, 0],
+                                   states[:, 0, 0] + states[:, 1, 1] -
+                                   states[:, 2, 2] - states[:, 3, 3],
+                                   atol=1e-6)
+        np.testing.assert_allclose(observed['trace'], 1., atol=1e-6)
+
+class TestElementSum(unittest.TestCase):
+    """ Tests for the element sums of OBScan. """
+
+    def test_element_sums(self):
+        """ Test the vectorised sums against loops over points. """
+
+        two_obj = OBTwo(gamma=1.)
+        two_obj.set_H_Omega([.8])
+        two_obj.H_0 = qu.Qobj(np.diag([0., 1.]))
+
+        scan = ob_scan.OBScan(two_obj, np.linspace(-5., 5., 21))
+        rho = scan.steadystate_batch(Deltas=[None])
+
+        elements = [(0, 1), (1, 1)]
+        np.testing.assert_allclose(scan.get_rho_Delta_element_sum(elements),
+                                   rho[:, 0, 1] + rho[:, 1, 1])
+
+        cutoff = scan.get_rho_Delta_element_sum_cutoff(elements, 2.)
+        expected = rho[:, 0, 1]*(np.abs(scan.Delta_range - 1.) < 2.)
+        np.testing.assert_allclose(cutoff, expected)
+
+    def test_get_rho_Delta_converts_once(self):
+        """ Test a list of Qobj states is converted once. """
+
+        two_obj = OBTwo(gamma=1.)
+        two_obj.set_H_Omega([.8])
+
+        scan = ob_scan.OBScan(two_obj, np.linspace(-5., 5., 5))
+        scan.steadystate(Deltas=[None])
+
+        rho_Delta = scan.get_rho_Delta()
+
+        self.assertIs(scan.get_rho_Delta(), rho_Delta)
+        np.testing.assert_allclose(rho_Delta[2], scan.rho_Delta[2].full())
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
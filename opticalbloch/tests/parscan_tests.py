@@ -0,0 +1,103 @@
+"""Unit tests for the parscan module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+import qutip as qu
+import cache
+import ob_scan
+import t_funcs
+from ob_systems import OBTwo
+
+class TestParscan(unittest.TestCase):
+    """ Tests for the OBScan methods using parscan.scan. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Omega([1.5])
+        self.scan = ob_scan.OBScan(self.two_obj, np.linspace(-3., 3., 9))
+        self.tlist = np.linspace(0., 2., 5)
+
+    def test_steadystate_parfor(self):
+        """ Test the parallel steady states against the batched solver. """
+
+        rho_Delta = self.scan.steadystate_parfor([None], num_cpus=2)
+
+        np.testing.assert_allclose(rho_Delta,
+                                   self.scan.steadystate_batch([None]),
+                                   atol=1e-12)
+
+    def test_essolve_parfor(self):
+        """ Test the parallel propagator against the serial one. """
+
+        states = self.scan.essolve_parfor([None], self.tlist, num_cpus=2,
+                                          chunk_size=2)
+
+        np.testing.assert_allclose(states,
+                                   self.scan.propagate([None], self.tlist),
+                                   atol=1e-12)
+
+    def test_mesolve_parfor_td(self):
+        """ Test a td mesolve scan against OB.mesolve at one detuning. """
+
+        self.two_obj.H_Omega_list = [[self.two_obj.H_Omega_list[0],
+                                      t_funcs.square_1]]
+        args = {'on_1': 0.5, 'off_1': 1.5, 'ampl_1': 1.}
+
+        states = self.scan.mesolve_parfor([None], self.tlist, td=True,
+                                          args=args, num_cpus=2)
+
+        self.two_obj.set_H_Delta([self.scan.Delta_range[2]])
+        self.two_obj.mesolve(self.tlist, td=True, args=args)
+
+        np.testing.assert_allclose(states[2], self.two_obj.states_t(),
+                                   atol=1e-6)
+
+    def test_mesolve_parfor_no_decay(self):
+        """ Test a scan without c_ops from a ket stores density matrices.
+        """
+
+        self.two_obj.c_ops = []
+        rho0 = self.two_obj.ground_state()
+
+        states = self.scan.mesolve_parfor([None], self.tlist, rho0=rho0,
+                                          num_cpus=2)
+
+        self.two_obj.set_H_Delta([self.scan.Delta_range[2]])
+        self.two_obj.mesolve(self.tlist, rho0=rho0)
+
+        rho_t = np.array([qu.ket2dm(psi).full()
+                          for psi in self.two_obj.result.states])
+
+        self.assertEqual(states.shape, (9, 5, 2, 2))
+        np.testing.assert_allclose(states[2], rho_t, atol=1e-6)
+
+    def test_steadystate_parfor_cache(self):
+        """ Test the parallel scan doesn't share a cache entry with
+        OBScan.steadystate. """
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        result_cache = cache.ResultCache(cache_dir)
+
+        self.scan.steadystate([None], cache=result_cache)
+        rho_Delta = self.scan.steadystate_parfor([None], num_cpus=2,
+                                                 cache=result_cache)
+
+        self.assertIsInstance(rho_Delta, np.ndarray)
+        self.assertIsInstance(self.scan.steadystate([None],
+                                                    cache=result_cache),
+                              list)
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
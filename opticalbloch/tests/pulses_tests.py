@@ -0,0 +1,147 @@
+"""Unit tests for the pulses module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import qutip as qu
+import pulses
+import t_funcs
+from ob_systems import OBTwo
+
+class TestShapes(unittest.TestCase):
+    """ Tests the pulse shapes against the t_funcs functions. """
+
+    def setUp(self):
+
+        self.tlist = np.linspace(-5., 15., 401)
+
+    def test_matches_t_funcs(self):
+        """ Test each shape against its t_funcs equivalent. """
+
+        args = {'ampl_1': 1.3, 'centre_1': 4., 'fwhm_1': 2., 'width_1': 1.5,
+                'on_1': 2., 'off_1': 8.}
+
+        cases = [(pulses.Gaussian(1.3, 4., 2.), t_funcs.gaussian_fwhm_1),
+                 (pulses.Sech(1.3, 4., 1.5), t_funcs.sech_1),
+                 (pulses.Square(1.3, 2., 8.), t_funcs.square_1),
+                 (pulses.RampOn(1.3, 4., 1.5), t_funcs.ramp_on_1),
+                 (pulses.RampOff(1.3, 4., 1.5), t_funcs.ramp_off_1),
+                 (pulses.RampOnOff(1.3, 2., 8., 1.5), t_funcs.ramp_onoff_1),
+                 (pulses.Sinc(1.3, 1.5), t_funcs.sinc_1)]
+
+        for pulse, t_func in cases:
+            np.testing.assert_allclose(pulse(self.tlist),
+                                       t_func(self.tlist, args), atol=1e-14)
+
+    def test_string_matches_func(self):
+        """ Test the QuTiP string expression evaluates to the same values. """
+
+        pulse = (pulses.Square(1., 2., 8.)*pulses.Sech(2., 5., 1.) +
+                 pulses.Sinc(.5, 1., centre=3.))
+
+        for t in (0., 3., 5.5, 9.):
+            value = eval(pulse.string(), dict(pulses._namespace, t=t))
+            self.assertAlmostEqual(value, pulse(t), places=14)
+
+    def test_sum_product_breakpoints(self):
+        """ Test arithmetic, breakpoints and constant segments. """
+
+        pulse = 2.*(pulses.Square(1., 1., 3.) + pulses.Square(.5, 2., 6.)) - 1.
+
+        np.testing.assert_allclose(pulse(np.array([0., 1.5, 2.5, 4., 7.])),
+                                   [-1., 1., 2., 0., -1.])
+        self.assertEqual(pulse.breakpoints(), [1., 2., 3., 6.])
+        self.assertTrue(pulse.is_constant(3., 6.))
+        self.assertFalse(pulse.is_constant(2.5, 6.))
+        self.assertFalse((pulse + pulses.Gaussian(1., 0., 1.)
+                          ).is_constant(3., 6.))
+
+class TestMesolve(unittest.TestCase):
+    """ Tests pulses as time-dependent coefficients of OB.mesolve. """
+
+    def test_func_and_array_match_t_funcs(self):
+        """ Test a pulse, as a function and as an array, gives the same
+        evolution as the t_funcs function with args. """
+
+        tlist = np.linspace(0., 10., 201)
+        pulse = pulses.Gaussian(ampl=1., centre=5., fwhm=2.)
+        t_args = {'ampl_1': 1., 'centre_1': 5., 'fwhm_1': 2.}
+
+        two_obj = OBTwo(gamma=.5)
+        two_obj.set_H_Omega([2.])
+        H_Omega = two_obj.H_Omega_list[0]
+
+        states = []
+        for coeff, args in ((t_funcs.gaussian_fwhm_1, t_args),
+                            (pulse, {}), (pulse.array(tlist), {})):
+            two_obj.H_Omega_list = [[H_Omega, coeff]]
+            two_obj.mesolve(tlist, td=True, args=args)
+            states.append(two_obj.states_t()[:, 1, 1].real)
+
+        np.testing.assert_allclose(states[1], states[0], atol=1e-6)
+        np.testing.assert_allclose(states[2], states[0], atol=1e-4)
+
+class TestEvolve(unittest.TestCase):
+    """ Tests for OB.evolve, the native piecewise integrator. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=.5)
+        self.two_obj.set_H_Delta([.3])
+        self.two_obj.set_H_Omega([2.])
+        self.H_Omega = self.two_obj.H_Omega_list[0]
+
+    def test_static_matches_propagate(self):
+        """ Test a time-independent system against OB.propagate. """
+
+        tlist = np.linspace(0., 5., 51)
+
+        np.testing.assert_allclose(self.two_obj.evolve(tlist),
+                                   self.two_obj.propagate(tlist), atol=1e-12)
+
+    def test_square_pulses_match_mesolve(self):
+        """ Test a sequence of short square pulses, which a coarse tlist
+        would step over, against qu.mesolve with a small max_step. """
+
+        tlist = np.linspace(0., 10., 11)
+        pulse = (pulses.Square(1., 1.2, 1.7) + pulses.Square(1., 4.1, 4.4) +
+                 pulses.Gaussian(.5, 7., 1.))
+
+        self.two_obj.H_Omega_list = [[self.H_Omega, pulse]]
+
+        out = np.zeros((len(tlist), 2, 2), dtype=complex)
+        states = self.two_obj.evolve(tlist, td=True, out=out)
+        self.assertIs(states, out)
+
+        opts = qu.Options(max_step=.01, atol=1e-10, rtol=1e-8)
+        self.two_obj.mesolve(tlist, td=True, opts=opts)
+
+        np.testing.assert_allclose(states, self.two_obj.states_t(),
+                                   atol=1e-6)
+
+    def test_time_function_with_args(self):
+        """ Test a t_funcs time function with args gives the same states as
+        the equivalent pulse. """
+
+        tlist = np.linspace(0., 10., 21)
+
+        self.two_obj.H_Omega_list = [[self.H_Omega, t_funcs.square_1]]
+        states_f = self.two_obj.evolve(tlist, td=True,
+                                       args={'on_1': 2., 'off_1': 5.,
+                                             'ampl_1': 1.})
+
+        self.two_obj.H_Omega_list = [[self.H_Omega,
+                                      pulses.Square(1., 2., 5.)]]
+        states_p = self.two_obj.evolve(tlist, td=True)
+
+        np.testing.assert_allclose(states_f, states_p, atol=1e-6)
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
@@ -0,0 +1,77 @@
+"""Unit tests for the storage module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+import ob_scan
+import storage
+from ob_systems import OBTwo
+
+class TestScanStore(unittest.TestCase):
+    """ Tests for storage.ScanStore with OBScan.steadystate_batch. """
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Omega([1.])
+        self.scan = ob_scan.OBScan(self.two_obj, np.linspace(-2., 2., 10))
+
+    def tearDown(self):
+
+        shutil.rmtree(self.path)
+
+    def test_stream_matches_memory(self):
+        """ Test the memmapped results match the in-memory scan. """
+
+        rho_Delta = self.scan.steadystate_batch([None])
+        rho_store = self.scan.steadystate_batch([None], chunk_size=3,
+                                    store=storage.ScanStore(self.path))
+
+        self.assertIsInstance(rho_store, np.memmap)
+        self.assertIs(self.scan.get_rho_Delta(), rho_store)
+        np.testing.assert_allclose(rho_store, rho_Delta)
+
+    def test_resume(self):
+        """ Test only the chunks not marked done are solved on a rerun. """
+
+        self.scan.steadystate_batch([None], chunk_size=3,
+                                    store=storage.ScanStore(self.path))
+
+        store = storage.ScanStore(self.path).prepare(10, (2, 2), 3,
+                                    meta={'key': self.two_obj.cache_key(
+                                        'OBScan.steadystate', [None],
+                                        self.scan.Delta_range, 0)})
+        rho_done = np.array(store.rho)
+        store.rho[:] = 0.
+        store.done[1] = False
+        del store
+
+        rho_Delta = self.scan.steadystate_batch([None], chunk_size=3,
+                                    store=storage.ScanStore(self.path))
+
+        np.testing.assert_allclose(rho_Delta[3:6], rho_done[3:6])
+        np.testing.assert_array_equal(rho_Delta[:3], 0.)
+
+    def test_different_scan_raises(self):
+        """ Test a store holding a different scan isn't reused. """
+
+        self.scan.steadystate_batch([None], store=storage.ScanStore(self.path))
+        self.two_obj.set_H_Omega([2.])
+
+        with self.assertRaises(ValueError):
+            self.scan.steadystate_batch([None],
+                                        store=storage.ScanStore(self.path))
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
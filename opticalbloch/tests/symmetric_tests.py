@@ -0,0 +1,174 @@
+"""Unit tests for the symmetric module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+from scipy.special import comb
+import qutip as qu
+import liouville
+import sigma
+import symmetric
+from ob_systems import OBTwo, pop_1_analytic
+
+def full_liouvillian(ob_obj, N, collective_c_ops=[], collective_H=[]):
+    """ The n^(2N) Liouvillian of the same system built with sigma_N. """
+
+    n = ob_obj.num_states
+    h = liouville.to_array(ob_obj.H_total())
+
+    def each(op):
+        op = liouville.to_array(op)
+        return [sum(op[a, b]*sigma.sigma_N(n, a, b, i, N)
+                    for a in range(n) for b in range(n) if op[a, b])
+                for i in range(N)]
+
+    def total(op):
+        return sum(each(op))
+
+    H = total(h)
+    for A, B in collective_H:
+        H = H + total(A)*total(B)
+
+    c_ops = [c for op in ob_obj.c_ops for c in each(op)]
+    c_ops += [total(s) for s in collective_c_ops]
+
+    return liouville.liouvillian(H, c_ops)
+
+class TestSymmetricOB(unittest.TestCase):
+    """ Tests for symmetric.SymmetricOB. """
+
+    def setUp(self):
+
+        self.two_obj = OBTwo(gamma=1.)
+        self.two_obj.set_H_Delta([.4])
+        self.two_obj.set_H_Omega([.9])
+
+        s = liouville.to_array(self.two_obj.sigma(0, 1))
+        self.collective_c_ops = [np.sqrt(.5)*s]
+        self.collective_H = [(.3*s.T, s)]
+
+    def test_dimension(self):
+        """ Test the basis grows polynomially in N. """
+
+        sym = symmetric.SymmetricOB(self.two_obj, 50)
+
+        self.assertEqual(sym.dim, comb(53, 3, exact=True))
+        self.assertEqual(sym.counts.sum(axis=1).min(), 50)
+
+    def test_one_body_identity(self):
+        """ Test summing the identity over atoms gives N. """
+
+        sym = symmetric.SymmetricOB(self.two_obj, 4)
+
+        np.testing.assert_allclose(sym.one_body(np.eye(4)).toarray(),
+                                   4*np.eye(sym.dim))
+
+    def test_steadystate_matches_full(self):
+        """ Test the steady state with collective decay and interactions
+        against the full sigma_N system. """
+
+        N = 3
+        sym = symmetric.SymmetricOB(self.two_obj, N, self.collective_c_ops,
+                                    self.collective_H)
+        y = sym.steadystate()
+
+        L = full_liouvillian(self.two_obj, N, self.collective_c_ops,
+                             self.collective_H)
+        rho = liouville.steadystate_solve(L[np.newaxis].copy())[0]
+
+        np.testing.assert_allclose(sym.to_dm(y), rho, atol=1e-10)
+        self.assertAlmostEqual(sym.trace_row().dot(y), 1.)
+
+        rho_1 = qu.Qobj(rho, dims=[[2]*N, [2]*N]).ptrace(0).full()
+        np.testing.assert_allclose(sym.rho_1(y), rho_1, atol=1e-10)
+
+        rho_2 = qu.Qobj(rho, dims=[[2]*N, [2]*N]).ptrace([0, 1]).full()
+        np.testing.assert_allclose(sym.rho_2(y), rho_2, atol=1e-10)
+
+        J = sum(sigma.sigma_N(2, 0, 1, i, N) for i in range(N)).full()
+        s = self.two_obj.sigma(0, 1)
+        self.assertAlmostEqual(sym.expect_pair(s.dag(), s, y),
+                               np.trace(J.conj().T.dot(J).dot(rho)))
+
+    def test_evolve_matches_full(self):
+        """ Test the evolution from the ground state against the full
+        system. """
+
+        N = 3
+        sym = symmetric.SymmetricOB(self.two_obj, N, self.collective_c_ops)
+        tlist = np.linspace(0., 3., 7)
+        y = sym.evolve(tlist)
+
+        L = full_liouvillian(self.two_obj, N, self.collective_c_ops)
+        rho0 = np.zeros((2**N, 2**N))
+        rho0[0, 0] = 1.
+        rho_t = liouville.unvec(liouville.evolve_expm(L, liouville.vec(rho0),
+                                                      tlist))
+
+        for y_t, rho in zip(y, rho_t):
+            np.testing.assert_allclose(sym.to_dm(y_t), rho, atol=1e-8)
+
+        rho_1 = qu.Qobj(rho_t[-1], dims=[[2]*N, [2]*N]).ptrace(0).full()
+        np.testing.assert_allclose(sym.rho.full(), rho_1, atol=1e-8)
+
+    def test_evolve_start_time(self):
+        """ Test the evolution starts from rho0 at tlist[0], not t = 0. """
+
+        sym = symmetric.SymmetricOB(self.two_obj, 3, self.collective_c_ops)
+        rho0 = sym.product_state()
+        tlist = np.linspace(0., 3., 7)
+
+        y = sym.evolve(tlist, rho0).copy()
+        y_shifted = sym.evolve(tlist + 2., rho0)
+
+        np.testing.assert_allclose(y_shifted[0], rho0)
+        np.testing.assert_allclose(y_shifted, y, atol=1e-12)
+
+    def test_independent_atoms(self):
+        """ Test that without collective terms every atom of a large
+        ensemble is in the single-atom steady state. """
+
+        sym = symmetric.SymmetricOB(self.two_obj, 20)
+        y = sym.steadystate()
+
+        rho_1 = sym.rho_1(y)
+        self.assertAlmostEqual(rho_1[1, 1].real,
+                               pop_1_analytic(.4, .9, 1.))
+        np.testing.assert_allclose(sym.rho.full(), rho_1)
+        self.assertAlmostEqual(sym.expect(self.two_obj.sigma(1, 1), y).real,
+                               20*rho_1[1, 1].real)
+
+    def test_fifty_atoms_product_state(self):
+        """ Test the steady state of 50 independent atoms is the product of
+        single-atom steady states to high precision. """
+
+        sym = symmetric.SymmetricOB(self.two_obj, 50)
+        y = sym.steadystate()
+
+        rho1 = self.two_obj.steadystate().full()
+        y_exact = sym.product_state(rho1)
+
+        self.assertAlmostEqual(sym.trace_row().dot(y), 1., places=10)
+        np.testing.assert_allclose(sym.rho_1(y), rho1, atol=1e-12)
+        self.assertLess(np.abs(y - y_exact).max()/np.abs(y_exact).max(),
+                        1e-8)
+
+    def test_product_state(self):
+        """ Test product_state against the tensor product for a few atoms. """
+
+        rho1 = np.array([[.7, .2 - .1j], [.2 + .1j, .3]])
+        sym = symmetric.SymmetricOB(self.two_obj, 3)
+
+        full = qu.tensor([qu.Qobj(rho1)]*3).full()
+        np.testing.assert_allclose(sym.to_dm(sym.product_state(rho1)), full,
+                                   atol=1e-12)
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
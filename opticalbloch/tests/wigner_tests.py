@@ -0,0 +1,86 @@
+"""Unit tests for the wigner module.
+
+Thomas Ogden <t@ogden.eu>
+"""
+
+import sys
+import unittest
+import numpy as np
+import wigner
+
+class TestWigner3j(unittest.TestCase):
+    """ Tests for wigner.Wigner3j. """
+
+    def test_known_values(self):
+        """ Test against tabulated 3j symbols. """
+
+        self.assertAlmostEqual(wigner.Wigner3j(1,1,0,0,0,0), -1/np.sqrt(3))
+        self.assertAlmostEqual(wigner.Wigner3j(.5,.5,1,.5,-.5,0),
+                               1/np.sqrt(6))
+        self.assertAlmostEqual(wigner.Wigner3j(2,1,1,0,0,0),
+                               np.sqrt(2./15))
+
+    def test_selection_rules(self):
+        """ Test unphysical symbols are 0 and non-half-integers -1. """
+
+        self.assertEqual(wigner.Wigner3j(1,1,1,1,1,0), 0)
+        self.assertEqual(wigner.Wigner3j(1,1,3,0,0,0), 0)
+        self.assertEqual(wigner.Wigner3j(1,.5,1,0,0,0), 0)
+        self.assertEqual(wigner.Wigner3j(1.2,1,1,0,0,0), -1)
+
+    def test_symmetries(self):
+        """ Test odd permutations and m -> -m give (-1)^(j1+j2+j3). """
+
+        w = wigner.Wigner3j(1,2,2,1,-1,0)
+
+        self.assertNotEqual(w, 0)
+        self.assertAlmostEqual(wigner.Wigner3j(2,1,2,-1,1,0), -w)
+        self.assertAlmostEqual(wigner.Wigner3j(1,2,2,-1,1,0), -w)
+        self.assertAlmostEqual(wigner.Wigner3j(2,2,1,-1,0,1), w)
+
+class TestWigner6j(unittest.TestCase):
+    """ Tests for wigner.Wigner6j. """
+
+    def test_known_values(self):
+        """ Test against tabulated 6j symbols. """
+
+        self.assertAlmostEqual(wigner.Wigner6j(1,1,1,1,1,1), 1./6)
+        self.assertAlmostEqual(wigner.Wigner6j(.5,.5,1,.5,.5,0), .5)
+        self.assertAlmostEqual(wigner.Wigner6j(1.5,.5,1,1.5,1.5,2),
+                               -np.sqrt(5.)/10)
+
+    def test_not_triangular(self):
+        """ Test a symbol failing a triangle condition is 0. """
+
+        self.assertEqual(wigner.Wigner6j(1,1,3,1,1,1), 0)
+
+class TestBatch(unittest.TestCase):
+    """ Tests for the *_batch functions. """
+
+    def test_batch_matches_scalar(self):
+        """ Test the batch 3j and 6j against the scalar functions. """
+
+        j = np.array([.5, 1., 1.5, 2.])
+        m = np.array([.5, 0., -.5, 1.])
+
+        w3j = wigner.Wigner3j_batch(j, 1, j, m, 0, -m)
+        w6j = wigner.Wigner6j_batch(j, 1, j, 1.5, .5, 1.5)
+
+        for i in range(len(j)):
+            self.assertEqual(w3j[i], wigner.Wigner3j(j[i],1,j[i],m[i],0,-m[i]))
+            self.assertEqual(w6j[i], wigner.Wigner6j(j[i],1,j[i],1.5,.5,1.5))
+
+    def test_clebsch_gordan(self):
+        """ Test the coupling of two spin-1/2s. """
+
+        cg = wigner.ClebschGordan_batch(.5, [.5, .5, -.5], .5, [.5, -.5, .5],
+                                        [1, 0, 0], [1, 0, 0])
+
+        np.testing.assert_allclose(cg, [1., 1/np.sqrt(2), -1/np.sqrt(2)])
+
+def main():
+    unittest.main(verbosity=3)
+
+if __name__ == "__main__":
+    status = main()
+    sys.exit(status)
@@ -1,13 +1,35 @@
 import time
 
 class Timer(object):
-    def __init__(self, name=None):
+    """ Context manager timing a block of code.
+
+    Args:
+        name: name of the block, printed and used as the phase name.
+        metrics: optional metrics.Metrics to add the time to, as the phase
+            name.
+        verbose: print the elapsed time?
+
+    Attributes:
+        elapsed: the time taken [s], once the block has finished.
+    """
+
+    def __init__(self, name=None, metrics=None, verbose=True):
         self.name = name
+        self.metrics = metrics
+        self.verbose = verbose
+        self.elapsed = None
 
     def __enter__(self):
-        self.tstart = time.time()
+        self.tstart = time.perf_counter()
+        return self
 
     def __exit__(self, type, value, traceback):
-        if self.name:
-            print('{:s} done.'.format(self.name))
-        print('Time elapsed: {:.3f}s'.format(time.time() - self.tstart))
\ No newline at end of file
+        self.elapsed = time.perf_counter() - self.tstart
+        if self.metrics is not None:
+            timer = self.metrics.timers.setdefault(self.name, [0., 0])
+            timer[0] += self.elapsed
+            timer[1] += 1
+        if self.verbose:
+            if self.name:
+                print('{:s} done.'.format(self.name))
+            print('Time elapsed: {:.3f}s'.format(self.elapsed))
@@ -1,139 +1,311 @@
+""" Wigner 3j and 6j symbols and Clebsch-Gordan coefficients.
+
+The symbols are calculated with the Racah formulae in exact integer/rational
+arithmetic, from a table of factorials which grows as needed. Each symbol is
+cached under the twice-integer form of its arguments (so half-integers are
+exact), reduced by the symmetries of the symbol so that e.g. all column
+permutations of a 3j symbol share one cache entry.
+
+The *_batch functions take arrays of quantum numbers and evaluate each
+distinct symbol only once.
+"""
+
 from __future__ import division
-from scipy import floor, sqrt
-from scipy.misc import factorial
-from numpy import arange
+from fractions import Fraction
+from math import sqrt
+
+import numpy as np
+
+# Exact factorials, _factorials[k] = k!
+_factorials = [1]
+
+# Caches keyed on canonical twice-integer arguments.
+_cache_3j = {}
+_cache_6j = {}
+
+def _factorial(k):
+
+    while len(_factorials) <= k:
+        _factorials.append(_factorials[-1]*len(_factorials))
+
+    return _factorials[k]
+
+def _twice(x):
+    """ Returns 2x as an int, or None if x isn't an integer or half-integer.
+    """
+
+    x2 = 2*x
+    x2_int = int(round(x2))
+
+    if x2 != x2_int:
+        return None
+
+    return x2_int
+
+def _triangle(a, b, c):
+    """ Is the triad (a, b, c) (twice-integer) triangular with an integer
+    sum? """
+
+    return (c <= a + b and c >= abs(a - b) and (a + b + c) % 2 == 0)
+
+def _delta_sq(a, b, c):
+    """ The triangle coefficient (exact) for twice-integer arguments. """
+
+    return Fraction(_factorial((a + b - c)//2)*_factorial((a - b + c)//2)*
+                    _factorial((-a + b + c)//2),
+                    _factorial((a + b + c)//2 + 1))
+
+def _signed_sqrt(s, r):
+    """ s*sqrt(r) as a float, for rationals s and r >= 0, rounded once. """
+
+    if s == 0:
+        return 0.
+
+    return (1. if s > 0 else -1.)*sqrt(s*s*r)
+
+def _canonical_3j(a1, a2, a3, b1, b2, b3):
+    """ Reduces a twice-integer 3j symbol by its 12 classical symmetries.
+
+    Returns:
+        key: the smallest equivalent argument tuple.
+        sign: +1 or -1 such that symbol = sign*symbol(key).
+    """
+
+    # Odd column permutations and m -> -m both give (-1)^(j1+j2+j3).
+    phase = -1 if ((a1 + a2 + a3)//2) % 2 else 1
+
+    cols = ((a1, b1), (a2, b2), (a3, b3))
+    perms = (((0, 1, 2), 1), ((1, 2, 0), 1), ((2, 0, 1), 1),
+             ((1, 0, 2), phase), ((0, 2, 1), phase), ((2, 1, 0), phase))
+
+    best = None
+
+    for perm, sign in perms:
+        for flip, flip_sign in ((1, 1), (-1, phase)):
+            key = (cols[perm[0]][0], cols[perm[1]][0], cols[perm[2]][0],
+                   flip*cols[perm[0]][1], flip*cols[perm[1]][1],
+                   flip*cols[perm[2]][1])
+            if best is None or key < best[0]:
+                best = (key, sign*flip_sign)
+
+    return best
+
+def _wigner3j_twice(a1, a2, a3, b1, b2, b3):
+    """ The 3j symbol for twice-integer arguments (j's a, m's b), which must
+    already have passed the selection rules. """
+
+    t1 = (a2 - b1 - a3)//2
+    t2 = (a1 + b2 - a3)//2
+    t3 = (a1 + a2 - a3)//2
+    t4 = (a1 - b1)//2
+    t5 = (a2 + b2)//2
+
+    tmin = max(0, t1, t2)
+    tmax = min(t3, t4, t5)
+
+    s = Fraction(0)
+
+    for t in range(tmin, tmax + 1):
+        s += Fraction((-1)**t, _factorial(t)*_factorial(t - t1)*
+                      _factorial(t - t2)*_factorial(t3 - t)*
+                      _factorial(t4 - t)*_factorial(t5 - t))
+
+    r = _delta_sq(a1, a2, a3)*(_factorial((a1 + b1)//2)*
+                               _factorial((a1 - b1)//2)*
+                               _factorial((a2 + b2)//2)*
+                               _factorial((a2 - b2)//2)*
+                               _factorial((a3 + b3)//2)*
+                               _factorial((a3 - b3)//2))
+
+    if ((a1 - a2 - b3)//2) % 2:
+        s = -s
+
+    return _signed_sqrt(s, r)
 
 def Wigner3j(j1,j2,j3,m1,m2,m3):
-#======================================================================
-# Wigner3j.m by David Terr, Raytheon, 6-17-04
-#
-# Compute the Wigner 3j symbol using the Racah formula [1]. 
-#
-# Usage: 
-# from wigner import Wigner3j
-# wigner = Wigner3j(j1,j2,j3,m1,m2,m3)
-#
-#  / j1 j2 j3 \
-#  |          |  
-#  \ m1 m2 m3 /
-#
-# Reference: Wigner 3j-Symbol entry of Eric Weinstein's Mathworld: 
-# http://mathworld.wolfram.com/Wigner3j-Symbol.html
-#======================================================================
-
-    # Error checking
-    if ( ( 2*j1 != floor(2*j1) ) | ( 2*j2 != floor(2*j2) ) | ( 2*j3 != floor(2*j3) ) | ( 2*m1 != floor(2*m1) ) | ( 2*m2 != floor(2*m2) ) | ( 2*m3 != floor(2*m3) ) ):
-        # print 'All arguments must be integers or half-integers.'
+    """ The Wigner 3j symbol
+
+     / j1 j2 j3 \\
+     |          |
+     \\ m1 m2 m3 /
+
+    by the Racah formula [1], in exact arithmetic and cached.
+
+    Returns -1 if the arguments are not all integers or half-integers, and 0
+    if the symbol is unphysical.
+
+    Reference: Wigner 3j-Symbol entry of Eric Weinstein's Mathworld:
+    http://mathworld.wolfram.com/Wigner3j-Symbol.html
+    """
+
+    args = [_twice(x) for x in (j1, j2, j3, m1, m2, m3)]
+
+    if None in args:
+        # All arguments must be integers or half-integers.
         return -1
 
-    # Additional check if the sum of the second row equals zero
-    if ( m1+m2+m3 != 0 ):
-        # print '3j-Symbol unphysical'
-        return 0
+    a1, a2, a3, b1, b2, b3 = args
 
-    if ( j1 - m1 != floor ( j1 - m1 ) ):
-        # print '2*j1 and 2*m1 must have the same parity'
+    if b1 + b2 + b3 != 0:
         return 0
-    
-    if ( j2 - m2 != floor ( j2 - m2 ) ):
-        # print '2*j2 and 2*m2 must have the same parity'
-        return; 0
 
-    if ( j3 - m3 != floor ( j3 - m3 ) ):
-        # print '2*j3 and 2*m3 must have the same parity'
-        return 0
-    
-    if ( j3 > j1 + j2)  | ( j3 < abs(j1 - j2) ):
-        # print 'j3 is out of bounds.'
-        return 0
+    # j and m must have the same parity, |m| <= j and the js triangular.
+    for a, b in ((a1, b1), (a2, b2), (a3, b3)):
+        if (a - b) % 2 or abs(b) > a:
+            return 0
 
-    if abs(m1) > j1:
-        # print 'm1 is out of bounds.'
+    if not _triangle(a1, a2, a3):
         return 0
 
-    if abs(m2) > j2:
-        # print 'm2 is out of bounds.'
-        return 0 
+    key, sign = _canonical_3j(a1, a2, a3, b1, b2, b3)
 
-    if abs(m3) > j3:
-        # print 'm3 is out of bounds.'
-        return 0
+    try:
+        value = _cache_3j[key]
+    except KeyError:
+        value = _cache_3j[key] = _wigner3j_twice(*key)
+
+    return sign*value
+
+def _canonical_6j(a1, a2, a3, c1, c2, c3):
+    """ Reduces a twice-integer 6j symbol by its 24 symmetries (column
+    permutations and swapping the upper and lower entries of two columns),
+    returning the smallest equivalent argument tuple. """
 
-    t1 = j2 - m1 - j3
-    t2 = j1 + m2 - j3
-    t3 = j1 + j2 - j3
-    t4 = j1 - m1
-    t5 = j2 + m2
+    cols = ((a1, c1), (a2, c2), (a3, c3))
+    best = None
 
-    tmin = max( 0, max( t1, t2 ) )
-    tmax = min( t3, min( t4, t5 ) )
-    tvec = arange(tmin, tmax+1, 1)
+    for perm in ((0, 1, 2), (1, 2, 0), (2, 0, 1),
+                 (1, 0, 2), (0, 2, 1), (2, 1, 0)):
+        p = [cols[i] for i in perm]
+        for swap in ((0, 0, 0), (1, 1, 0), (1, 0, 1), (0, 1, 1)):
+            q = [col[::-1] if s else col for col, s in zip(p, swap)]
+            key = (q[0][0], q[1][0], q[2][0], q[0][1], q[1][1], q[2][1])
+            if best is None or key < best:
+                best = key
 
-    wigner = 0
+    return best
 
-    for t in tvec:
-        wigner += (-1)**t / ( factorial(t) * factorial(t-t1) * factorial(t-t2) * factorial(t3-t) * factorial(t4-t) * factorial(t5-t) )
+def _wigner6j_twice(a1, a2, a3, c1, c2, c3):
+    """ The 6j symbol for twice-integer arguments, which must already have
+    passed the triangle conditions. """
 
-    return wigner * (-1)**(j1-j2-m3) * sqrt( factorial(j1+j2-j3) * factorial(j1-j2+j3) * factorial(-j1+j2+j3) / factorial(j1+j2+j3+1) * factorial(j1+m1) * factorial(j1-m1) * factorial(j2+m2) * factorial(j2-m2) * factorial(j3+m3) * factorial(j3-m3) )
+    t1 = (a1 + a2 + a3)//2
+    t2 = (a1 + c2 + c3)//2
+    t3 = (c1 + a2 + c3)//2
+    t4 = (c1 + c2 + a3)//2
+    t5 = (a1 + a2 + c1 + c2)//2
+    t6 = (a2 + a3 + c2 + c3)//2
+    t7 = (a1 + a3 + c1 + c3)//2
 
+    tmin = max(0, t1, t2, t3, t4)
+    tmax = min(t5, t6, t7)
+
+    s = Fraction(0)
+
+    for t in range(tmin, tmax + 1):
+        s += Fraction((-1)**t*_factorial(t + 1),
+                      _factorial(t - t1)*_factorial(t - t2)*
+                      _factorial(t - t3)*_factorial(t - t4)*
+                      _factorial(t5 - t)*_factorial(t6 - t)*
+                      _factorial(t7 - t))
+
+    r = (_delta_sq(a1, a2, a3)*_delta_sq(a1, c2, c3)*
+         _delta_sq(c1, a2, c3)*_delta_sq(c1, c2, a3))
+
+    return _signed_sqrt(s, r)
 
 def Wigner6j(j1,j2,j3,J1,J2,J3):
-#======================================================================
-# Calculating the Wigner6j-Symbols using the Racah-Formula                
-# Author: Ulrich Krohn                                            
-# Date: 13th November 2009
-#                                                                         
-# Based upon Wigner3j.m from David Terr, Raytheon                         
-# Reference: http://mathworld.wolfram.com/Wigner6j-Symbol.html            
-#
-# Usage: 
-# from wigner import Wigner6j
-# WignerReturn = Wigner6j(j1,j2,j3,J1,J2,J3)
-#
-#  / j1 j2 j3 \
-# <            >  
-#  \ J1 J2 J3 /
-#
-#======================================================================
-
-    # Check that the js and Js are only integer or half integer
-    if ( ( 2*j1 != round(2*j1) ) | ( 2*j2 != round(2*j2) ) | ( 2*j2 != round(2*j2) ) | ( 2*J1 != round(2*J1) ) | ( 2*J2 != round(2*J2) ) | ( 2*J3 != round(2*J3) ) ):
-        # print 'All arguments must be integers or half-integers.'
+    """ The Wigner 6j symbol
+
+     / j1 j2 j3 \\
+    <            >
+     \\ J1 J2 J3 /
+
+    by the Racah formula, in exact arithmetic and cached.
+
+    Returns -1 if the arguments are not all integers or half-integers, and 0
+    if the symbol is not triangular.
+
+    Reference: http://mathworld.wolfram.com/Wigner6j-Symbol.html
+    """
+
+    args = [_twice(x) for x in (j1, j2, j3, J1, J2, J3)]
+
+    if None in args:
+        # All arguments must be integers or half-integers.
         return -1
-    
-# Check if the 4 triads ( (j1 j2 j3), (j1 J2 J3), (J1 j2 J3), (J1 J2 j3) ) satisfy the triangular inequalities
-    if ( ( abs(j1-j2) > j3 ) | ( j1+j2 < j3 ) | ( abs(j1-J2) > J3 ) | ( j1+J2 < J3 ) | ( abs(J1-j2) > J3 ) | ( J1+j2 < J3 ) | ( abs(J1-J2) > j3 ) | ( J1+J2 < j3 ) ):
-        # print '6j-Symbol is not triangular!'
-        return 0
-    
-    # Check if the sum of the elements of each traid is an integer
-    if ( ( 2*(j1+j2+j3) != round(2*(j1+j2+j3)) ) | ( 2*(j1+J2+J3) != round(2*(j1+J2+J3)) ) | ( 2*(J1+j2+J3) != round(2*(J1+j2+J3)) ) | ( 2*(J1+J2+j3) != round(2*(J1+J2+j3)) ) ):
-        # print '6j-Symbol is not triangular!'
+
+    a1, a2, a3, c1, c2, c3 = args
+
+    # The 4 triads (j1 j2 j3), (j1 J2 J3), (J1 j2 J3), (J1 J2 j3) must be
+    # triangular with integer sums.
+    if not (_triangle(a1, a2, a3) and _triangle(a1, c2, c3) and
+            _triangle(c1, a2, c3) and _triangle(c1, c2, a3)):
         return 0
-    
-    # Arguments for the factorials
-    t1 = j1+j2+j3
-    t2 = j1+J2+J3
-    t3 = J1+j2+J3
-    t4 = J1+J2+j3
-    t5 = j1+j2+J1+J2
-    t6 = j2+j3+J2+J3
-    t7 = j1+j3+J1+J3
-
-    # Finding summation borders
-    tmin = max(0, max(t1, max(t2, max(t3,t4))))
-    tmax = min(t5, min(t6,t7))
-    tvec = arange(tmin,tmax+1,1)
-        
-    # Calculation the sum part of the 6j-Symbol
-    WignerReturn = 0
-    for t in tvec:
-        WignerReturn += (-1)**t*factorial(t+1)/( factorial(t-t1)*factorial(t-t2)*factorial(t-t3)*factorial(t-t4)*factorial(t5-t)*factorial(t6-t)*factorial(t7-t) )
-
-    # Calculation of the 6j-Symbol
-    return WignerReturn*sqrt( TriaCoeff(j1,j2,j3)*TriaCoeff(j1,J2,J3)*TriaCoeff(J1,j2,J3)*TriaCoeff(J1,J2,j3) )
 
+    key = _canonical_6j(a1, a2, a3, c1, c2, c3)
+
+    try:
+        return _cache_6j[key]
+    except KeyError:
+        value = _cache_6j[key] = _wigner6j_twice(*key)
+        return value
 
 def TriaCoeff(a,b,c):
-    # Calculating the triangle coefficient
-    return factorial(a+b-c)*factorial(a-b+c)*factorial(-a+b+c)/(factorial(a+b+c+1))
+    """ The triangle coefficient. """
+
+    return float(_delta_sq(_twice(a), _twice(b), _twice(c)))
+
+def ClebschGordan(j1, m1, j2, m2, J, M):
+    """ The Clebsch-Gordan coefficient <j1 m1 j2 m2 | J M>. """
+
+    w = Wigner3j(j1, j2, J, m1, m2, -M)
+
+    if w == -1:
+        return -1
+
+    return (-1)**int(round(j1 - j2 + M))*sqrt(2*J + 1)*w
+
+def _batch(func, *args):
+    """ Evaluates func over broadcast arrays of arguments, calling it once per
+    distinct set of arguments. """
+
+    args = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in args])
+    shape = args[0].shape
+
+    twice = np.rint(2*np.stack([a.ravel() for a in args], axis=-1))
+
+    if twice.size == 0:
+        return np.zeros(shape)
+
+    unique, inverse = np.unique(twice, axis=0, return_inverse=True)
+    values = np.array([func(*(row/2.)) for row in unique], dtype=float)
+
+    # Arguments that weren't (half-)integers must still give -1.
+    out = values[np.ravel(inverse)]
+    exact = np.all(np.stack([a.ravel() for a in args], axis=-1) == twice/2.,
+                   axis=-1)
+    out[~exact] = -1
+
+    return out.reshape(shape)
+
+def Wigner3j_batch(j1, j2, j3, m1, m2, m3):
+    """ Wigner3j over broadcast arrays of quantum numbers. """
+
+    return _batch(Wigner3j, j1, j2, j3, m1, m2, m3)
+
+def Wigner6j_batch(j1, j2, j3, J1, J2, J3):
+    """ Wigner6j over broadcast arrays of quantum numbers. """
+
+    return _batch(Wigner6j, j1, j2, j3, J1, J2, J3)
+
+def ClebschGordan_batch(j1, m1, j2, m2, J, M):
+    """ ClebschGordan over broadcast arrays of quantum numbers. """
+
+    return _batch(ClebschGordan, j1, m1, j2, m2, J, M)
+
+def clear_cache():
+    """ Empties the caches of 3j and 6j symbols. """
+
+    _cache_3j.clear()
+    _cache_6j.clear()